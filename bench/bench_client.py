@@ -0,0 +1,275 @@
+'''
+Measures ops/sec and latency percentiles of memc clients: single get/set,
+mget at several fan-outs, value sizes from 10B to 1MB, a flare.Pool shared
+by threads, the time a flare.Client takes to fail over, and the latency of
+TCP with and without Nagle against a unix domain socket. The servers are
+bench/fakeserver.py in this process unless --server (and --unix) is given;
+failover always runs on fake servers, since one of them is stopped.
+
+The results are saved as JSON by -o, and --compare prints the change of
+ops/sec from an earlier result, so a regression between commits shows up.
+
+usage: python bench/bench_client.py [-o result.json] [--compare old.json]
+                                    [--threshold 0.1] [--server host:port]
+                                    [--unix /path] [--ops N] [--quick]
+'''
+
+import os
+import sys
+import json
+import time
+import tempfile
+import platform
+import argparse
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import memc.basic
+import memc.flare
+import memc.metrics
+import memc.transport
+
+from fakeserver import FakeServer
+
+OPS = 20000
+FANOUTS = (1, 10, 100)
+SIZES = (10, 100, 1000, 10 * 1000, 100 * 1000, 1000 * 1000)
+THREADS = (1, 4, 16)
+POOL_SIZE = 4
+FAILOVERS = 5
+# regressions over this ratio are marked by --compare
+THRESHOLD = 0.1
+
+
+def result(ops, elapsed, histogram):
+    return {'ops': ops, 'seconds': elapsed,
+            'ops_per_sec': ops / elapsed if elapsed else None,
+            'latency_us': histogram.summary()}
+
+
+def timed(func, num):
+    """ Calls func(i) num times and returns the result of the timings. """
+    histogram = memc.metrics.Histogram()
+    clock = time.time
+    start = clock()
+    for i in xrange(num):
+        t = clock()
+        func(i)
+        histogram.record((clock() - t) * 1000000)
+    return result(num, clock() - start, histogram)
+
+
+def bench_single(mc, ops):
+    value = 'v' * 100
+    mc.set('bench', value)
+    return {
+        'set': timed(lambda i: mc.set('bench', value), ops),
+        'get': timed(lambda i: mc.get('bench'), ops),
+    }
+
+
+def bench_mget(mc, ops):
+    results = {}
+    for fanout in FANOUTS:
+        keys = ['bench%d' % i for i in xrange(fanout)]
+        mc.set_multi(dict((key, 'v' * 100) for key in keys))
+        results['mget %d' % fanout] = timed(lambda i: mc.mget(keys),
+                                            max(ops / fanout, 10))
+    return results
+
+
+def bench_sizes(mc, ops):
+    results = {}
+    for size in SIZES:
+        value = 'v' * size
+        num = max(min(ops, ops * 1000 / size), 10)
+        key = 'bench_size%d' % size
+        results['set %dB' % size] = timed(lambda i: mc.set(key, value), num)
+        results['get %dB' % size] = timed(lambda i: mc.get(key), num)
+    return results
+
+
+def bench_pool(server, ops):
+    results = {}
+    for threads in THREADS:
+        metrics = memc.metrics.Metrics()
+        pool = memc.flare.Pool([server], max_pool=POOL_SIZE,
+                               instruments=memc.metrics.Instruments(metrics))
+        pool.set('bench', 'v' * 100)
+        metrics.reset()
+
+        num = max(ops / threads, 10)
+        def run():
+            for i in xrange(num):
+                pool.get('bench')
+
+        workers = [threading.Thread(target=run) for i in xrange(threads)]
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - start
+        pool.close()
+
+        r = result(num * threads, elapsed, metrics.histogram('get'))
+        r['pool_wait_us'] = metrics.histogram('pool_wait').summary()
+        results['pool %d threads' % threads] = r
+    return results
+
+
+def bench_transport(server, unix, ops):
+    transports = [
+        ('tcp', server, memc.transport.Transport()),
+        ('tcp nagle', server, memc.transport.Transport(nodelay=False)),
+    ]
+    if unix is not None:
+        transports.append(('unix', unix, memc.transport.Transport()))
+
+    results = {}
+    value = 'v' * 100
+    for (name, address, transport) in transports:
+        mc = memc.basic.Client(address, transport=transport)
+        mc.connect()
+        mc.set('bench', value)
+        results['set %s' % name] = timed(lambda i: mc.set('bench', value), ops)
+        results['get %s' % name] = timed(lambda i: mc.get('bench'), ops)
+        mc.close()
+    return results
+
+
+def bench_failover(rounds):
+    """ Time from the crash of the first server to the next success. """
+    histogram = memc.metrics.Histogram()
+    for i in xrange(rounds):
+        servers = [FakeServer().start(), FakeServer().start()]
+        # no sinks, which keeps the failover messages off stderr.
+        mc = memc.flare.Client([server.address for server in servers],
+                               health=memc.flare.Health(),
+                               instruments=memc.metrics.Instruments())
+        mc.set('bench', 'a')
+
+        servers[0].stop()
+        start = time.time()
+        mc.set('bench', 'b')
+        histogram.record((time.time() - start) * 1000000)
+
+        mc.close()
+        servers[1].stop()
+    return {'failover': result(rounds, histogram.total / 1000000.0, histogram)}
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(server, unix, ops):
+    fake = None
+    fake_unix = None
+    if server is None:
+        fake = FakeServer().start()
+        server = fake.address
+        path = os.path.join(tempfile.mkdtemp(), 'memc.sock')
+        fake_unix = FakeServer(path=path).start()
+        unix = fake_unix.address
+
+    mc = memc.basic.Client(server)
+    mc.connect()
+
+    results = {}
+    try:
+        results.update(bench_single(mc, ops))
+        results.update(bench_mget(mc, ops))
+        results.update(bench_sizes(mc, ops))
+        results.update(bench_pool(server, ops))
+        results.update(bench_transport(server, unix, ops))
+        results.update(bench_failover(FAILOVERS))
+    finally:
+        mc.close()
+        if fake is not None:
+            fake.stop()
+            fake_unix.stop()
+            os.rmdir(os.path.dirname(path))
+
+    return {
+        'commit': commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'server': 'fake' if fake is not None else server,
+        'ops': ops,
+        'results': results,
+    }
+
+
+def report(data):
+    print("%-18s %10s %12s %10s %10s %10s" %
+          ('case', 'ops', 'ops/sec', 'p50 us', 'p99 us', 'max us'))
+    for name in sorted(data['results']):
+        r = data['results'][name]
+        latency = r['latency_us']
+        print("%-18s %10d %12.0f %10s %10s %10s" %
+              (name, r['ops'], r['ops_per_sec'] or 0, latency['p50'],
+               latency['p99'], latency['max']))
+
+
+def compare(old, new, threshold):
+    print("%-18s %12s %12s %8s" % ('case', 'old ops/sec', 'new ops/sec',
+                                   'change'))
+    for name in sorted(new['results']):
+        if name not in old['results']:
+            continue
+        (a, b) = (old['results'][name]['ops_per_sec'],
+                  new['results'][name]['ops_per_sec'])
+        if not a or not b:
+            continue
+        change = b / a - 1
+        mark = ''
+        if change < -threshold:
+            mark = ' regression'
+        print("%-18s %12.0f %12.0f %+7.1f%%%s" %
+              (name, a, b, change * 100, mark))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', help="file the JSON is saved to")
+    parser.add_argument('--compare', help="JSON of an earlier run")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="drop of ops/sec marked as a regression "
+                        "(default %s)" % THRESHOLD)
+    parser.add_argument('--server', help="memcached to use, host:port")
+    parser.add_argument('--unix', help="memcached on a unix domain socket, "
+                        "compared with --server")
+    parser.add_argument('--ops', type=int, default=OPS,
+                        help="operations of a case (default %d)" % OPS)
+    parser.add_argument('--quick', action='store_true',
+                        help="runs 1/10 of the operations")
+    args = parser.parse_args()
+
+    ops = args.ops
+    if args.quick:
+        ops = max(ops / 10, 100)
+
+    data = run(args.server, args.unix, ops)
+    report(data)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print("")
+            compare(json.load(f), data, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
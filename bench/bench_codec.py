@@ -0,0 +1,70 @@
+'''
+Measures the cost of memc.codec.Codec against the bytes it saves, for
+some kinds of values and compression thresholds. No memcached is used.
+
+usage: python bench/bench_codec.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import memc.codec
+
+NUM = 2000
+
+
+def samples():
+    text = " ".join("word%d" % (i % 300) for i in xrange(20000))
+    record = {'id': 12345, 'name': 'name', 'tags': ['a', 'b', 'c'],
+              'score': 1.5, 'active': True}
+    return [
+        ('int', 1234567),
+        ('str 100', text[:100]),
+        ('str 1K', text[:1024]),
+        ('str 100K', text[:100 * 1024]),
+        ('random 10K', os.urandom(10 * 1024)),
+        ('dict', record),
+        ('list 1K', [record] * 1000),
+    ]
+
+
+def bench(codec, value, num):
+    start = time.time()
+    for i in xrange(num):
+        (data, flags) = codec.encode(value)
+    encode = (time.time() - start) / num
+
+    start = time.time()
+    for i in xrange(num):
+        codec.decode(data, flags)
+    decode = (time.time() - start) / num
+
+    return (len(data), encode, decode)
+
+
+def main():
+    codecs = [
+        ('pickle', memc.codec.Codec()),
+        ('json', memc.codec.Codec(memc.codec.SERIALIZER_JSON)),
+        ('pickle+z1K', memc.codec.Codec(compress_threshold=1024)),
+        ('pickle+z100', memc.codec.Codec(compress_threshold=100)),
+    ]
+
+    print("%-12s %-12s %10s %8s %12s %12s" %
+          ('value', 'codec', 'bytes', 'ratio', 'encode us', 'decode us'))
+
+    for (name, value) in samples():
+        raw = len(memc.codec.Codec().encode(value)[0])
+        num = max(10, NUM * 1024 / max(raw, 1024))
+        for (codec_name, codec) in codecs:
+            (size, encode, decode) = bench(codec, value, num)
+            print("%-12s %-12s %10d %8.2f %12.1f %12.1f" %
+                  (name, codec_name, size, float(size) / raw,
+                   encode * 1000000, decode * 1000000))
+
+
+if __name__ == '__main__':
+    main()
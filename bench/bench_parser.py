@@ -0,0 +1,70 @@
+'''
+Measures memc.protocol.Parser alone by feeding it canned replies in
+chunks. No memcached and no socket are used.
+
+usage: python bench/bench_parser.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import memc.protocol
+
+CHUNK = 16 * 1024
+TOTAL = 8 * 1024 * 1024
+
+
+def values(size):
+    value = 'v' * size
+    lines = []
+    num = max(1, TOTAL / size)
+    for i in xrange(num):
+        lines.append("VALUE key%d 0 %d %d\r\n%s\r\n" % (i, size, i, value))
+    lines.append("END\r\n")
+    return "".join(lines)
+
+
+def mixed():
+    lines = []
+    while len(lines) < 100000:
+        lines.extend(["STORED\r\n", "12345\r\n", "DELETED\r\n",
+                      "NOT_FOUND\r\n", "STAT pid 42\r\n", "END\r\n"])
+    return "".join(lines)
+
+
+def bench(data, repeat=3):
+    chunks = [data[i:i + CHUNK] for i in xrange(0, len(data), CHUNK)]
+    best = None
+    events = 0
+
+    for i in xrange(repeat):
+        parser = memc.protocol.Parser()
+        events = 0
+        start = time.time()
+        for chunk in chunks:
+            for event in parser.feed(chunk):
+                events += 1
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return (events, best)
+
+
+def main():
+    print("%-12s %10s %10s %12s" % ('reply', 'events', 'MB/s', 'events/s'))
+    cases = [('value %d' % size, values(size))
+             for size in (10, 100, 1024, 100 * 1024, 1024 * 1024)]
+    cases.append(('mixed lines', mixed()))
+
+    for (name, data) in cases:
+        (events, elapsed) = bench(data)
+        print("%-12s %10d %10.1f %12.0f" %
+              (name, events, len(data) / elapsed / 1024 / 1024, events / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+'''
+Compares the receive path of memc.basic.Client with the former
+string-concatenation buffer by parsing a canned mget response.
+No memcached is needed.
+
+usage: python bench/bench_reader.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import memc.basic
+from memc.basic import BUF_LEN, DELIMITER_LEN, LINE_DELIMITER, SocketError
+
+
+class DummySocket(object):
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def send(self, data):
+        return len(data)
+
+    sendall = send
+
+    def recv(self, size):
+        result = self._data[self._pos:self._pos + size]
+        self._pos += len(result)
+        return result
+
+    def recv_into(self, buf, size):
+        n = min(size, len(self._data) - self._pos)
+        buf[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+class StrClient(memc.basic.Client):
+    """ Client with the receive buffer which was used before Reader. """
+
+    def __init__(self, server):
+        super(StrClient, self).__init__(server)
+        self._buf = str()
+
+    def _recv(self):
+        buf = self._sock.recv(BUF_LEN)
+        if not buf:
+            raise SocketError('No data received.')
+        self._buf += buf
+
+    def _readline(self):
+        while(True):
+            pos = self._buf.find(LINE_DELIMITER)
+            if(pos >= 0):
+                break
+            self._recv()
+
+        line = self._buf[:pos]
+        self._buf = self._buf[pos + DELIMITER_LEN:]
+        return line
+
+    def _read(self, size):
+        while(True):
+            if(len(self._buf) >= size + DELIMITER_LEN):
+                break
+            self._recv()
+
+        result = self._buf[:size]
+        self._buf = self._buf[size + DELIMITER_LEN:]
+        return result
+
+    def _get_reply(self, cmdline, use_cas=False):
+        results = {}
+        while(True):
+            line = self._readline()
+            if line == "END":
+                break
+
+            (cmd, key, flags, bytes) = line.split()
+            bytes = int(bytes)
+            results[key] = (self._read(bytes), key, int(flags), bytes, None)
+
+        return results
+
+
+def response(keys, size):
+    value = 'v' * size
+    lines = []
+    for key in keys:
+        lines.append("VALUE %s 0 %d\r\n%s\r\n" % (key, size, value))
+    lines.append("END\r\n")
+    return "".join(lines)
+
+
+def bench(cls, keys, data, repeat):
+    mc = cls(('127.0.0.1', 11211))
+    start = time.time()
+    for i in xrange(repeat):
+        mc._sock = DummySocket(data)
+        mc._get('get', keys)
+    return (time.time() - start) / repeat
+
+
+def main():
+    print("%-8s %5s %12s %12s %8s" % ('size', 'keys', 'str(ms)', 'reader(ms)', 'ratio'))
+    for size in (1024, 100 * 1024, 1024 * 1024):
+        keys = ['key%d' % i for i in xrange(max(1, (4 * 1024 * 1024) / size))]
+        data = response(keys, size)
+        repeat = 5
+
+        old = bench(StrClient, keys, data, repeat)
+        new = bench(memc.basic.Client, keys, data, repeat)
+        print("%-8d %5d %12.2f %12.2f %8.1f" %
+              (size, len(keys), old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
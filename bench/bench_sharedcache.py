@@ -0,0 +1,141 @@
+'''
+Compares worker processes reading hot keys without a near-cache, with a
+NearCache in each process, and with one SharedCache for all of them. Each
+worker is forked with its own memc.basic.Client and reads random keys of
+a small set. The gets reaching the server and the total ops/sec are
+printed for every number of workers.
+
+The server is bench/fakeserver.py in this process unless --server is
+given; the gets of a real server are read from its stats.
+
+usage: python bench/bench_sharedcache.py [--server host:port] [--ops N]
+                                         [--workers 1,4,16] [--ttl 1]
+'''
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import memc.basic
+import memc.nearcache
+import memc.sharedcache
+
+from fakeserver import FakeServer
+
+OPS = 20000
+WORKERS = (1, 4, 16)
+KEYS = 200
+VALUE_SIZE = 100
+TTL = 1
+
+
+def no_cache(mc, path, ttl):
+    return mc
+
+
+def near_cache(mc, path, ttl):
+    return memc.nearcache.NearCache(mc, ttl=ttl)
+
+
+def shared_cache(mc, path, ttl):
+    return memc.sharedcache.SharedCache(mc, path, ttl=ttl)
+
+
+CACHES = (('none', no_cache), ('near', near_cache), ('shared', shared_cache))
+
+
+def work(server, make, path, ttl, ops):
+    mc = memc.basic.Client(server)
+    mc.connect()
+    cache = make(mc, path, ttl)
+    rand = random.Random(os.getpid())
+    keys = ['bench%d' % i for i in xrange(KEYS)]
+    for i in xrange(ops):
+        cache.get(rand.choice(keys))
+    mc.close()
+
+
+def cmd_get(mc):
+    return int(mc.stats()['cmd_get'])
+
+
+def run_workers(server, make, path, ttl, workers, ops):
+    pids = []
+    start = time.time()
+    for i in xrange(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                work(server, make, path, ttl, ops)
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+
+    failed = 0
+    for pid in pids:
+        (pid, status) = os.waitpid(pid, 0)
+        if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+            failed += 1
+    if failed:
+        raise RuntimeError("%d workers failed." % failed)
+    return time.time() - start
+
+
+def run(server, ops, workers_list, ttl):
+    fake = None
+    if server is None:
+        fake = FakeServer().start()
+        server = fake.address
+
+    mc = memc.basic.Client(server)
+    mc.connect()
+    mc.set_multi(dict(('bench%d' % i, 'v' * VALUE_SIZE)
+                      for i in xrange(KEYS)))
+
+    tmp = tempfile.mkdtemp()
+    print("%-8s %8s %10s %12s %12s" %
+          ('cache', 'workers', 'ops', 'ops/sec', 'server gets'))
+    try:
+        for workers in workers_list:
+            for (name, make) in CACHES:
+                path = os.path.join(tmp, '%s-%d.shm' % (name, workers))
+                num = max(ops / workers, 10)
+                before = cmd_get(mc)
+                elapsed = run_workers(server, make, path, ttl, workers, num)
+                gets = cmd_get(mc) - before
+                print("%-8s %8d %10d %12.0f %12d" %
+                      (name, workers, num * workers,
+                       num * workers / elapsed, gets))
+    finally:
+        mc.close()
+        shutil.rmtree(tmp)
+        if fake is not None:
+            fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--server', help="memcached to use, host:port")
+    parser.add_argument('--ops', type=int, default=OPS,
+                        help="gets of all workers (default %d)" % OPS)
+    parser.add_argument('--workers', default=','.join(map(str, WORKERS)),
+                        help="numbers of worker processes (default %s)" %
+                        ','.join(map(str, WORKERS)))
+    parser.add_argument('--ttl', type=float, default=TTL,
+                        help="ttl of the caches (default %s)" % TTL)
+    args = parser.parse_args()
+
+    run(args.server, args.ops, [int(n) for n in args.workers.split(',')],
+        args.ttl)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+'''
+Created on 2026/10/18
+
+In-process stand-in for memcached, for benchmarks and experiments where no
+memcached is at hand.
+
+It speaks the subset of the text protocol used by memc: get, gets, set,
+add, replace, append, prepend, cas, incr, decr, delete, touch, stats,
+version, flush_all and quit. Items expire like on memcached, and values
+over 1MB are refused. Failures are injected by:
+
+    latency       seconds slept before every reply
+    failure_rate  probability that a command drops the connection
+                  without a reply
+    stop()        closes the listening socket and every connection, like
+                  a crash of the server
+
+With path, it listens on a unix domain socket instead of host:port.
+
+usage: python bench/fakeserver.py [port | /path]
+'''
+
+import os
+import sys
+import time
+import random
+import socket
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+ITEM_SIZE_MAX = 1024 * 1024
+# exptime over this is an absolute unix time, as memcached takes it
+REALTIME_MAXDELTA = 60 * 60 * 24 * 30
+
+STORE_CMDS = ('set', 'add', 'replace', 'append', 'prepend', 'cas')
+
+
+class Dropped(Exception):
+    """ Raised to drop a connection by an injected failure. """
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        if self.server.address_family != socket.AF_UNIX:
+            self.connection.setsockopt(socket.IPPROTO_TCP,
+                                       socket.TCP_NODELAY, 1)
+        self.server.track(self.connection, True)
+
+    def finish(self):
+        self.server.track(self.connection, False)
+        try:
+            socketserver.StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def handle(self):
+        server = self.server
+        try:
+            while(True):
+                line = self.rfile.readline()
+                if not line or server.stopped:
+                    return
+
+                args = line.split()
+                if not args:
+                    self.reply("ERROR\r\n")
+                    continue
+
+                cmd = args[0]
+                data = None
+                if cmd in STORE_CMDS and len(args) >= 5:
+                    try:
+                        size = int(args[4])
+                    except ValueError:
+                        self.reply("CLIENT_ERROR bad command line format\r\n")
+                        continue
+                    data = self.rfile.read(size + 2)[:size]
+
+                if cmd == 'quit':
+                    return
+
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.failure_rate and server.rand.random() < server.failure_rate:
+                    raise Dropped()
+
+                reply = server.execute(cmd, args, data)
+                if reply:
+                    self.reply(reply)
+        except (Dropped, socket.error):
+            return
+
+    def reply(self, data):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+class FakeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ Fake memcached listening on host:port, port 0 picks a free one. """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, failure_rate=0,
+                 rand=None, path=None):
+        address = (host, port)
+        if path is not None:
+            self.address_family = socket.AF_UNIX
+            address = path
+        socketserver.TCPServer.__init__(self, address, Handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rand = rand or random.Random()
+        self.stopped = False
+
+        self._lock = threading.Lock()
+        # key => (data, flags, exptime, cas)
+        self._items = {}
+        self._cas = 0
+        self._connections = set()
+        self._thread = None
+
+        self.stats = {'cmd_get': 0, 'cmd_set': 0, 'get_hits': 0,
+                      'get_misses': 0, 'total_connections': 0}
+
+    @property
+    def address(self):
+        if self.address_family == socket.AF_UNIX:
+            return "unix:%s" % self.server_address
+        return "%s:%d" % self.server_address
+
+    def start(self):
+        """ Serves in a daemon thread and returns self. """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        if self._thread is not None:
+            self.shutdown()
+        self.server_close()
+
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        if self.address_family == socket.AF_UNIX:
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+
+    def track(self, conn, opened):
+        with self._lock:
+            if opened:
+                self._connections.add(conn)
+                self.stats['total_connections'] += 1
+            else:
+                self._connections.discard(conn)
+
+    def _exptime(self, value):
+        exptime = int(value)
+        if exptime == 0:
+            return 0
+        if exptime < 0:
+            return -1
+        if exptime <= REALTIME_MAXDELTA:
+            return time.time() + exptime
+        return exptime
+
+    def _item(self, key):
+        item = self._items.get(key)
+        if item is not None and item[2] and item[2] <= time.time():
+            del self._items[key]
+            return None
+        return item
+
+    def _next_cas(self):
+        self._cas += 1
+        return self._cas
+
+    def execute(self, cmd, args, data):
+        noreply = args[-1] == 'noreply'
+        with self._lock:
+            try:
+                if cmd in ('get', 'gets'):
+                    return self._get(cmd, args[1:])
+                elif cmd in STORE_CMDS:
+                    reply = self._store(cmd, args, data)
+                elif cmd in ('incr', 'decr'):
+                    reply = self._incr_decr(cmd, args[1], int(args[2]))
+                elif cmd == 'delete':
+                    if self._item(args[1]) is None:
+                        reply = "NOT_FOUND"
+                    else:
+                        del self._items[args[1]]
+                        reply = "DELETED"
+                elif cmd == 'touch':
+                    item = self._item(args[1])
+                    if item is None:
+                        reply = "NOT_FOUND"
+                    else:
+                        self._items[args[1]] = (item[0], item[1],
+                                                self._exptime(args[2]), item[3])
+                        reply = "TOUCHED"
+                elif cmd == 'flush_all':
+                    self._items.clear()
+                    reply = "OK"
+                elif cmd == 'version':
+                    return "VERSION 1.6.0-fake\r\n"
+                elif cmd == 'stats':
+                    return self._stats()
+                else:
+                    return "ERROR\r\n"
+            except (IndexError, ValueError):
+                return "CLIENT_ERROR bad command line format\r\n"
+
+        if noreply and not reply.startswith('SERVER_ERROR'):
+            return None
+        return reply + "\r\n"
+
+    def _get(self, cmd, keys):
+        out = []
+        for key in keys:
+            self.stats['cmd_get'] += 1
+            item = self._item(key)
+            if item is None:
+                self.stats['get_misses'] += 1
+                continue
+
+            self.stats['get_hits'] += 1
+            (data, flags, exptime, cas) = item
+            if cmd == 'gets':
+                out.append("VALUE %s %d %d %d\r\n" % (key, flags, len(data), cas))
+            else:
+                out.append("VALUE %s %d %d\r\n" % (key, flags, len(data)))
+            out.append(data)
+            out.append("\r\n")
+        out.append("END\r\n")
+        return "".join(out)
+
+    def _store(self, cmd, args, data):
+        self.stats['cmd_set'] += 1
+        if data is None:
+            raise ValueError(cmd)
+        (key, flags, exptime) = (args[1], int(args[2]), self._exptime(args[3]))
+        if len(data) > ITEM_SIZE_MAX:
+            return "SERVER_ERROR object too large for cache"
+
+        item = self._item(key)
+        if cmd == 'add' and item is not None:
+            return "NOT_STORED"
+        if cmd in ('replace', 'append', 'prepend') and item is None:
+            return "NOT_STORED"
+        if cmd == 'cas':
+            if item is None:
+                return "NOT_FOUND"
+            if item[3] != int(args[5]):
+                return "EXISTS"
+
+        if cmd == 'append':
+            (data, flags, exptime) = (item[0] + data, item[1], item[2])
+        elif cmd == 'prepend':
+            (data, flags, exptime) = (data + item[0], item[1], item[2])
+
+        if exptime < 0:
+            self._items.pop(key, None)
+        else:
+            self._items[key] = (data, flags, exptime, self._next_cas())
+        return "STORED"
+
+    def _incr_decr(self, cmd, key, delta):
+        item = self._item(key)
+        if item is None:
+            return "NOT_FOUND"
+
+        if not item[0].isdigit() or int(item[0]) >= 2 ** 64:
+            return "CLIENT_ERROR cannot increment or decrement non-numeric value"
+
+        value = int(item[0])
+        if cmd == 'incr':
+            value = (value + delta) % (2 ** 64)
+        else:
+            value = max(value - delta, 0)
+        self._items[key] = (str(value), item[1], item[2], self._next_cas())
+        return str(value)
+
+    def _stats(self):
+        stats = dict(self.stats)
+        stats['curr_items'] = len(self._items)
+        stats['curr_connections'] = len(self._connections)
+        stats['version'] = '1.6.0-fake'
+        lines = ["STAT %s %s\r\n" % item for item in sorted(stats.items())]
+        lines.append("END\r\n")
+        return "".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1].startswith('/'):
+        server = FakeServer(path=sys.argv[1])
+    else:
+        port = 11211
+        if len(sys.argv) > 1:
+            port = int(sys.argv[1])
+        server = FakeServer(port=port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
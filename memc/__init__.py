@@ -22,13 +22,36 @@ class KeyNotFoundError(Error):
     pass
 
     
+UNIX_PREFIX = "unix:"
+
 _reg_server = re.compile("^(?P<host>[a-z0-9\-\_\.]+)(?::(?P<port>[0-9]+))?$")
 def conn2tuple(cons):
+    """ Returns (host, port) of "host:port", or the path of "unix:/path". """
     if type(cons) == tuple:
         return cons
 
+    if cons.startswith(UNIX_PREFIX):
+        cons = cons[len(UNIX_PREFIX):]
+        if not cons:
+            raise Error("connection string is invalid:%s" % UNIX_PREFIX)
+        return cons
+
+    if cons.startswith("/"):
+        return cons
+
     m = _reg_server.match(cons)
     if not m:
         raise Error("connection string is invalid:%s" % cons)
 
     return (m.group('host'), int(m.group('port')))
+
+
+def is_unix(server):
+    """ Whether a server of conn2tuple is a unix domain socket. """
+    return type(server) != tuple
+
+
+def server2str(server):
+    if is_unix(server):
+        return UNIX_PREFIX + server
+    return "%s:%d" % server
@@ -0,0 +1,248 @@
+'''
+Created on 2026/10/18
+
+asyncio client. Every command returns a future, and the replies are parsed
+by the same memc.protocol replies as the blocking client. Commands are
+written as soon as they are called, so many requests can be in flight on
+one connection; their replies are matched in FIFO order.
+
+trollius is used when asyncio is not available.
+'''
+
+import memc
+
+from collections import deque
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from memc.basic import SocketError
+from memc.protocol import KeyNotFoundError
+from memc.protocol import Parser, LineReply, GetReply, StatsReply, MetaReply
+from memc.protocol import store_cmd, get_cmd, incr_decr_cmd, delete_cmd
+from memc.protocol import store_result, incr_decr_result, delete_result
+from memc.protocol import meta_get_cmd, meta_set_cmd, meta_delete_cmd
+from memc.protocol import meta_arithmetic_cmd
+from memc.protocol import meta_get_result, meta_set_result, meta_delete_result
+from memc.protocol import meta_arithmetic_result
+from memc.protocol import LINE_DELIMITER, OPT_CAS
+
+
+class Protocol(asyncio.Protocol):
+    def __init__(self, loop):
+        self._loop = loop
+        self._transport = None
+        self._buf = Parser()
+        self._waiters = deque()
+        self._closed = False
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def data_received(self, data):
+        self._buf.feed(data)
+
+        while self._waiters:
+            (future, reply, convert) = self._waiters[0]
+            try:
+                if not reply.parse(self._buf):
+                    return
+                result = reply.result()
+                if convert is not None:
+                    result = convert(result)
+            except memc.Error as e:
+                self._waiters.popleft()
+                if not future.cancelled():
+                    future.set_exception(e)
+                continue
+
+            self._waiters.popleft()
+            if not future.cancelled():
+                future.set_result(result)
+
+    def connection_lost(self, exc):
+        self._closed = True
+        while self._waiters:
+            (future, reply, convert) = self._waiters.popleft()
+            if not future.cancelled():
+                future.set_exception(SocketError('Connection is closed.'))
+
+    def request(self, cmdline, reply, convert=None):
+        future = asyncio.Future(loop=self._loop)
+
+        if self._closed:
+            future.set_exception(SocketError('Connection is closed.'))
+            return future
+
+        self._transport.write(cmdline + LINE_DELIMITER)
+
+        if reply is None:
+            future.set_result(None)
+        else:
+            self._waiters.append((future, reply, convert))
+        return future
+
+    def close(self):
+        if not self._closed:
+            self._transport.write('quit' + LINE_DELIMITER)
+            self._transport.close()
+
+
+class Client(object):
+    def __init__(self, server, loop=None):
+        self._server = memc.conn2tuple(server)
+        self._loop = loop or asyncio.get_event_loop()
+        self._protocol = None
+
+    def connect(self):
+        future = asyncio.Future(loop=self._loop)
+
+        def connected(f):
+            if f.cancelled():
+                future.cancel()
+            elif f.exception() is not None:
+                future.set_exception(f.exception())
+            else:
+                (transport, protocol) = f.result()
+                self._protocol = protocol
+                future.set_result(None)
+
+        factory = lambda: Protocol(self._loop)
+        if memc.is_unix(self._server):
+            connection = self._loop.create_unix_connection(factory,
+                                                           self._server)
+        else:
+            (host, port) = self._server
+            connection = self._loop.create_connection(factory, host, port)
+        task = asyncio.ensure_future(connection, loop=self._loop)
+        task.add_done_callback(connected)
+        return future
+
+    def close(self):
+        if self._protocol is not None:
+            self._protocol.close()
+            self._protocol = None
+
+    def _request(self, cmdline, reply, convert=None):
+        if self._protocol is None:
+            raise SocketError('Not connected.')
+        return self._protocol.request(cmdline, reply, convert)
+
+    def _request_cmd(self, cmd, func, key):
+        (cmdline, noreply) = cmd
+        if noreply:
+            return self._request(cmdline, None)
+        return self._request(cmdline, LineReply(func, key))
+
+    def stats(self, arg=""):
+        return self._request("stats %s" % arg, StatsReply(arg))
+
+    def version(self):
+        return self._request('version', LineReply())
+
+    def _set(self, cmd, key, value, kwargs):
+        return self._request_cmd(store_cmd(cmd, key, value, kwargs),
+                                 store_result, key)
+
+    def _get(self, cmd, keys, use_cas=False, convert=None):
+        cmdline = get_cmd(cmd, keys)
+        return self._request(cmdline, GetReply(cmdline, use_cas), convert)
+
+    def _incr_decr(self, cmd, key, value, kwargs):
+        return self._request_cmd(incr_decr_cmd(cmd, key, value, kwargs),
+                                 incr_decr_result, key)
+
+    def _delete(self, key, kwargs):
+        return self._request_cmd(delete_cmd(key, kwargs), delete_result, key)
+
+    def delete(self, key, **kwargs):
+        return self._delete(key, kwargs)
+
+    def set(self, key, value, **kwargs):
+        return self._set('set', key, value, kwargs)
+
+    def add(self, key, value, **kwargs):
+        return self._set('add', key, value, kwargs)
+
+    def replace(self, key, value, **kwargs):
+        return self._set('replace', key, value, kwargs)
+
+    def append(self, key, value, **kwargs):
+        return self._set('append', key, value, kwargs)
+
+    def prepend(self, key, value, **kwargs):
+        return self._set('prepend', key, value, kwargs)
+
+    def cas(self, key, value, cas, **kwargs):
+        kwargs[OPT_CAS] = cas
+        return self._set('cas', key, value, kwargs)
+
+    def raw_get(self, key):
+        def convert(result):
+            if result.has_key(key):
+                return result[key]
+            raise KeyNotFoundError("Key:%s is not found." % key)
+
+        return self._get('get', [key], False, convert)
+
+    def raw_gets(self, key):
+        def convert(result):
+            if result.has_key(key):
+                return result[key]
+            raise KeyNotFoundError("Key:%s is not found." % key)
+
+        return self._get('gets', [key], True, convert)
+
+    def raw_mget(self, keys):
+        def convert(result):
+            lst = []
+            for key in keys:
+                if result.has_key(key):
+                    lst.append(result[key][0])
+                else:
+                    lst.append(None)
+            return lst
+
+        return self._get('get', keys, False, convert)
+
+    def raw_mgets(self, keys):
+        return self._get('gets', keys, True)
+
+    def incr(self, key, value, **kwargs):
+        return self._incr_decr('incr', key, value, kwargs)
+
+    def decr(self, key, value, **kwargs):
+        return self._incr_decr('decr', key, value, kwargs)
+
+    def get(self, key):
+        def convert(result):
+            if result.has_key(key):
+                return result[key][0]
+            raise KeyNotFoundError("Key:%s is not found." % key)
+
+        return self._get('get', [key], False, convert)
+
+    def mget(self, keys):
+        return self.raw_mget(keys)
+
+    def meta_get(self, key, fields=('value',), **kwargs):
+        return self._request(meta_get_cmd(key, fields, kwargs),
+                             MetaReply(meta_get_result, key))
+
+    def meta_set(self, key, value, **kwargs):
+        return self._request(meta_set_cmd(key, value, kwargs),
+                             MetaReply(meta_set_result, key))
+
+    def meta_delete(self, key, **kwargs):
+        return self._request(meta_delete_cmd(key, kwargs),
+                             MetaReply(meta_delete_result, key))
+
+    def meta_arithmetic(self, key, delta=1, **kwargs):
+        return self._request(meta_arithmetic_cmd(key, delta, kwargs),
+                             MetaReply(meta_arithmetic_result, key))
+
+
+if __name__ == "__main__":
+    pass
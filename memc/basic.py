@@ -4,305 +4,849 @@ Created on 2010/03/15
 @author: Masahiro Fukuda
 '''
 
+import os
+import time
 import memc
+import memc.binary
+import memc.compute
 import socket
+import hashlib
+import itertools
+import collections
 
-class Error(memc.Error):
-    pass
-
-class StoreError(memc.StoreError):
-    pass
-
-class KeyNotFoundError(memc.KeyNotFoundError):
-    pass
+from memc.protocol import Error, StoreError, KeyNotFoundError
+from memc.protocol import Reader, Parser, GetReply, StatsReply, MetaReply
+from memc.protocol import parse_line, Value, END
+from memc.protocol import store_result, incr_decr_result, delete_result
+from memc.protocol import store_cmd, get_cmd, incr_decr_cmd, delete_cmd
+from memc.protocol import store_header, value_data
+from memc.protocol import meta_get_cmd, meta_set_cmd, meta_delete_cmd
+from memc.protocol import meta_arithmetic_cmd
+from memc.protocol import meta_get_result, meta_set_result, meta_delete_result
+from memc.protocol import meta_arithmetic_result
+from memc.protocol import check_key, LINE_DELIMITER, DELIMITER_LEN, MAX_KEY_LEN
+from memc.protocol import OPT_FLAG, OPT_EXPIRE, OPT_NOREPLY, OPT_SYNC, OPT_CAS
+from memc.protocol import OPT_MODE, OPT_TOUCH, OPT_VIVIFY, OPT_RECACHE
+from memc.protocol import OPT_INVALIDATE, OPT_RETURN_CAS, OPT_INITIAL
+from memc.codec import FLAG_CHUNKED
+from memc.metrics import BYTES_SENT, BYTES_RECEIVED, ERRORS
+from memc.transport import DEFAULT_TRANSPORT, TIME_OUT, CONNECT_TIME_OUT
 
 class SocketError(socket.error):
     pass
 
 BUF_LEN = 40960
-TIME_OUT = 10
 
-# memcached:250
-MAX_KEY_LEN = 250
-
-LINE_DELIMITER = "\r\n"
-DELIMITER_LEN = len(LINE_DELIMITER)
 TERMINATOR = "END\r\n"
 TERMINATOR_LEN = len(TERMINATOR)
 
-OPT_FLAG    = 'flag'
-OPT_EXPIRE  = 'expire'
-OPT_NOREPLY = 'noreply'
-OPT_SYNC    = 'sync'
-OPT_CAS     = 'cas'
+# number of commands sent at once when replies are read back
+MULTI_BATCH_SIZE = 1000
+
+# keys of a get command sent by iter_mget
+MGET_BATCH_SIZE = 100
+# memcached takes longer get lines, but they are kept to this
+MAX_GET_LINE_LEN = 16 * 1024
+
+# parts smaller than this are joined into one string before they are sent
+SENDMSG_THRESHOLD = 64 * 1024
+# IOV_MAX is 1024 on Linux
+SENDMSG_MAX_PARTS = 1024
+
+# values are split into chunks of this size when chunk_size=True
+CHUNK_SIZE = 1000 * 1000
+
+# kwargs of a value which is encoded already
+_OPT_ENCODED = '_encoded'
+
+PROTOCOL_TEXT   = 'text'
+PROTOCOL_BINARY = 'binary'
+
+# pid of this process, which os.register_at_fork keeps where it's available
+# so that it isn't asked of the kernel on every command.
+_pid = os.getpid()
+
+def _update_pid():
+    global _pid
+    _pid = os.getpid()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_update_pid)
+    
+    def current_pid():
+        return _pid
+else:
+    current_pid = os.getpid
+
+def chunk_key(key, version, index):
+    if len(key) + 32 > MAX_KEY_LEN:
+        key = hashlib.md5(key).hexdigest()
+    return "%s:%s:%d" % (key, version, index)
+
 
 class Client(object):
-    def __init__(self, server, debug=False):
+    def __init__(self, server, debug=False, protocol=PROTOCOL_TEXT, codec=None,
+                 chunk_size=None, instruments=None, transport=None,
+                 hotkeys=None):
         self._debug = debug
         self._server = memc.conn2tuple(server)
         self._sock = None
-        self._buf = str()
+        # pid of the process which opened the socket
+        self._pid = None
+        self._buf = Parser()
+        # time.time() by which replies have to be received, or None
+        self._deadline = None
+        
+        # memc.transport.Transport, which opens the socket.
+        if transport is None:
+            transport = DEFAULT_TRANSPORT
+        self._transport = transport
+        self.connect_timeout = transport.connect_timeout
+        self.read_timeout = transport.read_timeout
+        
+        # memc.codec.Codec, which owns the flag field when it's given.
+        self._codec = codec
+        
+        # values set larger than this are stored by chunks.
+        if chunk_size is True:
+            chunk_size = CHUNK_SIZE
+        self._chunk_size = chunk_size
+        
+        # memc.metrics.Instruments, which is told of the commands.
+        self._instruments = instruments
+        
+        # memc.hotkeys.HotKeys, which counts the keys of the commands.
+        self._hotkeys = hotkeys
+        
+        if protocol == PROTOCOL_TEXT:
+            self._binary = None
+        elif protocol == PROTOCOL_BINARY:
+            self._binary = memc.binary.Protocol(self)
+        else:
+            raise Error("Unknown protocol: %s" % protocol)
         
     def connect(self, force=False):
         if self._sock == None or force:
-            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 0) 
-            self._sock.settimeout(TIME_OUT)
-            self._sock.connect(self._server)
+            self._buf.clear()
+            self._sock = None
+            self._sock = self._transport.connect(self._server,
+                                                 self.connect_timeout,
+                                                 self.read_timeout)
+            self._pid = current_pid()
             
         self.version()
 
+    def _reconnect(self):
+        self.connect()
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+            self._sock = None
+        self._buf.clear()
+
+    def _drop_inherited(self):
+        """ Drops the socket inherited from the parent of a fork.
+
+        Only the copy of the descriptor is closed, which leaves the
+        connection of the parent open. quit or shutdown would end it.
+        """
+        if self._sock is None or self._pid in (None, current_pid()):
+            return False
+        
+        self._disconnect()
+        return True
+
+    def _check_fork(self):
+        # opened again in place of the one of the parent, or of one which
+        # was closed after an error, such as by a pipeline.
+        if self._drop_inherited() or (self._sock is None and
+                                      self._pid is not None):
+            self._reconnect()
+
     def _send_cmd(self, cmd):
         self._send_cmds([cmd, LINE_DELIMITER])
 
     def _send_cmds(self, cmds):
-        self._sock.send("".join(cmds))
+        if self._pid != current_pid() or self._sock is None:
+            self._check_fork()
+        
+        data = "".join(cmds)
+        self._sock.sendall(data)
+        if self._instruments is not None:
+            self._instruments.count(BYTES_SENT, self._server, len(data))
+
+    def _send_parts(self, parts):
+        """ Sends parts, which may be buffers, without copying large ones.
+
+        Small strings are joined and the rest is written by sendmsg in one
+        call. Without sendmsg (Python 2), the parts are written one by one
+        while TCP_CORK holds the partial segments back.
+        """
+        if self._pid != current_pid() or self._sock is None:
+            self._check_fork()
+        
+        if self._instruments is not None:
+            self._instruments.count(BYTES_SENT, self._server,
+                                    sum(len(part) for part in parts))
+        
+        chunks = []
+        small = []
+        for part in parts:
+            if type(part) is str and len(part) < SENDMSG_THRESHOLD:
+                small.append(part)
+                continue
+            
+            if small:
+                chunks.append("".join(small))
+                small = []
+            chunks.append(part)
+        
+        if small:
+            chunks.append("".join(small))
+        
+        if len(chunks) == 1:
+            self._sock.sendall(chunks[0])
+            return
+        
+        if hasattr(self._sock, 'sendmsg'):
+            self._sendmsg(chunks)
+            return
+        
+        cork = getattr(socket, 'TCP_CORK', None)
+        if memc.is_unix(self._server):
+            cork = None
+        if cork is not None:
+            self._sock.setsockopt(socket.SOL_TCP, cork, 1)
+        try:
+            for chunk in chunks:
+                self._sock.sendall(chunk)
+        finally:
+            if cork is not None:
+                self._sock.setsockopt(socket.SOL_TCP, cork, 0)
+
+    def _sendmsg(self, chunks):
+        views = [memoryview(chunk) for chunk in chunks]
+        while views:
+            n = self._sock.sendmsg(views[:SENDMSG_MAX_PARTS])
+            
+            # drops what is written, which may end in the middle of a part.
+            i = 0
+            while i < len(views) and n >= len(views[i]):
+                n -= len(views[i])
+                i += 1
+            views = views[i:]
+            if n:
+                views[0] = views[0][n:]
 
     def _recv(self):
-        buf = self._sock.recv(BUF_LEN)
+        if self._deadline is not None:
+            left = self._deadline - time.time()
+            if left <= 0:
+                raise socket.timeout("timed out")
+            self._sock.settimeout(left)
+        
+        n = self._buf.recv_into(self._sock, BUF_LEN)
+        if self._instruments is not None:
+            self._instruments.count(BYTES_RECEIVED, self._server, n)
         
         # This is adhoc code.
         # We should find propery TCP flags or something.
-        if not buf:
+        if not n:
             raise SocketError('No data received.')
         
-        self._buf += buf
-        # print "len:%d " % len(buf)
-        
 
     def _readline(self):
         while(True):
-            pos = self._buf.find(LINE_DELIMITER)
-            if(pos >= 0):
-                break
+            line = self._buf.readline()
+            if line is not None:
+                return line
             self._recv()
-
-        line = self._buf[:pos]
-        self._buf = self._buf[pos + DELIMITER_LEN:]
-        
-        return line
         
     def _read(self, size):
         while(True):
-            if(len(self._buf) >= size + DELIMITER_LEN):
-                break
+            result = self._buf.read(size)
+            if result is not None:
+                return result
             self._recv()
-            
-        result = self._buf[:size]
-        self._buf = self._buf[size + DELIMITER_LEN:]
-        
-        return result
+
+    def _read_reply(self, reply):
+        while not reply.parse(self._buf):
+            self._recv()
+        return reply.result()
     
     def _send_readline(self, buf):
         self._send_cmd(buf)
         return self._readline()
 
     def _check_key(self, key):
-        if len(key) > MAX_KEY_LEN:
-            raise Error("Too long key: %s" % key)
-        
-        for c in key:
-            h = ord(c)
-            if h <= 0x20 or h == 0x7f:
-                raise Error("Key must never include white spaces:%s" % key)
-        
-        return
+        return check_key(key)
 
     def stats(self, arg=""):
-        stats = {}
-
+        if self._binary is not None:
+            return self._binary.stats(arg)
+        
         cmdline = "stats %s" % (arg)
         
         self._send_cmd(cmdline)
 
-        while(True):
-            line = self._readline()
-        
-            if line.startswith('STAT '):
-                pass
-            
-            elif line == 'END':
-                break
-
-            else:
-                raise Error("Argument error: stats %s" % arg)
-        
-            (cmd, k, v) = line.split(None, 2)
-            stats[k] = v
-         
-        return stats   
+        return self._read_reply(StatsReply(arg))
 
 
     def version(self):  
+        if self._binary is not None:
+            return self._binary.version()
+        
         return self._send_readline('version')
 
     def close(self):
+        if self._drop_inherited():
+            return
+        
+        if self._binary is not None:
+            return self._binary.close()
+        
         self._send_cmd('quit')
         
 
-    def _set(self, cmd, key, value, kwargs={}):
-        expire = 0
-        flag = 0
-        opt = []
-        cas = None
-        noreply = False
+    def _encode(self, cmd, value, kwargs):
+        # append/prepend data is joined to the stored data as it is.
+        if (self._codec is None or cmd in ('append', 'prepend') or
+            kwargs.has_key(_OPT_ENCODED)):
+            return (value, kwargs)
         
-        self._check_key(key)
+        (data, flags) = self._codec.encode(value)
+        kwargs = dict(kwargs)
+        kwargs[OPT_FLAG] = flags
+        return (data, kwargs)
+
+    def _decode_results(self, results, chunks=True):
+        """ Joins chunked values and decodes values by the codec.
+
+        Values whose chunks can't be read, and chunked values in a pipeline,
+        which can't read the chunks in the middle of its replies, are
+        dropped as misses.
+        """
+        if self._chunk_size is not None:
+            if chunks:
+                self._join_chunks(results)
+            else:
+                for (key, item) in results.items():
+                    if item[2] & FLAG_CHUNKED:
+                        del results[key]
         
-        if kwargs.has_key(OPT_EXPIRE):
-            expire = kwargs[OPT_EXPIRE]
-            
-        if kwargs.has_key(OPT_FLAG):
-            flag = kwargs[OPT_FLAG]
+        if self._codec is None:
+            return results
+        
+        decode = self._codec.decode
+        for (key, item) in results.items():
+            results[key] = (decode(item[0], item[2]),) + item[1:]
+        return results
 
-        if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
-            opt.append(OPT_NOREPLY)
-            noreply = True
+    def _set_value(self, key, value, kwargs):
+        if self._chunk_size is None:
+            return self._set('set', key, value, kwargs)
+        
+        (data, opts) = self._encode_value(value, kwargs)
+        if len(data) <= self._chunk_size:
+            return self._set('set', key, data, opts)
         
-        if kwargs.has_key(OPT_SYNC) and kwargs[OPT_SYNC]:
-            opt.append(OPT_SYNC)
+        (chunks, chunk_opts, manifest, opts) = self._split_value(key, data,
+                                                                 opts)
+        if self._set_multi(chunks, chunk_opts):
+            raise StoreError("store error:%s" % key)
         
-        if kwargs.has_key(OPT_CAS):
-            cas = kwargs[OPT_CAS]
+        # the manifest is stored after the chunks, so it's never read
+        # without them.
+        return self._set('set', key, manifest, opts)
 
-        if type(value) != str:
-            value = str(value)
+    def _encode_value(self, value, kwargs):
+        (data, opts) = self._encode('set', value, kwargs)
+        opts = dict(opts)
+        opts[_OPT_ENCODED] = True
+        return (value_data(data), opts)
 
-        if cmd == 'cas':
-            cmdline = "%s %s %d %d %d %d %s\r\n%s" % \
-                       (cmd, key, flag, expire, len(value), cas, " ".join(opt), value)
-        else:
-            cmdline = "%s %s %d %d %d %s\r\n%s" % \
-                       (cmd, key, flag, expire, len(value), " ".join(opt), value)
+    def _split_value(self, key, data, opts):
+        """ Returns (chunks, chunk opts, manifest, manifest opts) to store
+        data by chunks of chunk_size.
+        """
+        # chunk keys have the version of the value, so chunks of another
+        # version are never mixed in.
+        version = os.urandom(4).encode('hex')
+        chunks = {}
+        for (i, pos) in enumerate(xrange(0, len(data), self._chunk_size)):
+            chunks[chunk_key(key, version, i)] = data[pos:pos + self._chunk_size]
+        
+        chunk_opts = dict(opts)
+        chunk_opts[OPT_FLAG] = 0
+        chunk_opts[OPT_NOREPLY] = True
         
+        opts = dict(opts)
+        opts[OPT_FLAG] = opts.get(OPT_FLAG, 0) | FLAG_CHUNKED
+        manifest = "%s %d %d" % (version, len(chunks), len(data))
+        return (chunks, chunk_opts, manifest, opts)
+
+    def _join_chunks(self, results):
+        manifests = []
+        keys = []
+        for (key, item) in results.items():
+            if not item[2] & FLAG_CHUNKED:
+                continue
+            
+            del results[key]
+            try:
+                (version, num, size) = item[0].split()
+                (num, size) = (int(num), int(size))
+            except ValueError:
+                continue
+            
+            chunk_keys = [chunk_key(key, version, i) for i in xrange(num)]
+            manifests.append((key, item, chunk_keys, size))
+            keys.extend(chunk_keys)
+        
+        if not keys:
+            return results
+        
+        chunks = self._get('get', keys)
+        for (key, item, chunk_keys, size) in manifests:
+            parts = []
+            for chunk in chunk_keys:
+                if not chunks.has_key(chunk):
+                    break
+                parts.append(chunks[chunk][0])
+            else:
+                data = "".join(parts)
+                if len(data) == size:
+                    results[key] = (data, key, item[2] & ~FLAG_CHUNKED,
+                                    size, item[4])
+        return results
+
+    def _set_cmd(self, cmd, key, value, kwargs):
+        (value, kwargs) = self._encode(cmd, value, kwargs)
+        return store_cmd(cmd, key, value, kwargs)
+
+    def _set_parts(self, cmd, key, value, kwargs):
+        (value, kwargs) = self._encode(cmd, value, kwargs)
+        value = value_data(value)
+        (header, noreply) = store_header(cmd, key, len(value), kwargs)
+        return ([header, LINE_DELIMITER, value, LINE_DELIMITER], noreply)
+
+    def _set_reply(self, key):
+        return store_result(self._readline(), key)
+
+    def _set(self, cmd, key, value, kwargs={}):
+        if self._hotkeys is not None:
+            self._hotkeys.record((key,))
+        if self._instruments is not None:
+            return self._instruments.call(cmd, self._server, self._do_set,
+                                          cmd, key, value, kwargs)
+        return self._do_set(cmd, key, value, kwargs)
+
+    def _do_set(self, cmd, key, value, kwargs):
+        if self._binary is not None:
+            return self._binary.store(cmd, key, value, kwargs)
+        
+        (parts, noreply) = self._set_parts(cmd, key, value, kwargs)
+        
+        self._send_parts(parts)
         if noreply:
-            self._send_cmd(cmdline)
             return
-        else:
-            result = self._send_readline(cmdline)
         
-        if result == "STORED":
-            pass
+        return self._set_reply(key)
+        
+        
+    def _get_cmd(self, cmd, keys):
+        return get_cmd(cmd, keys)
 
-        elif result == "NOT_STORED":
-            raise StoreError("store error:%s" % key)
+    def _get_reply(self, cmdline, use_cas=False):
+        return self._read_reply(GetReply(cmdline, use_cas))
 
-        else:
-            raise Error("Unknown error:%s" % result)
+    def _get(self, cmd, keys, use_cas=False):
+        if self._hotkeys is not None:
+            self._hotkeys.record(keys)
+        instruments = self._instruments
+        if instruments is None:
+            return self._do_get(cmd, keys, use_cas)
         
-        return
+        results = instruments.call(cmd, self._server, self._do_get,
+                                   cmd, keys, use_cas)
+        instruments.lookups(self._server, len(keys), len(results))
+        return results
+
+    def _do_get(self, cmd, keys, use_cas):
+        if self._binary is not None:
+            return self._decode_results(self._binary.get(cmd, keys, use_cas))
         
+        cmdline = self._get_cmd(cmd, keys)
         
-    def _get(self, cmd, keys, use_cas=False):
-        results = {}
+        self._send_cmd(cmdline)
         
-        for key in keys:
-            self._check_key(key)
+        return self._decode_results(self._get_reply(cmdline, use_cas))
+
+    def _value_header(self, key):
+        """ Sends a get of key and returns (size, chunk keys) of its value.
 
-        cmdline = "%s %s\r\n" % (cmd, " ".join(keys))
+        chunk keys is None unless the value is stored by chunks, whose
+        manifest is read here. The value is read by _value_body after it.
+        """
+        if self._binary is not None:
+            raise Error("streaming gets are supported only on the text protocol.")
+        
+        if self._hotkeys is not None:
+            self._hotkeys.record((key,))
+        (flags, size) = self._value_line(key)
+        if self._chunk_size is None or not flags & FLAG_CHUNKED:
+            return (size, None)
+        
+        manifest = bytearray(size)
+        self._recv_value(memoryview(manifest))
+        self._value_end(key)
+        try:
+            (version, num, size) = str(manifest).split()
+            (num, size) = (int(num), int(size))
+        except ValueError:
+            raise Error("Invalid manifest: get %s - %s" % (key, manifest))
         
-        self._sock.send(cmdline)
+        return (size, [chunk_key(key, version, i) for i in xrange(num)])
 
-        while(True):
-            line = self._readline()
+    def _value_line(self, key):
+        self._send_cmd(self._get_cmd('get', [key]))
+        
+        line = self._readline()
+        if line == 'END':
+            raise KeyNotFoundError("Key:%s is not found." % key)
+        
+        header = parse_line(line)
+        if type(header) is not tuple:
+            raise Error("Unknown error: get %s - %s" % (key, line))
+        
+        return header[1:3]
 
-            if line == "END":
-                break
+    def _value_body(self, key, size, chunks, read):
+        """ Calls read(n) for every n bytes of the value up to size, which
+        receives them from the socket. The chunks of a chunked value are
+        got one at a time, and a missing one makes the value a miss.
+        """
+        if chunks is None:
+            read(size)
+            self._value_end(key)
+            return
+        
+        left = size
+        for chunk in chunks:
+            try:
+                (flags, n) = self._value_line(chunk)
+            except KeyNotFoundError:
+                raise KeyNotFoundError("Key:%s is not found." % key)
             
-            elif not line.startswith("VALUE "):
-                raise Error("Unknown error: %s - %s" % (cmdline, line))
-                
-            if use_cas:
-                (cmd, key, flags, bytes, cas) = line.split()
-            else:
-                (cmd, key, flags, bytes) = line.split()
-                cas = None
+            if n > left:
+                self._stream_value(n, bytearray(min(n, BUF_LEN)), None)
+                self._value_end(chunk)
+                raise Error("Invalid chunk: get %s - %s" % (key, chunk))
             
-            bytes = int(bytes)
-            flags = int(flags)
-            if cas != None:
-                cas = int(cas)
+            read(n)
+            self._value_end(chunk)
+            left -= n
+        
+        if left:
+            raise Error("Invalid chunks: get %s - %d bytes short"
+                        % (key, left))
 
-            results[key] = (self._read(bytes), key, flags, bytes, cas)
+    def _recv_value(self, view):
+        """ Fills view with the value, first from the buffer. """
+        n = self._buf.read_into(view)
+        size = len(view)
+        while n < size:
+            r = self._sock.recv_into(view[n:], size - n)
+            if not r:
+                raise SocketError('No data received.')
+            if self._instruments is not None:
+                self._instruments.count(BYTES_RECEIVED, self._server, r)
+            n += r
 
-        return results
+    def _value_end(self, key):
+        self._read(0)
+        line = self._readline()
+        if line != 'END':
+            raise Error("Unknown error: get %s - %s" % (key, line))
 
-    def _incr_decr(self, cmd, key, value, kwargs={}):
-        opt = []
-        noreply = False
+    def get_into(self, key, buffer):
+        """ Receives the value of key into buffer and returns its size.
+
+        The value is received straight into buffer, which can be a
+        bytearray, a writable memoryview or an mmap. Error is raised when
+        it's smaller than the value. The value isn't decoded by the codec.
+        A value stored by chunks is received chunk by chunk.
+        """
+        return self._get_value(self._get_into, key, buffer)
+
+    def _get_value(self, method, key, *args):
+        # a get of one value, timed and counted like _get.
+        instruments = self._instruments
+        if instruments is None:
+            return method(key, *args)
         
-        self._check_key(key)
+        try:
+            size = instruments.call('get', self._server, method, key, *args)
+        except KeyNotFoundError:
+            instruments.lookups(self._server, 1, 0)
+            raise
+        instruments.lookups(self._server, 1, 1)
+        return size
+
+    def _get_into(self, key, buffer):
+        (size, chunks) = self._value_header(key)
+        
+        if len(buffer) < size:
+            # the chunks of a chunked value aren't got yet.
+            if chunks is None:
+                self._stream_value(size, bytearray(min(size, BUF_LEN)), None)
+                self._value_end(key)
+            raise Error("Buffer is too small: %d < %d" % (len(buffer), size))
         
-        if not 0 <= value:
-            raise Error("Value must be integer.") 
+        pos = [0]
+        try:
+            view = memoryview(buffer)
+        except TypeError:
+            # mmap has no memoryview on Python 2, so it's filled by chunks.
+            def write(data):
+                buffer[pos[0]:pos[0] + len(data)] = data
+                pos[0] += len(data)
+            
+            chunk = bytearray(min(size, BUF_LEN) or 1)
+            def read(n):
+                self._stream_value(n, chunk, write)
+        else:
+            def read(n):
+                self._recv_value(view[pos[0]:pos[0] + n])
+                pos[0] += n
+        
+        self._value_body(key, size, chunks, read)
+        return size
+
+    def _stream_value(self, size, chunk, write):
+        view = memoryview(chunk)
+        left = size
+        while left:
+            n = min(left, len(view))
+            self._recv_value(view[:n])
+            if write is not None:
+                write(view[:n].tobytes())
+            left -= n
+
+    def get_stream(self, key, fileobj, chunk_size=BUF_LEN):
+        """ Writes the value of key to fileobj by chunks and returns its size.
 
+        At most chunk_size bytes of the value are held at a time, also when
+        it's stored by chunks. The value isn't decoded by the codec.
+        """
+        return self._get_value(self._get_stream, key, fileobj, chunk_size)
+
+    def _get_stream(self, key, fileobj, chunk_size):
+        (size, chunks) = self._value_header(key)
         
-        if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
-            opt.append(OPT_NOREPLY)
-            noreply = True
+        chunk = bytearray(min(size, chunk_size) or 1)
+        def read(n):
+            self._stream_value(n, chunk, fileobj.write)
         
-        if kwargs.has_key(OPT_SYNC) and kwargs[OPT_SYNC]:
-            opt.append(OPT_SYNC)
+        self._value_body(key, size, chunks, read)
+        return size
+
+    def _incr_decr_cmd(self, cmd, key, value, kwargs):
+        return incr_decr_cmd(cmd, key, value, kwargs)
 
-        cmdline = "%s %s %d %s" % \
-                    (cmd, key, value, " ".join(opt))
+    def _incr_decr_reply(self, key):
+        return incr_decr_result(self._readline(), key)
+
+    def _incr_decr(self, cmd, key, value, kwargs={}):
+        if self._hotkeys is not None:
+            self._hotkeys.record((key,))
+        if self._instruments is not None:
+            return self._instruments.call(cmd, self._server,
+                                          self._do_incr_decr,
+                                          cmd, key, value, kwargs)
+        return self._do_incr_decr(cmd, key, value, kwargs)
+
+    def _do_incr_decr(self, cmd, key, value, kwargs):
+        if self._binary is not None:
+            return self._binary.incr_decr(cmd, key, value, kwargs)
+        
+        (cmdline, noreply) = self._incr_decr_cmd(cmd, key, value, kwargs)
 
+        self._send_cmd(cmdline)
         if noreply:
-            self._send_cmd(cmdline)
             return
-        else:
-            result = self._send_readline(cmdline)
         
-        if result.isdigit():
-            value = int(result)
-            
-        elif result == "NOT_FOUND":
-            raise KeyNotFoundError("key:%s is not found." % key)
+        return self._incr_decr_reply(key)
         
-        elif result.startswith('CLIENT_ERROR'):
-            raise Error(result)
+
+    def _delete_cmd(self, key, kwargs):
+        return delete_cmd(key, kwargs)
+
+    def _delete_reply(self, key):
+        return delete_result(self._readline(), key)
+
+    def _delete(self, key, kwargs={}):
+        if self._hotkeys is not None:
+            self._hotkeys.record((key,))
+        if self._instruments is not None:
+            return self._instruments.call('delete', self._server,
+                                          self._do_delete, key, kwargs)
+        return self._do_delete(key, kwargs)
+
+    def _do_delete(self, key, kwargs):
+        if self._binary is not None:
+            return self._binary.delete(key, kwargs)
         
-        else:
-            raise Error("Unknown error:%s" % result)
+        (cmdline, noreply) = self._delete_cmd(key, kwargs)
         
-        return value
+        self._send_cmd(cmdline)
+        if noreply:
+            return
         
+        return self._delete_reply(key)
+    
+    
+    def _set_multi(self, mapping, kwargs={}):
+        if self._hotkeys is not None:
+            self._hotkeys.record(mapping)
+        if self._instruments is not None:
+            return self._instruments.call('set_multi', self._server,
+                                          self._do_set_multi, mapping, kwargs)
+        return self._do_set_multi(mapping, kwargs)
 
-    def _delete(self, key, kwargs={}):
-        opt = []
-        noreply = False
+    def _do_set_multi(self, mapping, kwargs):
+        if self._binary is not None:
+            return self._binary.set_multi(mapping, kwargs)
+        
+        failed = []
+        items = []
+        cmds = []
+        
+        opts = dict(kwargs)
+        opts[OPT_NOREPLY] = True
+        
+        # sent and read back by batches: the replies to a large mapping,
+        # such as errors, could fill the buffers of both sides while the
+        # client is still sending.
+        for (key, value) in mapping.iteritems():
+            try:
+                (cmdline, noreply) = self._set_cmd('set', key, value, opts)
+            except Error:
+                failed.append(key)
+                continue
+            
+            items.append((key, value))
+            cmds.append(cmdline)
+            cmds.append(LINE_DELIMITER)
+            if len(items) >= MULTI_BATCH_SIZE:
+                failed.extend(self._set_multi_batch(items, cmds, kwargs))
+                items = []
+                cmds = []
         
-        self._check_key(key)
+        if items:
+            failed.extend(self._set_multi_batch(items, cmds, kwargs))
+        
+        return failed
 
-        if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
-            opt.append(OPT_NOREPLY)
-            noreply = True
+    def _set_multi_batch(self, items, cmds, kwargs):
+        # version works as a fence: once it is answered, the server has
+        # consumed every command sent before it.
+        cmds.append('version')
+        cmds.append(LINE_DELIMITER)
+        self._send_cmds(cmds)
+        
+        errors = 0
+        while(True):
+            line = self._readline()
+            if line.startswith('VERSION '):
+                break
+            errors += 1
+        
+        if not errors:
+            return []
+        
+        # noreply commands answer only on errors, so the replies can't be
+        # matched to keys. set is idempotent and it's sent again with
+        # replies to find the failed ones.
+        return self._set_multi_check(items, kwargs)
 
-        cmdline = "delete %s %s" % (key, " ".join(opt))
+    def _set_multi_check(self, items, kwargs):
+        failed = []
         
-        if noreply:
-            self._send_cmd(cmdline)
-            return
-        else:
-            result = self._send_readline(cmdline)
+        opts = dict(kwargs)
+        opts.pop(OPT_NOREPLY, None)
         
-        if result == 'DELETED':
-            pass
+        for i in xrange(0, len(items), MULTI_BATCH_SIZE):
+            batch = items[i:i + MULTI_BATCH_SIZE]
+            
+            p = self.pipeline()
+            for (key, value) in batch:
+                p.set(key, value, **opts)
+            
+            for ((key, value), result) in zip(batch, p.execute()):
+                if isinstance(result, memc.Error):
+                    failed.append(key)
         
-        elif result ==  "NOT_FOUND":
-            raise KeyNotFoundError("key:%s is not found." % key)
+        return failed
+
+    def _meta_reply(self, func, key):
+        return self._read_reply(MetaReply(func, key))
+
+    def _meta(self, cmdline, func, key):
+        if self._binary is not None:
+            raise Error("meta commands are supported only on the text protocol.")
         
-        else:
-            raise Error("Unknown error:%s" % result)
+        if self._hotkeys is not None:
+            self._hotkeys.record((key,))
+        if self._instruments is not None:
+            # named by the command, such as mg or ms.
+            return self._instruments.call(cmdline[:2], self._server,
+                                          self._do_meta, cmdline, func, key)
+        return self._do_meta(cmdline, func, key)
+
+    def _do_meta(self, cmdline, func, key):
+        self._send_cmd(cmdline)
         
-        return
-    
-    
+        return self._meta_reply(func, key)
+
+    def meta_get(self, key, fields=('value',), **kwargs):
+        """ Returns a dict of the requested fields of key.
+
+        fields are names of memc.protocol.META_FIELDS. touch, vivify and
+        recache take a TTL, and win/stale/win_sent are set in the dict when
+        the server marks the item so.
+        """
+        return self._meta(meta_get_cmd(key, fields, kwargs),
+                          meta_get_result, key)
+
+    def meta_set(self, key, value, **kwargs):
+        """ Stores value and returns its cas when return_cas is given. """
+        return self._meta(meta_set_cmd(key, value, kwargs),
+                          meta_set_result, key)
+
+    def meta_delete(self, key, **kwargs):
+        return self._meta(meta_delete_cmd(key, kwargs),
+                          meta_delete_result, key)
+
+    def meta_arithmetic(self, key, delta=1, **kwargs):
+        return self._meta(meta_arithmetic_cmd(key, delta, kwargs),
+                          meta_arithmetic_result, key)
+
+    def pipeline(self):
+        if self._binary is not None:
+            raise Error("pipeline is supported only on the text protocol.")
+        
+        return Pipeline(self)
+
     def delete(self, key, **kwargs):
         return self._delete(key, kwargs)
 
     def set(self, key, value, **kwargs):
-        return self._set('set', key, value, kwargs)
+        return self._set_value(key, value, kwargs)
 
     def add(self, key, value, **kwargs):
         return self._set('add', key, value, kwargs)
@@ -320,6 +864,27 @@ class Client(object):
         kwargs[OPT_CAS] = cas
         return self._set('cas', key, value, kwargs)
 
+    def set_multi(self, mapping, **kwargs):
+        """ Stores every item of mapping and returns the failed keys. """
+        return self._set_multi(mapping, kwargs)
+
+    def mset(self, mapping, **kwargs):
+        return self.set_multi(mapping, **kwargs)
+
+    def get_or_compute(self, key, fn, ttl, **kwargs):
+        """ Returns the value of key, which is computed by fn() and cached
+        for ttl seconds when needed. See memc.compute.
+        """
+        return memc.compute.get_or_compute(self, key, fn, ttl, **kwargs)
+
+    def hot_keys(self):
+        """ Returns [(key, rate)] of the keys accessed most often now, see
+        memc.hotkeys. It's empty without a HotKeys.
+        """
+        if self._hotkeys is None:
+            return []
+        return self._hotkeys.heavy_hitters()
+
     def raw_get(self, key):
         result = self._get('get', [key])
         
@@ -349,6 +914,129 @@ class Client(object):
     def raw_mgets(self, keys):
         return self._get("gets", keys, True)
 
+    def _mget_batches(self, keys, batch_size):
+        batch = []
+        length = 0
+        for key in keys:
+            check_key(key)
+            if batch and (len(batch) >= batch_size or
+                          length + len(key) + 1 > MAX_GET_LINE_LEN):
+                yield batch
+                batch = []
+                length = 0
+            
+            batch.append(key)
+            length += len(key) + 1
+        
+        if batch:
+            yield batch
+
+    def _next_event(self):
+        while(True):
+            event = self._buf.next_event()
+            if event is not None:
+                return event
+            self._recv()
+
+    def iter_mget(self, keys, batch_size=MGET_BATCH_SIZE):
+        """ Yields (key, value) of the found keys as their replies arrive.
+
+        keys may be any iterable. They are sent by get commands of
+        batch_size keys at most, and the next command is on the wire while
+        the reply of the current one is read, so only two batches are held
+        at a time. Stopping the iteration early reads the replies left.
+        """
+        # chunks of a value are read by another get, which can't be sent
+        # in the middle of a stream.
+        if self._binary is not None or self._chunk_size is not None:
+            return self._iter_mget_batches(keys, batch_size)
+        
+        return self._iter_mget(keys, batch_size)
+
+    def _iter_mget_batches(self, keys, batch_size):
+        for batch in self._mget_batches(keys, batch_size):
+            result = self._get('get', batch)
+            for key in batch:
+                if result.has_key(key):
+                    yield (key, result[key][0])
+
+    def _send_mget(self, batch, pending):
+        if self._hotkeys is not None:
+            self._hotkeys.record(batch)
+        self._send_cmd("get %s" % " ".join(batch))
+        pending.append(len(batch))
+
+    def _iter_mget(self, keys, batch_size):
+        batches = self._mget_batches(keys, batch_size)
+        decode = None
+        if self._codec is not None:
+            decode = self._codec.decode
+        instruments = self._instruments
+        
+        # number of keys of each batch sent whose END isn't read yet
+        pending = collections.deque()
+        for batch in itertools.islice(batches, 2):
+            self._send_mget(batch, pending)
+        
+        found = 0
+        if instruments is not None:
+            start = instruments.clock()
+        try:
+            while pending:
+                event = self._next_event()
+                if event is END:
+                    # every batch is timed and counted like a get of _get.
+                    if instruments is not None:
+                        now = instruments.clock()
+                        instruments.timing('get', self._server, now - start)
+                        instruments.lookups(self._server, pending[0], found)
+                        start = now
+                    pending.popleft()
+                    found = 0
+                    for batch in itertools.islice(batches, 1):
+                        self._send_mget(batch, pending)
+                    continue
+                
+                if type(event) is not Value:
+                    raise Error("Unknown error: get - %s" % (event,))
+                
+                (key, flags, cas, data) = event
+                found += 1
+                if decode is None:
+                    item = (key, data.tobytes())
+                else:
+                    item = (key, decode(data.tobytes(), flags))
+                
+                if instruments is None:
+                    yield item
+                    continue
+                
+                paused = instruments.clock()
+                yield item
+                # the time taken by the caller isn't the time of the get.
+                start += instruments.clock() - paused
+        
+        except EnvironmentError:
+            # the replies left can't be read any more.
+            if instruments is not None:
+                instruments.count(ERRORS, self._server)
+            self._disconnect()
+            raise
+        except:
+            # stopped early, an invalid key in the next batch or a value
+            # which can't be decoded: the replies left would be read by
+            # the next command otherwise.
+            self._drain_mget(len(pending))
+            raise
+
+    def _drain_mget(self, sent):
+        try:
+            while sent:
+                if self._next_event() is END:
+                    sent -= 1
+        except Exception:
+            self._disconnect()
+
     def incr(self, key, value, **kwargs):
         return self._incr_decr('incr', key, value, kwargs)
 
@@ -360,6 +1048,235 @@ class Client(object):
 
     def mget(self, keys):
         return self.raw_mget(keys)
+
+
+class Pipeline(object):
+    """ Queues commands of a Client and sends them in one write.
+
+    execute() sends the queued commands, reads the replies in order and
+    returns a list with one result per command. Errors reported by the
+    server, such as StoreError and KeyNotFoundError, are put in the list
+    instead of being raised. A socket error aborts the whole batch and
+    closes the connection, whose replies can't be read in order any more.
+    set stores a value larger than chunk_size by chunks, like Client.set.
+
+    Used as a context manager, the queued commands are executed when the
+    block exits without an exception and the list is kept in results.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._cmds = []
+        self._replies = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.reset()
+
+    def __len__(self):
+        return len(self._replies)
+
+    def reset(self):
+        self._cmds = []
+        self._replies = []
+
+    def _queue(self, cmdline, noreply, reply, *args):
+        self._cmds.append(cmdline)
+        self._cmds.append(LINE_DELIMITER)
+        
+        if noreply:
+            self._replies.append((None, args))
+        else:
+            self._replies.append((reply, args))
+
+    def execute(self):
+        cmds = self._cmds
+        replies = self._replies
+        self.reset()
+
+        client = self._client
+        if client._instruments is None:
+            results = self._execute(cmds, replies)
+        else:
+            results = client._instruments.call('pipeline', client._server,
+                                               self._execute, cmds, replies)
+        self.results = results
+        return results
+
+    def _execute(self, cmds, replies):
+        results = []
+        try:
+            if cmds:
+                self._client._send_cmds(cmds)
+            
+            for (reply, args) in replies:
+                if reply is None:
+                    results.append(None)
+                    continue
+                
+                try:
+                    results.append(reply(*args))
+                except memc.Error as e:
+                    results.append(e)
+        
+        except EnvironmentError:
+            # the replies left would be read by the next command.
+            self._client._disconnect()
+            raise
+        
+        return results
+
+    def _lookups(self, keys, found):
+        client = self._client
+        if client._instruments is not None:
+            client._instruments.lookups(client._server, keys, found)
+
+    def _get_value(self, cmdline, key, use_cas, raw):
+        result = self._client._get_reply(cmdline, use_cas)
+        result = self._client._decode_results(result, False)
+        self._lookups(1, len(result))
+        
+        if result.has_key(key):
+            if raw:
+                return result[key]
+            return result[key][0]
+        
+        raise KeyNotFoundError("Key:%s is not found." % key)
+
+    def _mget_values(self, cmdline, keys):
+        result = self._client._decode_results(self._client._get_reply(cmdline),
+                                              False)
+        self._lookups(len(keys), len(result))
+        lst = []
+        for key in keys:
+            if result.has_key(key):
+                lst.append(result[key][0])
+            else:
+                lst.append(None)
+        return lst
+
+    def _set(self, cmd, key, value, kwargs):
+        (cmdline, noreply) = self._client._set_cmd(cmd, key, value, kwargs)
+        self._queue(cmdline, noreply, self._client._set_reply, key)
+        return self
+
+    def _set_value(self, key, value, kwargs):
+        client = self._client
+        if client._chunk_size is None:
+            return self._set('set', key, value, kwargs)
+        
+        (data, opts) = client._encode_value(value, kwargs)
+        if len(data) <= client._chunk_size:
+            return self._set('set', key, data, opts)
+        
+        (chunks, chunk_opts, manifest, opts) = client._split_value(key, data,
+                                                                   opts)
+        # the chunks are set with replies, since an error reply to a
+        # noreply one would be taken for the reply of another command.
+        chunk_opts.pop(OPT_NOREPLY)
+        cmdlines = []
+        for (chunk, part) in chunks.iteritems():
+            cmdlines.append(client._set_cmd('set', chunk, part, chunk_opts)[0])
+        (cmdline, noreply) = client._set_cmd('set', key, manifest, opts)
+        cmdlines.append(cmdline)
+        
+        # queued as one command, whose result is the first error.
+        self._queue(LINE_DELIMITER.join(cmdlines), False, self._chunks_reply,
+                    key, len(chunks), noreply)
+        return self
+
+    def _chunks_reply(self, key, num, noreply):
+        error = None
+        for i in xrange(num + (not noreply)):
+            try:
+                self._client._set_reply(key)
+            except memc.Error as e:
+                if error is None:
+                    error = e
+        
+        if error is not None:
+            raise error
+
+    def _incr_decr(self, cmd, key, value, kwargs):
+        (cmdline, noreply) = self._client._incr_decr_cmd(cmd, key, value, kwargs)
+        self._queue(cmdline, noreply, self._client._incr_decr_reply, key)
+        return self
+
+    def _get(self, cmd, key, use_cas, raw):
+        cmdline = self._client._get_cmd(cmd, [key])
+        self._queue(cmdline, False, self._get_value, cmdline, key, use_cas, raw)
+        return self
+
+    def delete(self, key, **kwargs):
+        (cmdline, noreply) = self._client._delete_cmd(key, kwargs)
+        self._queue(cmdline, noreply, self._client._delete_reply, key)
+        return self
+
+    def set(self, key, value, **kwargs):
+        return self._set_value(key, value, kwargs)
+
+    def add(self, key, value, **kwargs):
+        return self._set('add', key, value, kwargs)
+
+    def replace(self, key, value, **kwargs):
+        return self._set('replace', key, value, kwargs)
+
+    def append(self, key, value, **kwargs):
+        return self._set('append', key, value, kwargs)
+
+    def prepend(self, key, value, **kwargs):
+        return self._set('prepend', key, value, kwargs)
+
+    def cas(self, key, value, cas, **kwargs):
+        kwargs[OPT_CAS] = cas
+        return self._set('cas', key, value, kwargs)
+
+    def incr(self, key, value, **kwargs):
+        return self._incr_decr('incr', key, value, kwargs)
+
+    def decr(self, key, value, **kwargs):
+        return self._incr_decr('decr', key, value, kwargs)
+
+    def get(self, key):
+        return self._get('get', key, False, False)
+
+    def raw_get(self, key):
+        return self._get('get', key, False, True)
+
+    def raw_gets(self, key):
+        return self._get('gets', key, True, True)
+
+    def mget(self, keys):
+        cmdline = self._client._get_cmd('get', keys)
+        self._queue(cmdline, False, self._mget_values, cmdline, keys)
+        return self
+
+    def _meta(self, cmdline, func, key):
+        self._queue(cmdline, False, self._client._meta_reply, func, key)
+        return self
+
+    def meta_get(self, key, fields=('value',), **kwargs):
+        return self._meta(meta_get_cmd(key, fields, kwargs),
+                          meta_get_result, key)
+
+    def meta_set(self, key, value, **kwargs):
+        return self._meta(meta_set_cmd(key, value, kwargs),
+                          meta_set_result, key)
+
+    def meta_delete(self, key, **kwargs):
+        return self._meta(meta_delete_cmd(key, kwargs),
+                          meta_delete_result, key)
+
+    def meta_arithmetic(self, key, delta=1, **kwargs):
+        return self._meta(meta_arithmetic_cmd(key, delta, kwargs),
+                          meta_arithmetic_result, key)
+
         
 if __name__ == "__main__":
     pass
@@ -0,0 +1,313 @@
+'''
+Created on 2026/10/18
+
+Binary protocol of memcached.
+
+basic.Client uses it instead of the text protocol with protocol='binary'.
+Headers are packed and unpacked by precompiled structs. noreply commands
+are sent with the quiet opcodes, and since every request has its own
+opaque, an error reply of a quiet command is never taken for the reply of
+a later command. Multi-gets are sent as GETKQ requests and multi-sets as
+SETQ requests, followed by a NOOP.
+'''
+
+import struct
+
+from collections import namedtuple
+
+from memc.protocol import Error, StoreError, KeyNotFoundError
+from memc.protocol import check_key, value_data
+from memc.protocol import OPT_FLAG, OPT_EXPIRE, OPT_NOREPLY, OPT_CAS
+
+HEADER = struct.Struct("!BBHBBHIIQ")
+HEADER_LEN = HEADER.size
+STORE_EXTRAS = struct.Struct("!II")
+INCR_DECR_EXTRAS = struct.Struct("!QQI")
+FLAGS = struct.Struct("!I")
+COUNTER = struct.Struct("!Q")
+
+REQUEST_MAGIC = 0x80
+RESPONSE_MAGIC = 0x81
+
+# incr/decr fail on a missing key instead of creating it
+NO_CREATE = 0xffffffff
+
+OP_GET      = 0x00
+OP_SET      = 0x01
+OP_ADD      = 0x02
+OP_REPLACE  = 0x03
+OP_DELETE   = 0x04
+OP_INCR     = 0x05
+OP_DECR     = 0x06
+OP_NOOP     = 0x0a
+OP_VERSION  = 0x0b
+OP_GETKQ    = 0x0d
+OP_APPEND   = 0x0e
+OP_PREPEND  = 0x0f
+OP_STAT     = 0x10
+OP_SETQ     = 0x11
+OP_ADDQ     = 0x12
+OP_REPLACEQ = 0x13
+OP_DELETEQ  = 0x14
+OP_INCRQ    = 0x15
+OP_DECRQ    = 0x16
+OP_QUITQ    = 0x17
+OP_APPENDQ  = 0x19
+OP_PREPENDQ = 0x1a
+
+STATUS_OK         = 0x00
+STATUS_NOT_FOUND  = 0x01
+STATUS_EXISTS     = 0x02
+STATUS_TOO_LARGE  = 0x03
+STATUS_INVALID    = 0x04
+STATUS_NOT_STORED = 0x05
+STATUS_NON_NUMERIC = 0x06
+
+_store_opcodes = {
+    'set': (OP_SET, OP_SETQ),
+    'add': (OP_ADD, OP_ADDQ),
+    'replace': (OP_REPLACE, OP_REPLACEQ),
+    'append': (OP_APPEND, OP_APPENDQ),
+    'prepend': (OP_PREPEND, OP_PREPENDQ),
+    'cas': (OP_SET, OP_SETQ),
+}
+
+_incr_decr_opcodes = {
+    'incr': (OP_INCR, OP_INCRQ),
+    'decr': (OP_DECR, OP_DECRQ),
+}
+
+Response = namedtuple('Response', 'opcode status opaque cas extras key value')
+
+
+def request(opcode, key='', extras='', value='', opaque=0, cas=0):
+    header = HEADER.pack(REQUEST_MAGIC, opcode, len(key), len(extras), 0, 0,
+                         len(key) + len(extras) + len(value), opaque, cas)
+    return [header, extras, key, value]
+
+
+class ResponseReply(object):
+    """ Reply of one response packet. """
+
+    def __init__(self):
+        self._header = None
+        self._result = None
+
+    def parse(self, reader):
+        if self._header is None:
+            data = reader.take(HEADER_LEN)
+            if data is None:
+                return False
+
+            self._header = HEADER.unpack(data)
+            if self._header[0] != RESPONSE_MAGIC:
+                raise Error("Invalid response magic: 0x%02x" % self._header[0])
+
+        (magic, opcode, key_len, extras_len, data_type, status,
+         body_len, opaque, cas) = self._header
+
+        body = reader.take(body_len)
+        if body is None:
+            return False
+
+        key_end = extras_len + key_len
+        self._result = Response(opcode, status, opaque, cas, body[:extras_len],
+                                body[extras_len:key_end], body[key_end:])
+        return True
+
+    def result(self):
+        return self._result
+
+
+class Protocol(object):
+    """ Commands of basic.Client over the binary protocol. """
+
+    def __init__(self, client):
+        self._client = client
+        self._opaque = 0
+
+    def _next_opaque(self):
+        self._opaque = (self._opaque + 1) & 0xffffffff
+        return self._opaque
+
+    def _read(self):
+        return self._client._read_reply(ResponseReply())
+
+    def _reply(self, opaque):
+        while(True):
+            res = self._read()
+            # replies of other opaques are errors of quiet commands sent
+            # before, which nobody waits for.
+            if res.opaque == opaque:
+                return res
+
+    def _error(self, res):
+        return Error("Unknown error:0x%02x %s" % (res.status, res.value))
+
+    def version(self):
+        opaque = self._next_opaque()
+        self._client._send_cmds(request(OP_VERSION, opaque=opaque))
+        return "VERSION %s" % self._reply(opaque).value
+
+    def stats(self, arg=""):
+        stats = {}
+        opaque = self._next_opaque()
+        self._client._send_cmds(request(OP_STAT, arg, opaque=opaque))
+
+        while(True):
+            res = self._reply(opaque)
+            if res.status != STATUS_OK:
+                raise Error("Argument error: stats %s" % arg)
+            if not res.key:
+                return stats
+            stats[res.key] = res.value
+
+    def close(self):
+        self._client._send_cmds(request(OP_QUITQ))
+
+    def _store_request(self, cmd, key, value, kwargs, opaque):
+        check_key(key)
+
+        (value, kwargs) = self._client._encode(cmd, value, kwargs)
+        flag = kwargs.get(OPT_FLAG, 0)
+        expire = kwargs.get(OPT_EXPIRE, 0)
+        cas = kwargs.get(OPT_CAS, 0)
+        noreply = bool(kwargs.get(OPT_NOREPLY))
+
+        value = value_data(value)
+
+        if cmd in ('append', 'prepend'):
+            extras = ''
+        else:
+            extras = STORE_EXTRAS.pack(flag, expire)
+
+        opcode = _store_opcodes[cmd][noreply]
+        return (request(opcode, key, extras, value, opaque, cas), noreply)
+
+    def _store_result(self, cmd, key, res):
+        if res.status == STATUS_OK:
+            return
+
+        if cmd != 'cas' and res.status in (STATUS_NOT_STORED, STATUS_EXISTS,
+                                           STATUS_NOT_FOUND):
+            raise StoreError("store error:%s" % key)
+
+        raise self._error(res)
+
+    def store(self, cmd, key, value, kwargs):
+        opaque = self._next_opaque()
+        (packet, noreply) = self._store_request(cmd, key, value, kwargs, opaque)
+
+        self._client._send_parts(packet)
+        if noreply:
+            return
+
+        return self._store_result(cmd, key, self._reply(opaque))
+
+    def get(self, cmd, keys, use_cas=False):
+        results = {}
+        packets = []
+
+        for key in keys:
+            check_key(key)
+            packets.extend(request(OP_GETKQ, key))
+
+        opaque = self._next_opaque()
+        packets.extend(request(OP_NOOP, opaque=opaque))
+        self._client._send_cmds(packets)
+
+        while(True):
+            res = self._read()
+            if res.opaque == opaque:
+                return results
+
+            if res.opcode != OP_GETKQ or res.status != STATUS_OK:
+                continue
+
+            if use_cas:
+                cas = res.cas
+            else:
+                cas = None
+
+            flags = FLAGS.unpack(res.extras)[0]
+            results[res.key] = (res.value, res.key, flags, len(res.value), cas)
+
+    def incr_decr(self, cmd, key, value, kwargs):
+        check_key(key)
+
+        if not 0 <= value:
+            raise Error("Value must be integer.")
+
+        noreply = bool(kwargs.get(OPT_NOREPLY))
+        opcode = _incr_decr_opcodes[cmd][noreply]
+        extras = INCR_DECR_EXTRAS.pack(value, 0, NO_CREATE)
+
+        opaque = self._next_opaque()
+        self._client._send_cmds(request(opcode, key, extras, opaque=opaque))
+        if noreply:
+            return
+
+        res = self._reply(opaque)
+        if res.status == STATUS_OK:
+            return COUNTER.unpack(res.value)[0]
+
+        elif res.status == STATUS_NOT_FOUND:
+            raise KeyNotFoundError("key:%s is not found." % key)
+
+        raise self._error(res)
+
+    def delete(self, key, kwargs):
+        check_key(key)
+
+        noreply = bool(kwargs.get(OPT_NOREPLY))
+        opcode = (OP_DELETE, OP_DELETEQ)[noreply]
+
+        opaque = self._next_opaque()
+        self._client._send_cmds(request(opcode, key, opaque=opaque))
+        if noreply:
+            return
+
+        res = self._reply(opaque)
+        if res.status == STATUS_OK:
+            return
+
+        elif res.status == STATUS_NOT_FOUND:
+            raise KeyNotFoundError("key:%s is not found." % key)
+
+        raise self._error(res)
+
+    def set_multi(self, mapping, kwargs):
+        failed = []
+        keys = {}
+        packets = []
+
+        opts = dict(kwargs)
+        opts[OPT_NOREPLY] = True
+
+        for (key, value) in mapping.iteritems():
+            opaque = self._next_opaque()
+            try:
+                (packet, noreply) = self._store_request('set', key, value,
+                                                        opts, opaque)
+            except Error:
+                failed.append(key)
+                continue
+
+            keys[opaque] = key
+            packets.extend(packet)
+
+        if not keys:
+            return failed
+
+        # quiet sets reply only on errors, with the opaque of the request.
+        opaque = self._next_opaque()
+        packets.extend(request(OP_NOOP, opaque=opaque))
+        self._client._send_parts(packets)
+
+        while(True):
+            res = self._read()
+            if res.opaque == opaque:
+                return failed
+
+            if keys.has_key(res.opaque):
+                failed.append(keys[res.opaque])
@@ -0,0 +1,104 @@
+'''
+Created on 2026/10/18
+
+Value codecs. A Codec turns a value into the data stored on memcached and
+tags its encoding in the flag field, so the value is decoded by the flag
+when it's read back.
+
+str values and buffers (bytearray, memoryview and mmap) are stored as
+they are, int and long values as their digits, which incr/decr still work
+on, and the others are serialized by pickle or JSON. Data of
+compress_threshold bytes or more is compressed, and it's kept compressed
+only when it gets smaller.
+'''
+
+import zlib
+import json
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from memc.protocol import Error, BUFFER_TYPES, value_str
+
+FLAG_PICKLE     = 1 << 0
+FLAG_INTEGER    = 1 << 1
+FLAG_LONG       = 1 << 2
+FLAG_COMPRESSED = 1 << 3
+FLAG_JSON       = 1 << 4
+# set on the manifest of a value stored by chunks, see basic.Client
+FLAG_CHUNKED    = 1 << 15
+
+SERIALIZER_PICKLE = 'pickle'
+SERIALIZER_JSON   = 'json'
+
+
+class Codec(object):
+    """ Encodes values into (data, flags) and decodes them back.
+
+    compressor is anything with compress() and decompress(), such as zlib
+    or lz4.block. compress_threshold of None disables compression.
+    """
+
+    def __init__(self, serializer=SERIALIZER_PICKLE, compress_threshold=None,
+                 compressor=zlib):
+        if serializer not in (SERIALIZER_PICKLE, SERIALIZER_JSON):
+            raise Error("Unknown serializer: %s" % serializer)
+
+        self._serializer = serializer
+        self._compress_threshold = compress_threshold
+        self._compressor = compressor
+
+    def _serialize(self, value):
+        t = type(value)
+        if t is str or isinstance(value, BUFFER_TYPES):
+            return (value, 0)
+
+        elif t is int:
+            return (str(value), FLAG_INTEGER)
+
+        elif t is long:
+            return (str(value), FLAG_LONG)
+
+        elif self._serializer == SERIALIZER_JSON:
+            return (json.dumps(value, separators=(',', ':')), FLAG_JSON)
+
+        return (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), FLAG_PICKLE)
+
+    def encode(self, value):
+        (data, flags) = self._serialize(value)
+
+        threshold = self._compress_threshold
+        if threshold is not None and len(data) >= threshold:
+            compressed = self._compressor.compress(value_str(data))
+            if len(compressed) < len(data):
+                return (compressed, flags | FLAG_COMPRESSED)
+
+        return (data, flags)
+
+    def decode(self, data, flags):
+        try:
+            if flags & FLAG_COMPRESSED:
+                data = self._compressor.decompress(data)
+
+            if flags & FLAG_PICKLE:
+                return pickle.loads(data)
+
+            elif flags & FLAG_INTEGER:
+                return int(data)
+
+            elif flags & FLAG_LONG:
+                return long(data)
+
+            elif flags & FLAG_JSON:
+                return json.loads(data)
+
+        except Exception as e:
+            raise Error("Can't decode value of flags 0x%x: %s" % (flags, e))
+
+        return data
+
+
+if __name__ == "__main__":
+    pass
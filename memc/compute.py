@@ -0,0 +1,123 @@
+'''
+Created on 2026/10/18
+
+get_or_compute: read-through caching with stampede protection.
+
+A value is stored with its logical expiry and the time it took to compute
+it. The item itself lives stale_ttl seconds longer, so the old value can
+be served while it's recomputed. Only the caller which adds the lock key
+recomputes; the others get the old value, or wait up to wait seconds for
+the new one when there is none.
+
+Before the expiry, a value is recomputed early with the probability of
+XFetch (Vattani et al., "Optimal Probabilistic Cache Stampede
+Prevention"): expensive values and values near their expiry are more
+likely to be refreshed, so hot keys rarely expire at all.
+'''
+
+import math
+import time
+import random
+import hashlib
+
+from memc.protocol import Error, StoreError, KeyNotFoundError
+from memc.protocol import MAX_KEY_LEN, value_str
+
+BETA = 1.0
+LOCK_TTL = 10
+WAIT = 0.1
+WAIT_INTERVAL = 0.01
+
+
+def lock_key(key):
+    if len(key) + 5 > MAX_KEY_LEN:
+        key = hashlib.md5(key).hexdigest()
+    return "%s:lock" % key
+
+
+def pack(codec, value, expiry, delta):
+    if codec is None:
+        (data, flags) = (value, 0)
+    else:
+        (data, flags) = codec.encode(value)
+
+    return "%.3f %.3f %d\n%s" % (expiry, delta, flags, value_str(data))
+
+
+def unpack(codec, data):
+    """ Returns (value, expiry, delta) of stored data. """
+    try:
+        (header, data) = data.split("\n", 1)
+        (expiry, delta, flags) = header.split()
+        (expiry, delta, flags) = (float(expiry), float(delta), int(flags))
+    except (ValueError, AttributeError):
+        raise Error("Not a value of get_or_compute: %r" % data[:40])
+
+    if codec is not None:
+        data = codec.decode(data, flags)
+    return (data, expiry, delta)
+
+
+def get_or_compute(client, key, fn, ttl, stale_ttl=None, beta=BETA,
+                   lock_ttl=LOCK_TTL, wait=WAIT, rand=random):
+    """ Returns the cached value of key, computing it by fn() when needed.
+
+    client is a basic.Client or a flare.Pool. Values of fn() are encoded
+    by the codec of the client, and they have to be str without one.
+    beta > 1 favors earlier recomputation, and 0 disables it.
+    """
+    codec = getattr(client, '_codec', None)
+    if stale_ttl is None:
+        stale_ttl = ttl
+
+    cached = None
+    try:
+        cached = unpack(codec, client.get(key))
+    except KeyNotFoundError:
+        pass
+
+    now = time.time()
+    if cached is not None:
+        (value, expiry, delta) = cached
+        # XFetch: -log(u) is an exponential variate, which brings the
+        # expiry forward by delta * beta on average.
+        if now - delta * beta * math.log(1.0 - rand.random()) < expiry:
+            return value
+
+    lock = lock_key(key)
+    try:
+        client.add(lock, '1', expire=lock_ttl)
+    except StoreError:
+        # another caller is computing it.
+        if cached is not None:
+            return cached[0]
+
+        deadline = now + wait
+        while time.time() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            try:
+                return unpack(codec, client.get(key))[0]
+            except KeyNotFoundError:
+                pass
+        # the lock holder is too slow or gone, so it's computed here too.
+        lock = None
+
+    try:
+        start = time.time()
+        value = fn()
+        end = time.time()
+
+        client.set(key, pack(codec, value, end + ttl, end - start),
+                   expire=int(math.ceil(ttl + stale_ttl)))
+    finally:
+        if lock is not None:
+            try:
+                client.delete(lock)
+            except KeyNotFoundError:
+                pass
+
+    return value
+
+
+if __name__ == "__main__":
+    pass
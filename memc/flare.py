@@ -5,24 +5,153 @@ Created on 2010/03/15
 '''
 
 import sys
+import time
+import zlib
+import bisect
+import random
 import memc
 import memc.basic
+import memc.compute
+import memc.transport
 import socket
 
-from threading import Lock
-from Queue import Queue
-#from multiprocessing import Queue
-from memc.basic import SocketError, KeyNotFoundError
+from collections import deque
+from threading import Lock, Condition
+from memc.basic import SocketError, KeyNotFoundError, current_pid
+from memc.metrics import FAILOVERS, RETRIES, POOL_WAIT, POOL_TIMEOUTS
 
 
 RETRY_NUM = 2
 
+# each connect to a dead server costs this much at most until its circuit
+# opens.
+CONNECT_TIME_OUT = 1
+
+# used by the clients given no transport, for the timeout above
+DEFAULT_TRANSPORT = memc.transport.Transport(connect_timeout=CONNECT_TIME_OUT)
+
+FAILURE_THRESHOLD = 3
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30
+
+STATE_CLOSED    = 'closed'
+STATE_OPEN      = 'open'
+STATE_HALF_OPEN = 'half-open'
+
+
+class Breaker(object):
+    """ Circuit breaker of a server.
+
+    The circuit opens after threshold failures in a row, and the server is
+    skipped until the backoff expires. Then it's half-open: the next user
+    probes it, and the circuit closes on success or opens again with the
+    backoff doubled, up to backoff_max.
+    """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, backoff_min=BACKOFF_MIN,
+                 backoff_max=BACKOFF_MAX):
+        self._threshold = threshold
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._backoff = backoff_min
+
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.retry_at = 0
+
+    def allow(self, now):
+        if self.state == STATE_CLOSED:
+            return True
+
+        if now < self.retry_at:
+            return False
+
+        # a probe which never reported is given up after another backoff.
+        self.state = STATE_HALF_OPEN
+        self.retry_at = now + self._backoff
+        return True
+
+    def success(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._backoff = self._backoff_min
+
+    def failure(self, now):
+        self.failures += 1
+        if self.state == STATE_CLOSED and self.failures < self._threshold:
+            return
+
+        self.state = STATE_OPEN
+        self.retry_at = now + self._backoff
+        self._backoff = min(self._backoff * 2, self._backoff_max)
+
+
+class Health(object):
+    """ Breakers of servers, which can be shared by clients and threads. """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, backoff_min=BACKOFF_MIN,
+                 backoff_max=BACKOFF_MAX):
+        self._args = (threshold, backoff_min, backoff_max)
+        self._breakers = {}
+        self._lock = Lock()
+
+    def _breaker(self, server):
+        if not self._breakers.has_key(server):
+            self._breakers[server] = Breaker(*self._args)
+        return self._breakers[server]
+
+    def allow(self, server):
+        with self._lock:
+            return self._breaker(server).allow(time.time())
+
+    def success(self, server):
+        # a closed breaker without failures, which is the usual one, is
+        # left as it is without the lock.
+        breaker = self._breakers.get(server)
+        if (breaker is not None and breaker.state == STATE_CLOSED and
+            not breaker.failures):
+            return
+        with self._lock:
+            self._breaker(server).success()
+
+    def failure(self, server):
+        with self._lock:
+            self._breaker(server).failure(time.time())
+
+    def state(self, server):
+        with self._lock:
+            return self._breaker(server).state
+
+    def after_fork(self):
+        """ Called in the child of a fork, where the lock may have been
+        held by another thread of the parent. The breakers are kept.
+        """
+        self._lock = Lock()
+
 
 class Client(memc.basic.Client):
-    def __init__(self, servers):
-        super(Client, self).__init__(servers[0])
+    """ Client which fails over the servers in order.
+
+    Servers which fail are skipped while their circuits are open, so an
+    operation fails in no time when every server is down. Pass the same
+    Health to clients of the same servers to share what they have seen.
+    """
+
+    def __init__(self, servers, protocol=memc.basic.PROTOCOL_TEXT, codec=None,
+                 health=None, connect_timeout=None, chunk_size=None,
+                 instruments=None, transport=None, hotkeys=None):
+        if transport is None:
+            transport = DEFAULT_TRANSPORT
+        super(Client, self).__init__(servers[0], protocol=protocol,
+                                     codec=codec, chunk_size=chunk_size,
+                                     instruments=instruments,
+                                     transport=transport, hotkeys=hotkeys)
         
-        self._servers = servers
+        self._servers = [memc.conn2tuple(server) for server in servers]
+        self._health = health or Health()
+        # the one of the transport is used without it.
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
         self.mc = None
         
         try:
@@ -33,120 +162,379 @@ class Client(memc.basic.Client):
     def connect(self, force=False):
         pass
     
+    def _reconnect(self):
+        self._connect2()
+    
     def _connect2(self):
+        self._disconnect()
+        
         for server in self._servers:
+            if not self._health.allow(server):
+                continue
+            
             try:
-                self._server = memc.conn2tuple(server)
+                self._server = server
                 super(Client, self).connect(True)
-                return
             except socket.error:
+                self._error_log("Can't connect to %s." % memc.server2str(server))
+                if self._instruments is not None:
+                    self._instruments.count(FAILOVERS, server)
+                self._health.failure(server)
+                self._disconnect()
                 continue
+            
+            # the breaker closes by a command which gets through, in _retry.
+            return
+        
+        raise SocketError("No server is available.")
     
-    def _get(self, cmd, keys, use_cas=False):
+    def _connect_same(self):
+        try:
+            super(Client, self).connect(True)
+        except socket.error:
+            self._disconnect()
+            return False
+        return True
+
+    def _retry(self, method, *args):
         for a in xrange(RETRY_NUM):
+            if self._sock is None:
+                self._connect2()
+            
             try:
-                return super(Client, self)._get(cmd, keys, use_cas)
+                result = getattr(super(Client, self), method)(*args)
+            except memc.Error:
+                # an answer of the server, such as a missing key.
+                self._health.success(self._server)
+                raise
             except socket.error:
-                self._error_log("Can't connect to %s:%d, will attempt next one." % self._server)
-                self._connect2()
+                self._error_log("Can't connect to %s, will attempt next one."
+                                % memc.server2str(self._server))
+                if self._instruments is not None:
+                    self._instruments.count(RETRIES, self._server)
+                self._disconnect()
+                # a connection closed by the server, such as an idle one, is
+                # no failure of it if it can be opened again.
+                if a == 0 and self._connect_same():
+                    continue
+                self._health.failure(self._server)
+                continue
+            
+            self._health.success(self._server)
+            return result
+        
         raise SocketError("Can't connect servers.")
-                
+    
     def _error_log(self, msg):
+        # told to the sinks instead, see memc.metrics.stderr_sink.
+        if self._instruments is not None:
+            self._instruments.log(self._server, msg)
+            return
         sys.stderr.write("memc-flare: %s\n" % msg)
 
+    def iter_mget(self, keys, batch_size=memc.basic.MGET_BATCH_SIZE):
+        # a stream can't be retried halfway, it only starts on a live server.
+        if self._sock is None:
+            self._connect2()
+        return super(Client, self).iter_mget(keys, batch_size)
+
+    def _get(self, cmd, keys, use_cas=False):
+        return self._retry('_get', cmd, keys, use_cas)
+
     def _set(self, cmd, key, value, kwargs={}):
-        for a in xrange(RETRY_NUM):
-            try:
-                return super(Client, self)._set(cmd, key, value, kwargs)
-            except socket.error:
-                self._error_log("Can't connect to %s:%d, will attempt next one." % self._server)
-                self._connect2()
+        return self._retry('_set', cmd, key, value, kwargs)
 
-        raise SocketError("Can't connect servers.")
-                
     def _incr_decr(self, cmd, key, value, kwargs={}):
-        for a in xrange(RETRY_NUM):
-            try:
-                return super(Client, self)._incr_decr(cmd, key, value, kwargs)
-            except socket.error:
-                self._error_log("Can't connect to %s:%d, will attempt next one." % self._server)
-                self._connect2()
-                
-        raise SocketError("Can't connect servers.")
+        return self._retry('_incr_decr', cmd, key, value, kwargs)
 
     def _delete(self, key, kwargs={}):
-        for a in xrange(RETRY_NUM):
-            try:
-                return super(Client, self)._delete(key, kwargs)
-            except socket.error:
-                self._error_log("Can't connect to %s:%d, will attempt next one." % self._server)
-                self._connect2()
-            
-        raise SocketError("Can't connect servers.")
+        return self._retry('_delete', key, kwargs)
 
+    def _set_multi(self, mapping, kwargs={}):
+        return self._retry('_set_multi', mapping, kwargs)
+
+
+class PoolTimeoutError(memc.Error):
+    pass
 
 
 class Pool(object):
-    def __init__(self, servers, max_pool = 5):
+    """ Pool of flare.Client connections shared by threads.
+
+    Connections are opened when they are needed, up to max_pool, and
+    min_idle of them are opened at first and kept open. A checkout waits
+    for a free connection up to timeout seconds (None waits forever) and
+    raises PoolTimeoutError after that.
+
+    Connections left idle for max_idle_time seconds are closed down to
+    min_idle, and connections older than max_lifetime seconds are closed
+    when they are returned. A connection which raised anything but a
+    memc.Error may have a reply read halfway, so it's closed instead of
+    being returned. Connections closed by these are opened again up to
+    min_idle. With check_idle, a connection left idle for check_idle
+    seconds is checked by version before it's used, and it's replaced
+    when the check fails.
+
+    A pool used in the child of a fork drops the connections of the parent
+    and opens its own. With lazy=True, the min_idle connections are opened
+    at the first use instead of here, so a pool made before a pre-fork
+    server forks its workers connects only in the workers.
+
+    The connections take their connect timeout from transport, or from
+    connect_timeout when it's given.
+    """
+
+    def __init__(self, servers, max_pool = 5, protocol=memc.basic.PROTOCOL_TEXT,
+                 codec=None, min_idle=0, timeout=None, max_idle_time=None,
+                 max_lifetime=None, health=None, chunk_size=None,
+                 instruments=None, transport=None, lazy=False, hotkeys=None,
+                 connect_timeout=None, check_idle=None):
         self._max_pool = max_pool
         self._servers = servers
-        self._queue = Queue()
-        self._conns = []
+        self._protocol = protocol
+        self._codec = codec
+        self._chunk_size = chunk_size
+        self._min_idle = min(min_idle, max_pool)
+        self._timeout = timeout
+        self._max_idle_time = max_idle_time
+        self._max_lifetime = max_lifetime
+        self._check_idle = check_idle
+        # shared by the connections, so a dead server is found only once.
+        self._health = health or Health()
+        # shared by the connections too, see memc.metrics.
+        self._instruments = instruments
+        self._transport = transport
+        self._connect_timeout = connect_timeout
+        # and so is memc.hotkeys.HotKeys.
+        self._hotkeys = hotkeys
+
+        self._cond = Condition(Lock())
+        # (client, created, last used) in the order they are returned
+        self._idle = deque()
+        # connections open now, including the ones being opened
+        self._size = 0
+        # pid of the process which owns the connections
+        self._pid = current_pid()
+        self._warmed = False
+
+        if not lazy:
+            self._warm_up()
+
+    def __len__(self):
+        return self._size
+
+    def _warm_up(self):
+        with self._cond:
+            if self._warmed:
+                return
+            self._warmed = True
+        self._fill()
+
+    def _fill(self):
+        # opens connections up to min_idle.
+        with self._cond:
+            num = max(self._min_idle - self._size, 0)
+            self._size += num
+
+        for i in xrange(num):
+            try:
+                conn = self._open()
+            except:
+                # _open gave back its own slot.
+                with self._cond:
+                    self._size -= num - i - 1
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def _after_fork(self):
+        # the locks may have been held by other threads of the parent, and
+        # the connections are the parent's. Closing their descriptors here
+        # leaves them open in the parent.
+        self._cond = Condition(Lock())
+        self._health.after_fork()
+        for (fl, created, last_used) in self._idle:
+            self._close(fl)
+        self._idle = deque()
+        self._size = 0
+        self._warmed = False
+        self._pid = current_pid()
 
-        for i in xrange(self._max_pool):
-            self._connect()
-        
     def _connect(self):
-        fl = Client(self._servers)
-        fl.connect()
-        self._queue.put(fl)
+        fl = Client(self._servers, self._protocol, self._codec, self._health,
+                    chunk_size=self._chunk_size, instruments=self._instruments,
+                    transport=self._transport, hotkeys=self._hotkeys,
+                    connect_timeout=self._connect_timeout)
+        # Client swallows the errors of its first connection.
+        if fl._sock is None:
+            raise SocketError("Can't connect servers.")
+        return fl
 
-    def _get(self, cmd, keys, use_cas=False):
+    def _open(self):
         try:
-            fl = self._queue.get()
-            result =  fl._get(cmd, keys, use_cas)
-            return result
+            fl = self._connect()
         except:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
             raise
-        finally:
-            self._queue.put(fl)
-        
-    def _set(self, cmd, key, value, kwargs={}):
+
+        # the process whose _size counts it, see _checkin.
+        fl._pool_pid = self._pid
+        now = time.time()
+        return (fl, now, now)
+
+    def _close(self, fl):
         try:
-            fl = self._queue.get()
-            result =  fl._set(cmd, key, value, kwargs)
-            return result
-        except:
-            raise
-        finally:
-            self._queue.put(fl)
+            if fl._sock is not None:
+                fl._sock.close()
+        except socket.error:
+            pass
 
-    def _incr_decr(self, cmd, key, value, kwargs={}):
+    def _reap(self, now):
+        # the least recently used connections are at the head.
+        while (self._max_idle_time is not None and
+               len(self._idle) > self._min_idle and
+               now - self._idle[0][2] >= self._max_idle_time):
+            self._close(self._idle.popleft()[0])
+            self._size -= 1
+
+    def _checkout(self):
+        if self._pid != current_pid():
+            self._after_fork()
+        if not self._warmed:
+            self._warm_up()
+
+        while(True):
+            conn = self._take()
+            (fl, created, last_used) = conn
+            if (self._check_idle is None or
+                time.time() - last_used < self._check_idle):
+                return conn
+
+            try:
+                fl.version()
+            except (socket.error, memc.Error):
+                self._checkin(conn, True)
+                continue
+            return conn
+
+    def _take(self):
+        if self._timeout is not None:
+            deadline = time.time() + self._timeout
+
+        with self._cond:
+            while(True):
+                now = time.time()
+                self._reap(now)
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._size < self._max_pool:
+                    self._size += 1
+                    break
+
+                if self._timeout is None:
+                    self._cond.wait()
+                elif now >= deadline:
+                    raise PoolTimeoutError("No connection is available in %s sec."
+                                           % self._timeout)
+                else:
+                    self._cond.wait(deadline - now)
+
+        return self._open()
+
+    def _checkin(self, conn, broken=False):
+        (fl, created, last_used) = conn
+        if self._pid != current_pid():
+            self._after_fork()
+        if fl._pool_pid != self._pid:
+            # checked out before a fork: it's a connection of the parent,
+            # which isn't counted here.
+            self._close(fl)
+            return
+
+        now = time.time()
+
+        if not broken and (self._max_lifetime is None or
+                           now - created < self._max_lifetime):
+            with self._cond:
+                self._idle.append((fl, created, now))
+                self._cond.notify()
+            return
+
+        self._close(fl)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+        if self._size < self._min_idle:
+            try:
+                self._fill()
+            except socket.error:
+                # the next checkout opens one again.
+                pass
+
+    def _timed_checkout(self):
+        instruments = self._instruments
+        start = instruments.clock()
         try:
-            fl = self._queue.get()
-            result =  fl._incr_decr(cmd, key, value, kwargs)
-            return result
-        except:
+            return self._checkout()
+        except PoolTimeoutError:
+            instruments.count(POOL_TIMEOUTS, None)
             raise
         finally:
-            self._queue.put(fl)
-        
-    def _delete(self, key, kwargs={}):
+            instruments.timing(POOL_WAIT, None, instruments.clock() - start)
+
+    def _call(self, method, *args):
+        if self._instruments is None:
+            conn = self._checkout()
+        else:
+            conn = self._timed_checkout()
         try:
-            fl = self._queue.get()
-            result =  fl._delete(key, kwargs)
-            return result
+            result = getattr(conn[0], method)(*args)
+        except memc.Error:
+            self._checkin(conn)
+            raise
         except:
+            self._checkin(conn, True)
             raise
-        finally:
-            self._queue.put(fl)
+
+        self._checkin(conn)
+        return result
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+                self._size -= 1
+
+    def _get(self, cmd, keys, use_cas=False):
+        return self._call('_get', cmd, keys, use_cas)
+
+    def _set(self, cmd, key, value, kwargs={}):
+        return self._call('_set', cmd, key, value, kwargs)
+
+    def _incr_decr(self, cmd, key, value, kwargs={}):
+        return self._call('_incr_decr', cmd, key, value, kwargs)
+
+    def _delete(self, key, kwargs={}):
+        return self._call('_delete', key, kwargs)
+
+    def _set_multi(self, mapping, kwargs={}):
+        return self._call('_set_multi', mapping, kwargs)
+
+    def _set_value(self, key, value, kwargs={}):
+        return self._call('_set_value', key, value, kwargs)
 
 
     def delete(self, key, **kwargs):
         return self._delete(key, kwargs)
 
     def set(self, key, value, **kwargs):
-        return self._set('set', key, value, kwargs)
+        return self._set_value(key, value, kwargs)
 
     def add(self, key, value, **kwargs):
         return self._set('add', key, value, kwargs)
@@ -164,6 +552,20 @@ class Pool(object):
         kwargs[memc.basic.OPT_CAS] = cas
         return self._set('cas', key, value, kwargs)
 
+    def set_multi(self, mapping, **kwargs):
+        return self._set_multi(mapping, kwargs)
+
+    def mset(self, mapping, **kwargs):
+        return self.set_multi(mapping, **kwargs)
+
+    def get_or_compute(self, key, fn, ttl, **kwargs):
+        return memc.compute.get_or_compute(self, key, fn, ttl, **kwargs)
+
+    def hot_keys(self):
+        if self._hotkeys is None:
+            return []
+        return self._hotkeys.heavy_hitters()
+
     def get(self, key):
         return self.raw_get(key)[0]
 
@@ -195,6 +597,297 @@ class Pool(object):
     def decr(self, key, value, **kwargs):
         return self._incr_decr('decr', key, value, kwargs)
 
+
+
+
+ROLE_MASTER = 'master'
+ROLE_SLAVE  = 'slave'
+STATE_ACTIVE = 'active'
+STATE_PREPARE = 'prepare'
+
+REFRESH_INTERVAL = 60
+# the map is not reloaded more often than this on routing errors.
+REFRESH_MIN_INTERVAL = 1
+
+
+def parse_nodes(stats):
+    """ Converts the reply of "stats nodes" into node => attributes. """
+    nodes = {}
+    for (name, value) in stats.iteritems():
+        (node, sep, attr) = name.rpartition(':')
+        if not sep or ':' not in node:
+            continue
+
+        host, port = node.rsplit(':', 1)
+        nodes.setdefault((host, int(port)), {})[attr] = value
+    return nodes
+
+
+def partition_crc32(key, size):
+    return (zlib.crc32(key) & 0xffffffff) % size
+
+
+class Topology(object):
+    """ Partitions of a flare cluster, built from the nodes of the index.
+
+    Only active nodes are used. Reads of a partition are spread over its
+    slaves by their balance, and go to the master when it has none.
+
+    Keys are hashed over every partition with a master, whatever its
+    state, but a master in prepare is a partition being added, which
+    takes keys only when it's active. Writes to a partition without an
+    active master fail, and so do reads when it has no active slave.
+    """
+
+    def __init__(self, nodes, partitioner=partition_crc32, rand=random):
+        self._partitioner = partitioner
+        self._rand = rand
+        self._masters = {}
+        # partition => (slaves, cumulative balances)
+        self._slaves = {}
+        # partitions the keys are hashed over
+        self._size = 0
+
+        slaves = {}
+        for (node, attrs) in nodes.iteritems():
+            partition = int(attrs.get('partition', -1))
+            if (attrs.get('role') == ROLE_MASTER and
+                attrs.get('state') != STATE_PREPARE):
+                self._size = max(self._size, partition + 1)
+
+            if attrs.get('state') != STATE_ACTIVE:
+                continue
+
+            if attrs.get('role') == ROLE_MASTER:
+                self._masters[partition] = node
+            elif attrs.get('role') == ROLE_SLAVE:
+                balance = int(attrs.get('balance', 1))
+                if balance > 0:
+                    slaves.setdefault(partition, []).append((node, balance))
+
+        for (partition, lst) in slaves.iteritems():
+            lst.sort()
+            total = 0
+            weights = []
+            for (node, balance) in lst:
+                total += balance
+                weights.append(total)
+            self._slaves[partition] = ([node for (node, balance) in lst], weights)
+
+    def __len__(self):
+        return self._size
+
+    def partition(self, key):
+        if not self._size:
+            raise SocketError("No partition is found.")
+        return self._partitioner(key, self._size)
+
+    def master(self, partition):
+        if not self._masters.has_key(partition):
+            raise SocketError("No active master of partition %d." % partition)
+        return self._masters[partition]
+
+    def reader(self, partition):
+        if not self._slaves.has_key(partition):
+            return self.master(partition)
+
+        (nodes, weights) = self._slaves[partition]
+        i = bisect.bisect_right(weights, self._rand.random() * weights[-1])
+        return nodes[min(i, len(nodes) - 1)]
+
+    def nodes(self):
+        nodes = set(self._masters.values())
+        for (slaves, weights) in self._slaves.values():
+            nodes.update(slaves)
+        return nodes
+
+
+class ClusterClient(memc.basic.Client):
+    """ Client which routes by the partition map of a flare index server.
+
+    Writes go to the master of the partition of the key, and reads to one
+    of its slaves. The map is loaded from "stats nodes" of the index, and
+    it's reloaded every refresh_interval seconds and when a node fails.
+
+    partitioner(key, partitions) should match the key hash and partition
+    type of the index server. A node asked for a key of another partition
+    proxies the request, so a mismatch costs a hop, not a wrong result.
+    """
+
+    def __init__(self, index_server, debug=False, codec=None,
+                 refresh_interval=REFRESH_INTERVAL, partitioner=partition_crc32,
+                 instruments=None, transport=None, hotkeys=None):
+        if transport is None:
+            transport = DEFAULT_TRANSPORT
+        super(ClusterClient, self).__init__(index_server, debug, codec=codec,
+                                            instruments=instruments,
+                                            transport=transport,
+                                            hotkeys=hotkeys)
+
+        self._partitioner = partitioner
+        self._refresh_interval = refresh_interval
+        self._refresh_at = 0
+        self._refreshed = 0
+        self._topology = None
+        self._clients = {}
+
+    def _client(self, server):
+        if not self._clients.has_key(server):
+            mc = memc.basic.Client(server, self._debug, codec=self._codec,
+                                   instruments=self._instruments,
+                                   transport=self._transport,
+                                   hotkeys=self._hotkeys)
+            mc.connect_timeout = self.connect_timeout
+            mc.connect()
+            self._clients[server] = mc
+
+        return self._clients[server]
+
+    def _drop(self, server):
+        mc = self._clients.pop(server, None)
+        if mc is not None and mc._sock is not None:
+            try:
+                mc._sock.close()
+            except socket.error:
+                pass
+
+    def refresh(self):
+        index = memc.basic.Client(self._server, self._debug,
+                                  transport=self._transport)
+        index.connect_timeout = self.connect_timeout
+        try:
+            index.connect()
+            nodes = parse_nodes(index.stats('nodes'))
+            index.close()
+        finally:
+            if index._sock is not None:
+                index._sock.close()
+
+        topology = Topology(nodes, self._partitioner)
+        for server in self._clients.keys():
+            if server not in topology.nodes():
+                self._drop(server)
+
+        now = time.time()
+        self._topology = topology
+        self._refreshed = now
+        self._refresh_at = now + self._refresh_interval
+
+    def topology(self):
+        if self._topology is None or time.time() >= self._refresh_at:
+            self.refresh()
+        return self._topology
+
+    def connect(self, force=False):
+        self.refresh()
+
+    def close(self):
+        for mc in self._clients.values():
+            mc.close()
+        self._clients = {}
+
+    def stats(self, arg=""):
+        stats = {}
+        for server in self.topology().nodes():
+            stats[server] = self._client(server).stats(arg)
+        return stats
+
+    def version(self):
+        versions = {}
+        for server in self.topology().nodes():
+            versions[server] = self._client(server).version()
+        return versions
+
+    def pipeline(self):
+        raise memc.basic.Error("pipeline is not supported on a cluster client.")
+
+    def _route(self, server_of, method, key, *args):
+        for a in xrange(RETRY_NUM):
+            topology = self.topology()
+            server = server_of(topology, topology.partition(key))
+            try:
+                return getattr(self._client(server), method)(*args)
+            except socket.error:
+                self._fail(server)
+
+        raise SocketError("Can't connect servers.")
+
+    def _fail(self, server):
+        self._error_log("Can't connect to %s, will reload the nodes."
+                        % memc.server2str(server))
+        if self._instruments is not None:
+            self._instruments.count(RETRIES, server)
+        self._drop(server)
+        if time.time() - self._refreshed >= REFRESH_MIN_INTERVAL:
+            self._refresh_at = 0
+
+    def _error_log(self, msg):
+        # told to the sinks instead, see memc.metrics.stderr_sink.
+        if self._instruments is not None:
+            self._instruments.log(self._server, msg)
+            return
+        sys.stderr.write("memc-flare: %s\n" % msg)
+
+    def _write(self, method, key, *args):
+        return self._route(Topology.master, method, key, *args)
+
+    def _set(self, cmd, key, value, kwargs={}):
+        return self._write('_set', key, cmd, key, value, kwargs)
+
+    def _incr_decr(self, cmd, key, value, kwargs={}):
+        return self._write('_incr_decr', key, cmd, key, value, kwargs)
+
+    def _delete(self, key, kwargs={}):
+        return self._write('_delete', key, key, kwargs)
+
+    def _group(self, keys):
+        topology = self.topology()
+        groups = {}
+        for key in keys:
+            groups.setdefault(topology.partition(key), []).append(key)
+        return groups
+
+    def _set_multi(self, mapping, kwargs={}):
+        failed = []
+        for keys in self._group(mapping.keys()).values():
+            items = dict((key, mapping[key]) for key in keys)
+            failed.extend(self._write('_set_multi', keys[0], items, kwargs))
+        return failed
+
+    def iter_mget(self, keys, batch_size=memc.basic.MGET_BATCH_SIZE):
+        return self._iter_mget_batches(keys, batch_size)
+
+    def _meta(self, cmdline, func, key):
+        # mg can touch, vivify or return cas, so meta commands go to the
+        # master like writes.
+        return self._write('_meta', key, cmdline, func, key)
+
+    def get_into(self, key, buffer):
+        return self._route(Topology.reader, 'get_into', key, key, buffer)
+
+    def get_stream(self, key, fileobj, chunk_size=memc.basic.BUF_LEN):
+        # a stream written halfway can't be retried.
+        topology = self.topology()
+        server = topology.reader(topology.partition(key))
+        try:
+            return self._client(server).get_stream(key, fileobj, chunk_size)
+        except socket.error:
+            self._fail(server)
+            raise
+
+    def _get(self, cmd, keys, use_cas=False):
+        # gets goes to the master, since cas is checked there.
+        if use_cas:
+            server_of = Topology.master
+        else:
+            server_of = Topology.reader
+
+        results = {}
+        for keys in self._group(keys).values():
+            results.update(self._route(server_of, '_get', keys[0],
+                                       cmd, keys, use_cas))
+        return results
+
         
 if __name__ == "__main__":
     pass
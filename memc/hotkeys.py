@@ -0,0 +1,198 @@
+'''
+Created on 2026/10/18
+
+Detection of hot keys on the client side.
+
+Clients given a HotKeys count the keys of their commands in a count-min
+sketch, and the keys with the highest estimates are kept in a top-k heap.
+Memory is bounded by width * depth counters and top keys whatever the key
+space is, and an access costs depth counter updates and a heap update at
+most. With sample_rate < 1, only that fraction of the accesses is counted
+and the estimates are scaled back.
+
+Counts are kept for windows of interval seconds. When a window ends, the
+heavy hitters of it are given to the callback as a list of (key, rate),
+rate in accesses per second, highest first, and the counts start over.
+The window is closed by the first access after its end, so no thread is
+started; a client left idle reports nothing.
+'''
+
+import time
+import heapq
+import random
+
+from threading import Lock
+
+WIDTH = 2048
+DEPTH = 4
+TOP = 16
+INTERVAL = 10
+
+
+class Sketch(object):
+    """ Count-min sketch of depth rows of width counters.
+
+    An estimate is never lower than the real count. It's higher by the
+    counts of the keys sharing its counters in every row, which is about
+    total / width at most.
+    """
+
+    def __init__(self, width=WIDTH, depth=DEPTH):
+        self._width = width
+        self._depth = depth
+        self._rows = [[0] * width for i in xrange(depth)]
+        self.total = 0
+
+    def _counters(self, key):
+        # rows are indexed by h1 + i * h2, from the halves of one hash.
+        h = hash(key)
+        h1 = h & 0xffffffff
+        h2 = ((h >> 32) & 0xffffffff) | 1
+        width = self._width
+        return [(row, (h1 + i * h2) % width)
+                for (i, row) in enumerate(self._rows)]
+
+    def add(self, key, n=1):
+        """ Counts n accesses of key and returns its new estimate. """
+        counters = self._counters(key)
+        estimate = min([row[i] for (row, i) in counters]) + n
+        # conservative update: counters above the estimate are left as
+        # they are, which keeps the overcount of other keys lower.
+        for (row, i) in counters:
+            if row[i] < estimate:
+                row[i] = estimate
+        self.total += n
+        return estimate
+
+    def estimate(self, key):
+        return min([row[i] for (row, i) in self._counters(key)])
+
+    def clear(self):
+        self._rows = [[0] * self._width for i in xrange(self._depth)]
+        self.total = 0
+
+
+class TopK(object):
+    """ The k keys with the highest counts given to update. """
+
+    def __init__(self, k=TOP):
+        self._k = k
+        # key => count
+        self._counts = {}
+        # (count, key) of every key in _counts, whose count may be lower
+        # than the current one since updates don't touch the heap.
+        self._heap = []
+
+    def __len__(self):
+        return len(self._counts)
+
+    def update(self, key, count):
+        counts = self._counts
+        if counts.has_key(key):
+            counts[key] = count
+            return
+
+        heap = self._heap
+        if len(counts) < self._k:
+            counts[key] = count
+            heapq.heappush(heap, (count, key))
+            return
+
+        # counts only grow, so this ends after k entries at most.
+        while heap[0][0] != counts[heap[0][1]]:
+            heapq.heapreplace(heap, (counts[heap[0][1]], heap[0][1]))
+
+        if count > heap[0][0]:
+            del counts[heapq.heapreplace(heap, (count, key))[1]]
+            counts[key] = count
+
+    def items(self):
+        """ Returns [(key, count)], highest first. """
+        return sorted(self._counts.items(), key=lambda item: item[1],
+                      reverse=True)
+
+    def clear(self):
+        self._counts = {}
+        self._heap = []
+
+
+class HotKeys(object):
+    """ Finds the keys accessed most often by the clients given it.
+
+    callback(hot) is called with the heavy hitters of every window whose
+    rate is min_rate or more. It runs in the thread of the access which
+    ends the window, so it should be quick, such as handing the keys to a
+    local cache or to replication. last is the list of the last window.
+
+    One HotKeys can be shared by clients, pools and threads.
+    """
+
+    def __init__(self, top=TOP, width=WIDTH, depth=DEPTH, interval=INTERVAL,
+                 sample_rate=1.0, min_rate=0, callback=None):
+        self._sketch = Sketch(width, depth)
+        self._top = TopK(top)
+        self._interval = interval
+        self._sample_rate = sample_rate
+        self._min_rate = min_rate
+        self._callback = callback
+        self.clock = time.time
+        self.random = random.random
+
+        self._lock = Lock()
+        # start of the window, set by the first access
+        self._start = None
+        self.last = []
+
+    def record(self, keys):
+        """ Counts an access of each of keys. """
+        now = self.clock()
+        hot = None
+        with self._lock:
+            if self._start is None:
+                self._start = now
+            elif now - self._start >= self._interval:
+                hot = self._roll(now)
+
+            sketch = self._sketch
+            top = self._top
+            if self._sample_rate >= 1:
+                for key in keys:
+                    top.update(key, sketch.add(key))
+            else:
+                for key in keys:
+                    if self.random() < self._sample_rate:
+                        top.update(key, sketch.add(key))
+
+        if hot is not None and self._callback is not None:
+            self._callback(hot)
+
+    def _rate(self, count, now):
+        if self._start is None:
+            return 0.0
+        return count / (max(now - self._start, 0.001) * self._sample_rate)
+
+    def _rates(self, counts, now):
+        rates = [(key, self._rate(count, now)) for (key, count) in counts]
+        return [(key, rate) for (key, rate) in rates if rate >= self._min_rate]
+
+    def _roll(self, now):
+        hot = self._rates(self._top.items(), now)
+        self._sketch.clear()
+        self._top.clear()
+        self._start = now
+        self.last = hot
+        return hot
+
+    def heavy_hitters(self):
+        """ Returns [(key, rate)] of the current window so far. """
+        with self._lock:
+            return self._rates(self._top.items(), self.clock())
+
+    def rate(self, key):
+        """ Returns the estimated rate of any key in the current window. """
+        with self._lock:
+            return self._rate(self._sketch.estimate(key), self.clock())
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,301 @@
+'''
+Created on 2026/10/18
+
+Sharding client which spreads keys over servers with a ketama-compatible
+consistent hash ring.
+'''
+
+import memc
+import memc.basic
+import socket
+import struct
+import time
+
+from bisect import bisect_left
+from hashlib import md5
+
+
+# hashes per server, each of them gives 4 points on the ring.
+POINTS_PER_HASH = 4
+HASHES_PER_SERVER = 40
+
+_unpack_points = struct.Struct("<IIII").unpack
+_unpack_point = struct.Struct("<I").unpack_from
+
+
+def server2name(server):
+    return memc.server2str(memc.conn2tuple(server))
+
+
+def hash_key(key):
+    return _unpack_point(md5(key).digest())[0]
+
+
+class Ring(object):
+    """ Consistent hash ring compatible with libketama.
+
+    The points are kept in a sorted list and a key is routed by bisect, so
+    lookup costs O(log n).
+    """
+
+    def __init__(self, servers, weights=None):
+        if weights is None:
+            weights = [1] * len(servers)
+
+        if len(weights) != len(servers):
+            raise memc.Error("weights must be given for each server.")
+
+        self._servers = [memc.conn2tuple(server) for server in servers]
+        self._weights = list(weights)
+        self._build()
+
+    def _build(self):
+        points = []
+        total = sum(self._weights)
+        num = len(self._servers)
+
+        for (server, weight) in zip(self._servers, self._weights):
+            name = server2name(server)
+            hashes = int(float(weight) / total * HASHES_PER_SERVER * num)
+
+            for i in xrange(hashes):
+                digest = md5("%s-%d" % (name, i)).digest()
+                for point in _unpack_points(digest):
+                    points.append((point, server))
+
+        points.sort()
+        self._points = [point for (point, server) in points]
+        self._nodes = [server for (point, server) in points]
+
+    def __len__(self):
+        return len(self._points)
+
+    def servers(self):
+        return list(self._servers)
+
+    def add_server(self, server, weight=1):
+        self._servers.append(memc.conn2tuple(server))
+        self._weights.append(weight)
+        self._build()
+
+    def remove_server(self, server):
+        i = self._servers.index(memc.conn2tuple(server))
+        del self._servers[i]
+        del self._weights[i]
+        self._build()
+
+    def get_server(self, key):
+        if not self._points:
+            raise memc.Error("No server is registered.")
+
+        i = bisect_left(self._points, hash_key(key))
+        if i == len(self._points):
+            i = 0
+
+        return self._nodes[i]
+
+    def group(self, keys):
+        """ Returns a dict of server => keys routed to it. """
+        groups = {}
+        for key in keys:
+            server = self.get_server(key)
+            if groups.has_key(server):
+                groups[server].append(key)
+            else:
+                groups[server] = [key]
+        return groups
+
+
+class Client(memc.basic.Client):
+    """ Client which shards keys over servers by a ketama ring.
+
+    Each server is accessed with its own memc.basic.Client, which is
+    connected when it's used at first.
+
+    A multi-get sends one get command to every server involved before any
+    reply is read, so the servers work on it at the same time and the call
+    takes as long as the slowest one. timeout limits the wait for the
+    replies in seconds. With partial=True, servers which fail or time out
+    are treated as misses and are listed in failed_servers instead of
+    failing the whole call.
+    """
+
+    def __init__(self, servers, weights=None, debug=False,
+                 timeout=None, partial=False, codec=None, chunk_size=None,
+                 instruments=None, transport=None, hotkeys=None):
+        super(Client, self).__init__(servers[0], debug, codec=codec,
+                                     chunk_size=chunk_size,
+                                     instruments=instruments,
+                                     transport=transport, hotkeys=hotkeys)
+
+        self._ring = Ring(servers, weights)
+        self._clients = {}
+        self.timeout = timeout
+        self.partial = partial
+        self.failed_servers = []
+
+    def _client(self, server):
+        if not self._clients.has_key(server):
+            mc = memc.basic.Client(server, self._debug, codec=self._codec,
+                                   instruments=self._instruments,
+                                   transport=self._transport,
+                                   hotkeys=self._hotkeys)
+            mc.connect()
+            self._clients[server] = mc
+
+        return self._clients[server]
+
+    def _node(self, key):
+        return self._client(self._ring.get_server(key))
+
+    def connect(self, force=False):
+        for server in self._ring.servers():
+            if force and self._clients.has_key(server):
+                self._clients[server].connect(True)
+            else:
+                self._client(server)
+
+    def close(self):
+        for mc in self._clients.values():
+            mc.close()
+        self._clients = {}
+
+    def add_server(self, server, weight=1):
+        self._ring.add_server(server, weight)
+
+    def remove_server(self, server):
+        server = memc.conn2tuple(server)
+        self._ring.remove_server(server)
+
+        if self._clients.has_key(server):
+            self._clients.pop(server).close()
+
+    def stats(self, arg=""):
+        stats = {}
+        for server in self._ring.servers():
+            stats[server] = self._client(server).stats(arg)
+        return stats
+
+    def version(self):
+        versions = {}
+        for server in self._ring.servers():
+            versions[server] = self._client(server).version()
+        return versions
+
+    def pipeline(self):
+        raise memc.basic.Error("pipeline is not supported on a sharded client.")
+
+    def _set(self, cmd, key, value, kwargs={}):
+        return self._node(key)._set(cmd, key, value, kwargs)
+
+    def _drop(self, server):
+        mc = self._clients.pop(server, None)
+        if mc is not None and mc._sock is not None:
+            mc._sock.close()
+
+    def _get(self, cmd, keys, use_cas=False):
+        # the nodes count the keys of the other commands.
+        if self._hotkeys is not None:
+            self._hotkeys.record(keys)
+        instruments = self._instruments
+        if instruments is None:
+            return self._do_get(cmd, keys, use_cas)
+
+        # a multi-get is timed as a whole, so it's told with no server.
+        results = instruments.call(cmd, None, self._do_get, cmd, keys, use_cas)
+        instruments.lookups(None, len(keys), len(results))
+        return results
+
+    def _do_get(self, cmd, keys, use_cas):
+        results = {}
+        cmds = []
+        pending = []
+        self.failed_servers = []
+
+        for (server, server_keys) in self._ring.group(keys).iteritems():
+            cmds.append((server, self._get_cmd(cmd, server_keys)))
+
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        try:
+            for (server, cmdline) in cmds:
+                try:
+                    mc = self._client(server)
+                    mc._send_cmd(cmdline)
+                except socket.error:
+                    self._fail(server)
+                    continue
+                pending.append((server, mc, cmdline))
+
+            while pending:
+                (server, mc, cmdline) = pending.pop(0)
+                try:
+                    # the deadline holds over every receive of the reply.
+                    if self.timeout is not None:
+                        mc._deadline = deadline
+                    results.update(mc._get_reply(cmdline, use_cas))
+                except socket.error:
+                    self._fail(server)
+                    continue
+                finally:
+                    mc._deadline = None
+
+                if self.timeout is not None:
+                    mc._sock.settimeout(mc.read_timeout)
+
+        except socket.error:
+            # replies which are not read yet would be left on the connections.
+            for (server, mc, cmdline) in pending:
+                self._drop(server)
+            raise
+
+        return self._decode_results(results)
+
+    def _fail(self, server):
+        # the reply of the server may be read halfway, so the connection
+        # can't be used any more.
+        self._drop(server)
+        if not self.partial:
+            raise memc.basic.SocketError("No reply from %s."
+                                         % memc.server2str(server))
+        self.failed_servers.append(server)
+
+    def iter_mget(self, keys, batch_size=memc.basic.MGET_BATCH_SIZE):
+        # every batch is fanned out to the servers by _get.
+        return self._iter_mget_batches(keys, batch_size)
+
+    def _incr_decr(self, cmd, key, value, kwargs={}):
+        return self._node(key)._incr_decr(cmd, key, value, kwargs)
+
+    def _delete(self, key, kwargs={}):
+        return self._node(key)._delete(key, kwargs)
+
+    def _meta(self, cmdline, func, key):
+        return self._node(key)._meta(cmdline, func, key)
+
+    def _check_stream(self):
+        # the chunks of a value are spread over the servers, and a node
+        # reads only its own.
+        if self._chunk_size is not None:
+            raise memc.basic.Error("streaming gets are not supported on a "
+                                   "sharded client with chunk_size.")
+
+    def get_into(self, key, buffer):
+        self._check_stream()
+        return self._node(key).get_into(key, buffer)
+
+    def get_stream(self, key, fileobj, chunk_size=memc.basic.BUF_LEN):
+        self._check_stream()
+        return self._node(key).get_stream(key, fileobj, chunk_size)
+
+    def _set_multi(self, mapping, kwargs={}):
+        failed = []
+        for (server, keys) in self._ring.group(mapping.keys()).iteritems():
+            items = dict((key, mapping[key]) for key in keys)
+            failed.extend(self._client(server)._set_multi(items, kwargs))
+        return failed
+
+
+if __name__ == "__main__":
+    pass
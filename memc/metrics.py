@@ -0,0 +1,230 @@
+'''
+Created on 2026/10/18
+
+Instrumentation of clients.
+
+Clients given an Instruments report events to its sinks, which are
+callables of sink(event, name, server, value):
+
+    EVENT_TIMING  name took value seconds: every command by its name, such
+                  as get or set, and pool_wait for a Pool checkout.
+    EVENT_COUNT   value is added to the counter of name: bytes_sent,
+                  bytes_received, hits, misses, errors, failovers, retries
+                  and pool_timeouts.
+    EVENT_LOG     value is a message, such as a failover reported before
+                  to stderr.
+
+server is the (host, port) of the connection, or None. Without an
+Instruments, which is the default, a client only tests for None.
+
+Metrics is a sink which keeps the counters and a latency histogram per
+name and per server.
+'''
+
+import sys
+import time
+
+from threading import Lock
+
+EVENT_TIMING = 'timing'
+EVENT_COUNT  = 'count'
+EVENT_LOG    = 'log'
+
+BYTES_SENT     = 'bytes_sent'
+BYTES_RECEIVED = 'bytes_received'
+HITS           = 'hits'
+MISSES         = 'misses'
+ERRORS         = 'errors'
+FAILOVERS      = 'failovers'
+RETRIES        = 'retries'
+POOL_TIMEOUTS  = 'pool_timeouts'
+POOL_WAIT      = 'pool_wait'
+
+# a histogram bucket is 1/2**SUB_BITS of a power of 2 wide
+SUB_BITS = 4
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def stderr_sink(event, name, server, value):
+    """ Writes the log events to stderr like clients without Instruments. """
+    if event == EVENT_LOG:
+        sys.stderr.write("memc-flare: %s\n" % value)
+
+
+class Instruments(object):
+    """ Dispatches the events of clients to sinks.
+
+    One Instruments can be shared by clients, pools and threads. A sink
+    runs in the thread of the command, so it should be quick.
+    """
+
+    def __init__(self, *sinks):
+        self._sinks = list(sinks)
+        self.clock = time.time
+
+    def add_sink(self, sink):
+        self._sinks = self._sinks + [sink]
+
+    def remove_sink(self, sink):
+        self._sinks = [s for s in self._sinks if s is not sink]
+
+    def _emit(self, event, name, server, value):
+        for sink in self._sinks:
+            sink(event, name, server, value)
+
+    def timing(self, name, server, seconds):
+        self._emit(EVENT_TIMING, name, server, seconds)
+
+    def count(self, name, server, n=1):
+        self._emit(EVENT_COUNT, name, server, n)
+
+    def log(self, server, msg):
+        self._emit(EVENT_LOG, None, server, msg)
+
+    def lookups(self, server, keys, found):
+        """ Counts found of keys looked up on hits and the rest on misses. """
+        if found:
+            self.count(HITS, server, found)
+        if keys > found:
+            self.count(MISSES, server, keys - found)
+
+    def call(self, name, server, method, *args):
+        """ Runs method(*args) as the command name and times it.
+
+        A socket error counts on errors. memc.Error, such as a missing key,
+        is an answer of the server, so it's timed like a result.
+        """
+        start = self.clock()
+        try:
+            return method(*args)
+        except EnvironmentError:
+            self.count(ERRORS, server)
+            raise
+        finally:
+            self.timing(name, server, self.clock() - start)
+
+
+class Histogram(object):
+    """ Log-linear histogram of microseconds, like HdrHistogram.
+
+    Values are counted in buckets whose width is 1/16 of their power of 2,
+    so a percentile is within 6.25% of the value recorded.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value):
+        if value < 2 << SUB_BITS:
+            return value
+        shift = value.bit_length() - SUB_BITS - 1
+        return ((shift + 1) << SUB_BITS) + (value >> shift) - (1 << SUB_BITS)
+
+    @staticmethod
+    def _highest(index):
+        if index < 2 << SUB_BITS:
+            return index
+        shift = (index >> SUB_BITS) - 1
+        mantissa = (index & ((1 << SUB_BITS) - 1)) + (1 << SUB_BITS)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        index = self._index(value)
+        self._counts[index] = self._counts.get(index, 0) + 1
+
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """ Returns the highest value of the bucket at percentile p. """
+        if not self.count:
+            return None
+
+        rank = max(int(self.count * p / 100.0 + 0.5), 1)
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(self._highest(index), self.max)
+        return self.max
+
+    def mean(self):
+        if not self.count:
+            return None
+        return float(self.total) / self.count
+
+    def summary(self):
+        summary = {'count': self.count, 'min': self.min, 'max': self.max,
+                   'mean': self.mean()}
+        for p in PERCENTILES:
+            summary['p%s' % p] = self.percentile(p)
+        return summary
+
+
+class Metrics(object):
+    """ Sink which aggregates the events.
+
+    Timings are kept in microseconds. snapshot() returns them as
+    Histogram summaries, by name and by (name, server).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def __call__(self, event, name, server, value):
+        if event == EVENT_LOG:
+            return
+
+        with self._lock:
+            for key in (name, (name, server)):
+                if event == EVENT_TIMING:
+                    histogram = self._histograms.get(key)
+                    if histogram is None:
+                        histogram = self._histograms[key] = Histogram()
+                    histogram.record(value * 1000000)
+                else:
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name, server=None):
+        key = name if server is None else (name, server)
+        return self._counters.get(key, 0)
+
+    def histogram(self, name, server=None):
+        key = name if server is None else (name, server)
+        return self._histograms.get(key)
+
+    def hit_ratio(self, server=None):
+        hits = self.counter(HITS, server)
+        lookups = hits + self.counter(MISSES, server)
+        if not lookups:
+            return None
+        return float(hits) / lookups
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'timings': dict((key, histogram.summary()) for
+                                (key, histogram) in self._histograms.items()),
+                'hit_ratio': self.hit_ratio(),
+            }
+
+
+if __name__ == "__main__":
+    pass
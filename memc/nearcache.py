@@ -0,0 +1,242 @@
+'''
+Created on 2026/10/18
+
+In-process near-cache in front of a memc.flare.Pool or a memc.basic.Client.
+
+Values read by get/raw_get/mget are kept in a bounded LRU for ttl seconds,
+so hot keys are served without a queue checkout or a round trip. Every
+write through the cache (set, add, replace, append, prepend, cas, delete,
+incr, decr and set_multi) drops the local copies of its keys first. Writes
+made by other processes are seen after ttl at most.
+
+With stale > 0, an expired entry is still served for stale more seconds to
+every reader but the one which fetches it again, so only one request per
+key goes to the server when a hot entry expires.
+'''
+
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+from memc.protocol import KeyNotFoundError, OPT_CAS
+
+TTL = 1
+MAX_ITEMS = 10000
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class NearCache(object):
+    """ LRU of (value, key, flags, bytes, cas) tuples of the wrapped client.
+
+    hits, misses, stale_hits and evictions count the reads and the entries
+    evicted by the limits. Cached values are shared by the callers, so they
+    must not be modified.
+    """
+
+    def __init__(self, client, ttl=TTL, max_items=MAX_ITEMS,
+                 max_bytes=MAX_BYTES, stale=0):
+        self._client = client
+        self._ttl = ttl
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._stale = stale
+
+        self._lock = Lock()
+        # key => (item, expire, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # key => token of the read which fetches the key now
+        self._fetching = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fetching.clear()
+            self._bytes = 0
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+                self._fetching.pop(key, None)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+        return entry
+
+    def _lookup(self, key, now, token):
+        """ Returns the cached item or None when key has to be fetched. """
+        entry = self._entries.get(key)
+        if entry is not None:
+            (item, expire, size) = entry
+            if now < expire:
+                # moves the entry to the tail of the LRU.
+                del self._entries[key]
+                self._entries[key] = entry
+                self.hits += 1
+                return item
+
+            if now < expire + self._stale and self._fetching.has_key(key):
+                self.stale_hits += 1
+                return item
+
+            if now >= expire + self._stale:
+                self._pop(key)
+
+        self.misses += 1
+        self._fetching[key] = token
+        return None
+
+    def _release(self, key, token):
+        if self._fetching.get(key) is token:
+            del self._fetching[key]
+
+    def _store(self, key, item, now, token):
+        if self._fetching.get(key) is not token:
+            # invalidated while it was fetched.
+            return
+        del self._fetching[key]
+
+        self._pop(key)
+        size = len(key) + item[3]
+        if size > self._max_bytes:
+            return
+
+        self._entries[key] = (item, now + self._ttl, size)
+        self._bytes += size
+
+        while (len(self._entries) > self._max_items or
+               self._bytes > self._max_bytes):
+            (old_key, entry) = self._entries.popitem(last=False)
+            self._bytes -= entry[2]
+            self.evictions += 1
+
+    def _get_items(self, keys):
+        results = {}
+        missing = []
+        token = object()
+
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                item = self._lookup(key, now, token)
+                if item is None:
+                    missing.append(key)
+                else:
+                    results[key] = item
+
+        if not missing:
+            return results
+
+        try:
+            fetched = self._client._get('get', missing)
+        except:
+            with self._lock:
+                for key in missing:
+                    self._release(key, token)
+            raise
+
+        now = time.time()
+        with self._lock:
+            for key in missing:
+                if fetched.has_key(key):
+                    self._store(key, fetched[key], now, token)
+                else:
+                    self._release(key, token)
+
+        results.update(fetched)
+        return results
+
+    def _set(self, cmd, key, value, kwargs={}):
+        self.invalidate([key])
+        return self._client._set(cmd, key, value, kwargs)
+
+    def _incr_decr(self, cmd, key, value, kwargs={}):
+        self.invalidate([key])
+        return self._client._incr_decr(cmd, key, value, kwargs)
+
+    def _delete(self, key, kwargs={}):
+        self.invalidate([key])
+        return self._client._delete(key, kwargs)
+
+    def _set_multi(self, mapping, kwargs={}):
+        self.invalidate(mapping.keys())
+        return self._client._set_multi(mapping, kwargs)
+
+    def delete(self, key, **kwargs):
+        return self._delete(key, kwargs)
+
+    def set(self, key, value, **kwargs):
+        self.invalidate([key])
+        return self._client._set_value(key, value, kwargs)
+
+    def add(self, key, value, **kwargs):
+        return self._set('add', key, value, kwargs)
+
+    def replace(self, key, value, **kwargs):
+        return self._set('replace', key, value, kwargs)
+
+    def append(self, key, value, **kwargs):
+        return self._set('append', key, value, kwargs)
+
+    def prepend(self, key, value, **kwargs):
+        return self._set('prepend', key, value, kwargs)
+
+    def cas(self, key, value, cas, **kwargs):
+        kwargs[OPT_CAS] = cas
+        return self._set('cas', key, value, kwargs)
+
+    def set_multi(self, mapping, **kwargs):
+        return self._set_multi(mapping, kwargs)
+
+    def mset(self, mapping, **kwargs):
+        return self.set_multi(mapping, **kwargs)
+
+    def get(self, key):
+        return self.raw_get(key)[0]
+
+    def raw_get(self, key):
+        result = self._get_items([key])
+
+        if result.has_key(key):
+            return result[key]
+
+        raise KeyNotFoundError("Key:%s is not found." % key)
+
+    def raw_gets(self, key):
+        # the cas has to be the current one, so gets is never cached.
+        return self._client.raw_gets(key)
+
+    def raw_mget(self, keys):
+        result = self._get_items(keys)
+        lst = []
+        for key in keys:
+            if result.has_key(key):
+                lst.append(result[key][0])
+            else:
+                lst.append(None)
+        return lst
+
+    def mget(self, keys):
+        return self.raw_mget(keys)
+
+    def incr(self, key, value, **kwargs):
+        return self._incr_decr('incr', key, value, kwargs)
+
+    def decr(self, key, value, **kwargs):
+        return self._incr_decr('decr', key, value, kwargs)
+
+
+if __name__ == "__main__":
+    pass
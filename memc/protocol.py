@@ -0,0 +1,782 @@
+'''
+Created on 2026/10/18
+
+Parser of the memcached text protocol which does no I/O by itself.
+
+Received data is put in a Parser, either by feed() or by recv_into() from
+a socket. The Parser turns it into events, and a reply object consumes
+them with parse(). parse() returns False while the reply is incomplete,
+so the same replies are used by the blocking client in memc.basic and the
+asyncio client in memc.aio.
+'''
+
+import mmap
+import memc
+
+from collections import namedtuple
+
+class Error(memc.Error):
+    pass
+
+class StoreError(memc.StoreError):
+    pass
+
+class KeyNotFoundError(memc.KeyNotFoundError):
+    pass
+
+BUF_LEN = 40960
+
+# memcached:250
+MAX_KEY_LEN = 250
+
+LINE_DELIMITER = "\r\n"
+DELIMITER_LEN = len(LINE_DELIMITER)
+
+OPT_FLAG    = 'flag'
+OPT_EXPIRE  = 'expire'
+OPT_NOREPLY = 'noreply'
+OPT_SYNC    = 'sync'
+OPT_CAS     = 'cas'
+
+# options of the meta commands
+OPT_MODE       = 'mode'
+OPT_TOUCH      = 'touch'
+OPT_VIVIFY     = 'vivify'
+OPT_RECACHE    = 'recache'
+OPT_INVALIDATE = 'invalidate'
+OPT_RETURN_CAS = 'return_cas'
+OPT_INITIAL    = 'initial'
+
+
+class Reader(object):
+    """ Receive buffer for a memcached connection.
+
+    Data is received with recv_into into a preallocated bytearray. Lines and
+    values are consumed by moving a read offset, and the unread data is moved
+    to the head of the buffer only when there is no room left at its tail.
+    readline() and read() return None until enough data is buffered.
+    """
+
+    def __init__(self, size=BUF_LEN):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._pos = 0
+        self._end = 0
+        self._scanned = 0
+
+    def __len__(self):
+        return self._end - self._pos
+
+    def clear(self):
+        self._pos = 0
+        self._end = 0
+        self._scanned = 0
+
+    def _reserve(self, size):
+        if len(self._buf) - self._end >= size:
+            return
+
+        length = self._end - self._pos
+        if length + size > len(self._buf):
+            buf = bytearray(max(len(self._buf) * 2, length + size))
+            buf[:length] = self._view[self._pos:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        else:
+            self._buf[:length] = self._buf[self._pos:self._end]
+
+        self._pos = 0
+        self._end = length
+
+    def _consume(self, size):
+        self._pos += size
+        self._scanned = 0
+        if self._pos == self._end:
+            self._pos = 0
+            self._end = 0
+
+    def feed(self, data):
+        size = len(data)
+        self._reserve(size)
+        self._buf[self._end:self._end + size] = data
+        self._end += size
+
+    def recv_into(self, sock, size=BUF_LEN):
+        self._reserve(1)
+        size = min(size, len(self._buf) - self._end)
+        n = sock.recv_into(self._view[self._end:self._end + size], size)
+        self._end += n
+        return n
+
+    def readline(self):
+        pos = self._buf.find(LINE_DELIMITER, self._pos + self._scanned, self._end)
+        if pos < 0:
+            self._scanned = max(self._end - self._pos - DELIMITER_LEN + 1, 0)
+            return None
+
+        line = self._view[self._pos:pos].tobytes()
+        self._pos = pos + DELIMITER_LEN
+        self._scanned = 0
+        if self._pos == self._end:
+            self._pos = 0
+            self._end = 0
+        return line
+
+    def read(self, size):
+        need = size + DELIMITER_LEN
+        if self._end - self._pos < need:
+            # make room for the whole value at once so that it is never
+            # moved again while the rest of it is received.
+            self._reserve(need - (self._end - self._pos))
+            return None
+
+        result = self._view[self._pos:self._pos + size].tobytes()
+        self._consume(need)
+        return result
+
+    def read_into(self, view):
+        """ Moves the buffered data, up to len(view) bytes, into view. """
+        n = min(len(view), self._end - self._pos)
+        view[:n] = self._view[self._pos:self._pos + n]
+        self._consume(n)
+        return n
+
+    def take(self, size):
+        """ Same as read() but for data which isn't followed by CRLF. """
+        if self._end - self._pos < size:
+            self._reserve(size - (self._end - self._pos))
+            return None
+
+        result = self._view[self._pos:self._pos + size].tobytes()
+        self._consume(size)
+        return result
+
+    def read_view(self, size):
+        """ Same as read() but returns a memoryview of the buffer.
+
+        The view is valid until more data is put in the buffer.
+        """
+        need = size + DELIMITER_LEN
+        if self._end - self._pos < need:
+            self._reserve(need - (self._end - self._pos))
+            return None
+
+        result = self._view[self._pos:self._pos + size]
+        self._consume(need)
+        return result
+
+
+# events of Parser
+Value = namedtuple('Value', 'key flags cas data')
+End = namedtuple('End', '')
+Stored = namedtuple('Stored', '')
+NotStored = namedtuple('NotStored', '')
+Exists = namedtuple('Exists', '')
+Deleted = namedtuple('Deleted', '')
+Touched = namedtuple('Touched', '')
+NotFound = namedtuple('NotFound', '')
+Number = namedtuple('Number', 'value')
+Stat = namedtuple('Stat', 'name value')
+Version = namedtuple('Version', 'version')
+ServerError = namedtuple('ServerError', 'kind message')
+MetaValue = namedtuple('MetaValue', 'flags data')
+MetaStatus = namedtuple('MetaStatus', 'code flags')
+Unknown = namedtuple('Unknown', 'line')
+
+END = End()
+STORED = Stored()
+NOT_STORED = NotStored()
+EXISTS = Exists()
+DELETED = Deleted()
+TOUCHED = Touched()
+NOT_FOUND = NotFound()
+
+_simple_events = {
+    'END': END,
+    'STORED': STORED,
+    'NOT_STORED': NOT_STORED,
+    'EXISTS': EXISTS,
+    'DELETED': DELETED,
+    'TOUCHED': TOUCHED,
+    'NOT_FOUND': NOT_FOUND,
+}
+
+_error_kinds = ('ERROR', 'CLIENT_ERROR', 'SERVER_ERROR')
+
+_meta_codes = ('HD', 'EN', 'NF', 'NS', 'EX', 'MN')
+
+
+def parse_line(line):
+    """ Returns the event of a reply line.
+
+    A VALUE line gives a tuple of (key, flags, bytes, cas) and a VA line
+    of the meta commands gives a tuple of (flags, bytes) instead, since
+    their data follows on the next lines.
+    """
+    if line.startswith('VALUE '):
+        fields = line.split()
+        if len(fields) == 5:
+            cas = int(fields[4])
+        elif len(fields) == 4:
+            cas = None
+        else:
+            return Unknown(line)
+        return (fields[1], int(fields[2]), int(fields[3]), cas)
+
+    event = _simple_events.get(line)
+    if event is not None:
+        return event
+
+    code = line[:2]
+    if code in _meta_codes and line[2:3] in ('', ' '):
+        return MetaStatus(code, line[3:].split())
+
+    if line.startswith('VA '):
+        fields = line.split()
+        return (fields[2:], int(fields[1]))
+
+    if line.isdigit():
+        return Number(int(line))
+
+    if line.startswith('STAT '):
+        fields = line.split(None, 2)
+        if len(fields) == 2:
+            fields.append('')
+        return Stat(fields[1], fields[2])
+
+    if line.startswith('VERSION '):
+        return Version(line[8:])
+
+    (kind, sep, message) = line.partition(' ')
+    if kind in _error_kinds:
+        return ServerError(kind, message)
+
+    return Unknown(line)
+
+
+class Parser(Reader):
+    """ Incremental parser of replies of the text protocol.
+
+    Data can be given in chunks of any size by feed() or recv_into(), and
+    the replies are taken as events by next_event() or events(); feed()
+    returns events() as well. No I/O is done by the parser.
+
+    The data of a Value or MetaValue event is a memoryview of the buffer,
+    so values are not copied. It is valid until more data is put in the
+    parser; call tobytes() on it to keep the value.
+    """
+
+    def __init__(self, size=BUF_LEN):
+        super(Parser, self).__init__(size)
+        self._header = None
+
+    def clear(self):
+        super(Parser, self).clear()
+        self._header = None
+
+    def feed(self, data):
+        super(Parser, self).feed(data)
+        return self.events()
+
+    def next_event(self):
+        """ Returns the next event, or None if more data is needed. """
+        header = self._header
+        if header is None:
+            line = self.readline()
+            if line is None:
+                return None
+
+            header = parse_line(line)
+            if type(header) is not tuple:
+                return header
+
+        data = self.read_view(header[-2 if len(header) == 4 else -1])
+        if data is None:
+            self._header = header
+            return None
+
+        self._header = None
+        if len(header) == 4:
+            (key, flags, bytes, cas) = header
+            return Value(key, flags, cas, data)
+        return MetaValue(header[0], data)
+
+    def events(self):
+        while(True):
+            event = self.next_event()
+            if event is None:
+                return
+            yield event
+
+    def read_values(self, results):
+        """ Fast path of next_event() for the reply of get and gets.
+
+        Values are put in results as key => (data, key, flags, bytes, cas)
+        without making events. Returns True at END and False when more
+        data is needed. The event of any other line is returned as it is.
+        """
+        buf = self._buf
+        view = self._view
+        header = self._header
+        try:
+            while(True):
+                pos = self._pos
+                if header is None:
+                    end = buf.find(LINE_DELIMITER, pos + self._scanned,
+                                   self._end)
+                    if end < 0:
+                        self._scanned = max(self._end - pos - DELIMITER_LEN + 1,
+                                            0)
+                        return False
+
+                    line = view[pos:end].tobytes()
+                    self._pos = pos = end + DELIMITER_LEN
+                    self._scanned = 0
+                    fields = line.split()
+                    if len(fields) == 4 and fields[0] == 'VALUE':
+                        header = (fields[1], int(fields[2]), int(fields[3]),
+                                  None)
+                    elif line == 'END':
+                        return True
+                    else:
+                        header = parse_line(line)
+                        if type(header) is not tuple or len(header) != 4:
+                            return header
+
+                (key, flags, size, cas) = header
+                if self._end - pos < size + DELIMITER_LEN:
+                    self._reserve(size + DELIMITER_LEN - (self._end - pos))
+                    return False
+
+                results[key] = (view[pos:pos + size].tobytes(), key, flags,
+                                size, cas)
+                self._pos = pos + size + DELIMITER_LEN
+                header = None
+        finally:
+            self._header = header
+            if self._pos == self._end:
+                self._pos = 0
+                self._end = 0
+
+
+def check_key(key):
+    if len(key) > MAX_KEY_LEN:
+        raise Error("Too long key: %s" % key)
+    
+    for c in key:
+        h = ord(c)
+        if h <= 0x20 or h == 0x7f:
+            raise Error("Key must never include white spaces:%s" % key)
+    
+    return
+
+# values which are written as they are
+BUFFER_TYPES = (str, bytearray, memoryview, mmap.mmap)
+
+def value_data(value):
+    if isinstance(value, BUFFER_TYPES):
+        return value
+    return str(value)
+
+def value_str(value):
+    t = type(value)
+    if t is str:
+        return value
+    elif t is memoryview:
+        return value.tobytes()
+    elif isinstance(value, BUFFER_TYPES):
+        return str(value[:])
+    return str(value)
+
+def store_header(cmd, key, size, kwargs):
+    expire = 0
+    flag = 0
+    opt = []
+    cas = None
+    noreply = False
+    
+    check_key(key)
+    
+    if kwargs.has_key(OPT_EXPIRE):
+        expire = kwargs[OPT_EXPIRE]
+        
+    if kwargs.has_key(OPT_FLAG):
+        flag = kwargs[OPT_FLAG]
+
+    if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
+        opt.append(OPT_NOREPLY)
+        noreply = True
+    
+    if kwargs.has_key(OPT_SYNC) and kwargs[OPT_SYNC]:
+        opt.append(OPT_SYNC)
+    
+    if kwargs.has_key(OPT_CAS):
+        cas = kwargs[OPT_CAS]
+
+    if cmd == 'cas':
+        cmdline = "%s %s %d %d %d %d %s" % \
+                   (cmd, key, flag, expire, size, cas, " ".join(opt))
+    else:
+        cmdline = "%s %s %d %d %d %s" % \
+                   (cmd, key, flag, expire, size, " ".join(opt))
+    
+    return (cmdline, noreply)
+
+def store_cmd(cmd, key, value, kwargs):
+    value = value_str(value)
+    (header, noreply) = store_header(cmd, key, len(value), kwargs)
+    return ("%s\r\n%s" % (header, value), noreply)
+
+def get_cmd(cmd, keys):
+    for key in keys:
+        check_key(key)
+
+    return "%s %s" % (cmd, " ".join(keys))
+
+def incr_decr_cmd(cmd, key, value, kwargs):
+    opt = []
+    noreply = False
+    
+    check_key(key)
+    
+    if not 0 <= value:
+        raise Error("Value must be integer.") 
+
+    
+    if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
+        opt.append(OPT_NOREPLY)
+        noreply = True
+    
+    if kwargs.has_key(OPT_SYNC) and kwargs[OPT_SYNC]:
+        opt.append(OPT_SYNC)
+
+    cmdline = "%s %s %d %s" % \
+                (cmd, key, value, " ".join(opt))
+
+    return (cmdline, noreply)
+
+def delete_cmd(key, kwargs):
+    opt = []
+    noreply = False
+    
+    check_key(key)
+
+    if kwargs.has_key(OPT_NOREPLY) and kwargs[OPT_NOREPLY]:
+        opt.append(OPT_NOREPLY)
+        noreply = True
+
+    cmdline = "delete %s %s" % (key, " ".join(opt))
+    
+    return (cmdline, noreply)
+
+
+def store_result(line, key):
+    if line == "STORED":
+        pass
+
+    elif line == "NOT_STORED":
+        raise StoreError("store error:%s" % key)
+
+    else:
+        raise Error("Unknown error:%s" % line)
+
+    return
+
+def incr_decr_result(line, key):
+    if line.isdigit():
+        return int(line)
+
+    elif line == "NOT_FOUND":
+        raise KeyNotFoundError("key:%s is not found." % key)
+
+    elif line.startswith('CLIENT_ERROR'):
+        raise Error(line)
+
+    else:
+        raise Error("Unknown error:%s" % line)
+
+def delete_result(line, key):
+    if line == 'DELETED':
+        pass
+
+    elif line ==  "NOT_FOUND":
+        raise KeyNotFoundError("key:%s is not found." % key)
+
+    else:
+        raise Error("Unknown error:%s" % line)
+
+    return
+
+# fields of meta_get => flags of mg
+META_FIELDS = {
+    'value': 'v',
+    'cas': 'c',
+    'flags': 'f',
+    'ttl': 't',
+    'size': 's',
+    'last_access': 'l',
+    'hit': 'h',
+    'key': 'k',
+}
+
+_meta_names = dict((flag, name) for (name, flag) in META_FIELDS.iteritems())
+
+# flags without a value in the replies
+_meta_marks = {'W': 'win', 'X': 'stale', 'Z': 'win_sent'}
+
+_meta_set_modes = {
+    'set': 'S',
+    'add': 'E',
+    'replace': 'R',
+    'append': 'A',
+    'prepend': 'P',
+}
+
+_meta_arithmetic_modes = {'incr': 'I', 'decr': 'D'}
+
+def meta_fields(flags):
+    """ Converts the flags of a meta reply into a dict of field => value. """
+    fields = {}
+    for flag in flags:
+        if _meta_marks.has_key(flag):
+            fields[_meta_marks[flag]] = True
+            continue
+
+        name = _meta_names.get(flag[0])
+        if name is None or name == 'value':
+            continue
+
+        if name == 'key':
+            fields[name] = flag[1:]
+        elif name == 'hit':
+            fields[name] = flag[1:] == '1'
+        else:
+            fields[name] = int(flag[1:])
+
+    return fields
+
+def _meta_ttl_opts(kwargs, opts):
+    for (opt, flag) in ((OPT_TOUCH, 'T'), (OPT_VIVIFY, 'N'), (OPT_RECACHE, 'R')):
+        if kwargs.get(opt) is not None:
+            opts.append("%s%d" % (flag, kwargs[opt]))
+
+# The q flag is not used: quiet meta commands still answer their failures,
+# which couldn't be told from the replies of the commands sent after them.
+def meta_get_cmd(key, fields, kwargs):
+    check_key(key)
+
+    opts = []
+    for field in fields:
+        if not META_FIELDS.has_key(field):
+            raise Error("Unknown field: %s" % field)
+        opts.append(META_FIELDS[field])
+
+    _meta_ttl_opts(kwargs, opts)
+
+    return "mg %s %s" % (key, " ".join(opts))
+
+def meta_set_cmd(key, value, kwargs):
+    check_key(key)
+
+    value = value_str(value)
+
+    opts = []
+    mode = kwargs.get(OPT_MODE, 'set')
+    if not _meta_set_modes.has_key(mode):
+        raise Error("Unknown mode: %s" % mode)
+    if mode != 'set':
+        opts.append("M%s" % _meta_set_modes[mode])
+
+    if kwargs.get(OPT_FLAG):
+        opts.append("F%d" % kwargs[OPT_FLAG])
+
+    if kwargs.get(OPT_EXPIRE):
+        opts.append("T%d" % kwargs[OPT_EXPIRE])
+
+    if kwargs.get(OPT_CAS) is not None:
+        opts.append("C%d" % kwargs[OPT_CAS])
+
+    if kwargs.get(OPT_INVALIDATE):
+        opts.append('I')
+
+    if kwargs.get(OPT_RETURN_CAS):
+        opts.append('c')
+
+    return "ms %s %d %s\r\n%s" % (key, len(value), " ".join(opts), value)
+
+def meta_delete_cmd(key, kwargs):
+    check_key(key)
+
+    opts = []
+    if kwargs.get(OPT_CAS) is not None:
+        opts.append("C%d" % kwargs[OPT_CAS])
+
+    # with invalidate, the item is marked stale instead of being removed.
+    if kwargs.get(OPT_INVALIDATE):
+        opts.append('I')
+        if kwargs.get(OPT_EXPIRE):
+            opts.append("T%d" % kwargs[OPT_EXPIRE])
+
+    return "md %s %s" % (key, " ".join(opts))
+
+def meta_arithmetic_cmd(key, delta, kwargs):
+    check_key(key)
+
+    if not 0 <= delta:
+        raise Error("Value must be integer.")
+
+    opts = ['v', "D%d" % delta]
+    mode = kwargs.get(OPT_MODE, 'incr')
+    if not _meta_arithmetic_modes.has_key(mode):
+        raise Error("Unknown mode: %s" % mode)
+    if mode != 'incr':
+        opts.append("M%s" % _meta_arithmetic_modes[mode])
+
+    # a missing key is created with the initial value when vivify is given.
+    if kwargs.get(OPT_VIVIFY) is not None:
+        opts.append("N%d" % kwargs[OPT_VIVIFY])
+        opts.append("J%d" % kwargs.get(OPT_INITIAL, 0))
+
+    if kwargs.get(OPT_EXPIRE):
+        opts.append("T%d" % kwargs[OPT_EXPIRE])
+
+    return "ma %s %s" % (key, " ".join(opts))
+
+
+def meta_get_result(event, key):
+    if type(event) is MetaValue:
+        fields = meta_fields(event.flags)
+        fields['value'] = event.data.tobytes()
+        return fields
+
+    if event.code == 'HD':
+        return meta_fields(event.flags)
+
+    elif event.code == 'EN':
+        raise KeyNotFoundError("Key:%s is not found." % key)
+
+    raise Error("Unknown error:%s" % event.code)
+
+def meta_set_result(event, key):
+    if type(event) is MetaStatus:
+        if event.code == 'HD':
+            return meta_fields(event.flags).get('cas')
+
+        elif event.code in ('NS', 'EX', 'NF'):
+            raise StoreError("store error:%s" % key)
+
+    raise Error("Unknown error:%s" % (event,))
+
+def meta_delete_result(event, key):
+    if type(event) is MetaStatus:
+        if event.code == 'HD':
+            return
+
+        elif event.code == 'NF':
+            raise KeyNotFoundError("key:%s is not found." % key)
+
+        elif event.code == 'EX':
+            raise Error("cas mismatch:%s" % key)
+
+    raise Error("Unknown error:%s" % (event,))
+
+def meta_arithmetic_result(event, key):
+    if type(event) is MetaValue:
+        return int(event.data.tobytes())
+
+    if event.code == 'NF':
+        raise KeyNotFoundError("key:%s is not found." % key)
+
+    raise Error("Unknown error:%s" % event.code)
+
+
+class LineReply(object):
+    """ Reply of one line, which is passed to func with args. """
+
+    def __init__(self, func=None, *args):
+        self._func = func
+        self._args = args
+        self._result = None
+
+    def parse(self, reader):
+        line = reader.readline()
+        if line is None:
+            return False
+
+        if self._func is None:
+            self._result = line
+        else:
+            self._result = self._func(line, *self._args)
+        return True
+
+    def result(self):
+        return self._result
+
+
+class GetReply(object):
+    """ Reply of get/gets: a dict of key => (value, key, flags, bytes, cas). """
+
+    def __init__(self, cmdline, use_cas=False):
+        self._cmdline = cmdline
+        self._use_cas = use_cas
+        self._results = {}
+
+    def parse(self, parser):
+        done = parser.read_values(self._results)
+        if type(done) is not bool:
+            raise Error("Unknown error: %s - %s" % (self._cmdline, done))
+        return done
+
+    def result(self):
+        return self._results
+
+
+class MetaReply(object):
+    """ Reply of a meta command, whose event is passed to func with args. """
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+        self._result = None
+
+    def parse(self, parser):
+        event = parser.next_event()
+        if event is None:
+            return False
+
+        if type(event) is ServerError:
+            raise Error("%s %s" % (event.kind, event.message))
+
+        elif type(event) not in (MetaValue, MetaStatus):
+            raise Error("Unknown error:%s" % (event,))
+
+        self._result = self._func(event, *self._args)
+        return True
+
+    def result(self):
+        return self._result
+
+
+class StatsReply(object):
+    """ Reply of stats: a dict of name => value. """
+
+    def __init__(self, arg=""):
+        self._arg = arg
+        self._stats = {}
+
+    def parse(self, parser):
+        while(True):
+            event = parser.next_event()
+            if event is None:
+                return False
+
+            if event is END:
+                return True
+
+            elif type(event) is not Stat:
+                raise Error("Argument error: stats %s" % self._arg)
+
+            self._stats[event.name] = event.value
+
+    def result(self):
+        return self._stats
@@ -0,0 +1,354 @@
+'''
+Created on 2026/10/18
+
+Near-cache shared by the processes of a host through a memory-mapped file.
+
+SharedCache is a NearCache whose entries live in a fixed-size hash table
+in the file at path, so every worker opening the same file shares one copy
+of the hot values. Put the file on a tmpfs such as /dev/shm.
+
+The table is open addressed: a key lives in one of PROBES slots from its
+hash, and a new entry takes the slot of the same key, a free or expired
+slot, or else the one expiring first. Values larger than a slot are not
+cached. Each slot is guarded by a seqlock: a writer makes its sequence odd
+while it writes, so readers take no lock and retry a slot which changed
+under them. Writers are serialized by a lockf lock on the file.
+
+Keys hash to version stamps, which invalidation bumps. A value fetched
+from the server is stored only when the stamp of its key is the one seen
+at the miss, so a value read before a write by another process isn't
+cached after the write.
+'''
+
+import os
+import time
+import mmap
+import fcntl
+import struct
+import hashlib
+
+from threading import Lock
+
+from memc.protocol import Error, value_str
+from memc.basic import current_pid
+from memc.nearcache import NearCache, TTL
+
+SLOTS = 16 * 1024
+SLOT_SIZE = 1024
+# slots a key may live in
+PROBES = 8
+# version stamps of keys
+STAMPS = 4096
+# times a read retries a slot being written
+READ_RETRIES = 100
+
+MAGIC = 'MEMCSHC1'
+# magic, slots, slot size, stamps
+_file_header = struct.Struct('<8sIII')
+# seq, hash, expire, flags, cas, key length, value length
+_slot_header = struct.Struct('<IQdIQHI2x')
+_seq = struct.Struct('<I')
+_stamp = struct.Struct('<I')
+_hash = struct.Struct('<Q')
+
+_EMPTY = 0
+
+
+def key_hash(key):
+    # stable in every process, unlike hash().
+    h = _hash.unpack_from(hashlib.md5(key).digest())[0]
+    return h or 1
+
+
+class Table(object):
+    """ The hash table in the file, of (data, flags, cas) entries. """
+
+    def __init__(self, path, slots=SLOTS, slot_size=SLOT_SIZE, stamps=STAMPS):
+        if slot_size <= _slot_header.size:
+            raise Error("slot_size must be larger than %d." % _slot_header.size)
+
+        self._slots = slots
+        self._slot_size = slot_size
+        self._stamps = stamps
+        self._stamps_offset = _file_header.size
+        self._slots_offset = self._stamps_offset + _stamp.size * stamps
+        size = self._slots_offset + slot_size * slots
+
+        self._lock = Lock()
+        self._pid = current_pid()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                self._init_file(size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(self._fd, size)
+        except:
+            os.close(self._fd)
+            raise
+
+    def _init_file(self, size):
+        header = (MAGIC, self._slots, self._slot_size, self._stamps)
+        current = os.fstat(self._fd).st_size
+        if current == 0:
+            os.ftruncate(self._fd, size)
+            os.write(self._fd, _file_header.pack(*header))
+            return
+
+        data = os.read(self._fd, _file_header.size)
+        if current != size or _file_header.unpack(data) != header:
+            raise Error("Shared cache file has another layout: %r" % (data,))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
+
+    def _write(self):
+        return _WriteLock(self)
+
+    def _offset(self, index):
+        return self._slots_offset + self._slot_size * index
+
+    def _probe(self, h):
+        start = h % self._slots
+        for i in xrange(PROBES):
+            yield self._offset((start + i) % self._slots)
+
+    def stamp(self, h):
+        return _stamp.unpack_from(self._mm, self._stamps_offset +
+                                  _stamp.size * (h % self._stamps))[0]
+
+    def _read(self, offset, h, key):
+        """ Returns (header, data) of the slot if it holds key. """
+        mm = self._mm
+        limit = self._slot_size - _slot_header.size
+        for i in xrange(READ_RETRIES):
+            header = _slot_header.unpack_from(mm, offset)
+            seq = header[0]
+            if seq & 1:
+                continue
+            if header[1] != h:
+                return None
+
+            (key_len, value_len) = header[5:7]
+            start = offset + _slot_header.size
+            data = mm[start:start + min(key_len + value_len, limit)]
+            if _seq.unpack_from(mm, offset)[0] != seq:
+                continue
+
+            if data[:key_len] != key:
+                return None
+            return (header, data[key_len:])
+        return None
+
+    def get(self, key, now):
+        """ Returns ((data, flags, cas) or None, the stamp of key). """
+        h = key_hash(key)
+        stamp = self.stamp(h)
+        for offset in self._probe(h):
+            slot = self._read(offset, h, key)
+            if slot is None:
+                continue
+
+            (header, data) = slot
+            if header[2] <= now:
+                break
+            return ((data, header[3], header[4]), stamp)
+        return (None, stamp)
+
+    def _find(self, h, key, now):
+        """ Returns (offset of the slot for key, whether a live entry of
+        another key is evicted). Called by writers.
+        """
+        mm = self._mm
+        free = None
+        oldest = None
+        for offset in self._probe(h):
+            header = _slot_header.unpack_from(mm, offset)
+            if header[1] == h:
+                start = offset + _slot_header.size
+                if mm[start:start + header[5]] == key:
+                    return (offset, False)
+
+            if header[1] == _EMPTY or header[2] <= now:
+                if free is None:
+                    free = offset
+            elif oldest is None or header[2] < oldest[1]:
+                oldest = (offset, header[2])
+
+        if free is not None:
+            return (free, False)
+        return (oldest[0], True)
+
+    def _set_slot(self, offset, h, expire, flags, cas, key, data):
+        mm = self._mm
+        seq = _seq.unpack_from(mm, offset)[0]
+        _seq.pack_into(mm, offset, (seq + 1) & 0xffffffff)
+
+        start = offset + _slot_header.size
+        mm[start:start + len(key)] = key
+        mm[start + len(key):start + len(key) + len(data)] = data
+        _slot_header.pack_into(mm, offset, (seq + 1) & 0xffffffff, h,
+                               expire, flags, cas, len(key), len(data))
+
+        _seq.pack_into(mm, offset, (seq + 2) & 0xffffffff)
+
+    def put(self, key, data, flags, cas, expire, now, stamp):
+        """ Stores data unless the stamp of key has changed. Returns
+        whether a live entry is evicted, or None when it's not stored.
+        """
+        if _slot_header.size + len(key) + len(data) > self._slot_size:
+            return None
+
+        h = key_hash(key)
+        with self._write():
+            if self.stamp(h) != stamp:
+                return None
+
+            (offset, evicted) = self._find(h, key, now)
+            self._set_slot(offset, h, expire, flags, cas, key, data)
+        return evicted
+
+    def delete(self, key):
+        h = key_hash(key)
+        with self._write():
+            offset = self._stamps_offset + _stamp.size * (h % self._stamps)
+            _stamp.pack_into(self._mm, offset,
+                             (_stamp.unpack_from(self._mm, offset)[0] + 1)
+                             & 0xffffffff)
+
+            for offset in self._probe(h):
+                if self._read(offset, h, key) is not None:
+                    self._set_slot(offset, _EMPTY, 0, 0, 0, '', '')
+
+    def clear(self):
+        with self._write():
+            for i in xrange(self._stamps):
+                offset = self._stamps_offset + _stamp.size * i
+                _stamp.pack_into(self._mm, offset,
+                                 (_stamp.unpack_from(self._mm, offset)[0] + 1)
+                                 & 0xffffffff)
+
+            for i in xrange(self._slots):
+                offset = self._offset(i)
+                if _slot_header.unpack_from(self._mm, offset)[1] != _EMPTY:
+                    self._set_slot(offset, _EMPTY, 0, 0, 0, '', '')
+
+    def count(self, now):
+        num = 0
+        for i in xrange(self._slots):
+            header = _slot_header.unpack_from(self._mm, self._offset(i))
+            if header[1] != _EMPTY and header[2] > now:
+                num += 1
+        return num
+
+
+class _WriteLock(object):
+    """ Excludes the writers of other threads, and of other processes by
+    lockf, which isn't shared with the children of a fork.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __enter__(self):
+        table = self._table
+        if table._pid != current_pid():
+            # the lock may have been held by another thread at the fork.
+            table._lock = Lock()
+            table._pid = current_pid()
+
+        table._lock.acquire()
+        try:
+            fcntl.lockf(table._fd, fcntl.LOCK_EX)
+        except:
+            table._lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            fcntl.lockf(self._table._fd, fcntl.LOCK_UN)
+        finally:
+            self._table._lock.release()
+
+
+class SharedCache(NearCache):
+    """ NearCache whose entries are shared by the processes opening path.
+
+    The file is made with slots of slot_size bytes when it doesn't exist,
+    and every process has to open it with the same layout. Values are kept
+    as they are encoded by the codec of the client. hits, misses and
+    evictions count the operations of this process.
+    """
+
+    def __init__(self, client, path, ttl=TTL, slots=SLOTS,
+                 slot_size=SLOT_SIZE):
+        NearCache.__init__(self, client, ttl)
+        self._table = Table(path, slots, slot_size)
+        self._codec = getattr(client, '_codec', None)
+        # key => stamp of the key seen at the miss
+        self._stamps = {}
+
+    def __len__(self):
+        return self._table.count(time.time())
+
+    def close(self):
+        self._table.close()
+
+    def clear(self):
+        with self._lock:
+            self._fetching.clear()
+            self._stamps.clear()
+        self._table.clear()
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._fetching.pop(key, None)
+                self._stamps.pop(key, None)
+
+        for key in keys:
+            self._table.delete(key)
+
+    def _lookup(self, key, now, token):
+        (entry, stamp) = self._table.get(key, now)
+        if entry is not None:
+            self.hits += 1
+            (data, flags, cas) = entry
+            if self._codec is not None:
+                value = self._codec.decode(data, flags)
+            else:
+                value = data
+            return (value, key, flags, len(data), cas)
+
+        self.misses += 1
+        self._fetching[key] = token
+        self._stamps[key] = stamp
+        return None
+
+    def _release(self, key, token):
+        if self._fetching.get(key) is token:
+            del self._fetching[key]
+            del self._stamps[key]
+
+    def _store(self, key, item, now, token):
+        if self._fetching.get(key) is not token:
+            return
+        del self._fetching[key]
+        stamp = self._stamps.pop(key)
+
+        (value, key, flags, size, cas) = item
+        if self._codec is not None:
+            (data, flags) = self._codec.encode(value)
+        else:
+            data = value
+        if self._table.put(key, value_str(data), flags, cas or 0,
+                           now + self._ttl, now, stamp):
+            self.evictions += 1
+
+
+if __name__ == "__main__":
+    pass
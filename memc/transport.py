@@ -0,0 +1,91 @@
+'''
+Created on 2026/10/18
+
+Transports open the sockets of clients: TCP for a (host, port) server and
+a unix domain socket for a path, see memc.conn2tuple.
+
+A Transport is shared by clients and it holds no connection, so a pool or
+a sharding client passes its transport to every connection it opens. A
+subclass can override connect() to open sockets in another way.
+'''
+
+import socket
+
+import memc
+
+TIME_OUT = 10
+CONNECT_TIME_OUT = TIME_OUT
+
+# options set by keepalive=(idle, interval, count), where the platform has
+# them
+KEEPALIVE_OPTS = ('TCP_KEEPIDLE', 'TCP_KEEPINTVL', 'TCP_KEEPCNT')
+
+
+class Transport(object):
+    """ Opens connected sockets.
+
+    nodelay disables Nagle's algorithm, so a small request isn't held back
+    until the previous segment is acknowledged. keepalive=True sets
+    SO_KEEPALIVE, and a tuple of (idle, interval, count) in seconds sets
+    its probes too. sndbuf and rcvbuf set SO_SNDBUF and SO_RCVBUF before
+    connecting. TCP options are ignored on unix domain sockets.
+
+    connect_timeout and read_timeout are the defaults of the clients,
+    which have their own attributes of the same names.
+    """
+
+    def __init__(self, nodelay=True, keepalive=False, sndbuf=None,
+                 rcvbuf=None, connect_timeout=CONNECT_TIME_OUT,
+                 read_timeout=TIME_OUT):
+        self.nodelay = nodelay
+        self.keepalive = keepalive
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def _socket(self, server):
+        if memc.is_unix(server):
+            return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY,
+                        1 if self.nodelay else 0)
+
+        if self.keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if type(self.keepalive) is tuple:
+                for (name, value) in zip(KEEPALIVE_OPTS, self.keepalive):
+                    if hasattr(socket, name):
+                        sock.setsockopt(socket.SOL_TCP,
+                                        getattr(socket, name), value)
+        return sock
+
+    def connect(self, server, connect_timeout, read_timeout):
+        """ Returns a socket connected to server. """
+        sock = self._socket(server)
+        try:
+            # the window scale is fixed at the handshake.
+            if self.sndbuf is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                self.sndbuf)
+            if self.rcvbuf is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                self.rcvbuf)
+
+            sock.settimeout(connect_timeout)
+            sock.connect(server)
+            sock.settimeout(read_timeout)
+        except:
+            sock.close()
+            raise
+
+        return sock
+
+
+# used by the clients given no transport
+DEFAULT_TRANSPORT = Transport()
+
+
+if __name__ == "__main__":
+    pass
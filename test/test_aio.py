@@ -0,0 +1,61 @@
+'''
+Created on 2026/10/18
+'''
+
+import unittest
+import memc.aio
+import memc.basic
+
+
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.key = '_aio'
+        self.loop = memc.aio.asyncio.new_event_loop()
+
+        self.mc = memc.aio.Client(self.server, loop=self.loop)
+        self.wait(self.mc.connect())
+
+    def tearDown(self):
+        self.mc.close()
+        self.loop.close()
+
+    def wait(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_set_get(self):
+        self.wait(self.mc.delete(self.key, noreply=True))
+        self.assertEqual(self.wait(self.mc.set(self.key, 'abc', flag=3)), None)
+        self.assertEqual(self.wait(self.mc.get(self.key)), 'abc')
+        self.assertEqual(self.wait(self.mc.raw_get(self.key))[:4],
+                         ('abc', self.key, 3, 3))
+        self.assertRaises(memc.basic.StoreError,
+                          self.wait, self.mc.add(self.key, 'x'))
+
+        self.wait(self.mc.delete(self.key))
+        self.assertRaises(memc.basic.KeyNotFoundError,
+                          self.wait, self.mc.get(self.key))
+
+    def test_pipelining(self):
+        num = 500
+        keys = ['aio%d' % i for i in xrange(num)]
+
+        futures = [self.mc.set(key, key) for key in keys]
+        futures += [self.mc.incr(keys[0], 1), self.mc.mget(keys)]
+        futures += [self.mc.get(key) for key in keys]
+
+        results = self.wait(memc.aio.asyncio.gather(*futures,
+                                                    return_exceptions=True,
+                                                    loop=self.loop))
+        self.assertEqual(results[:num], [None] * num)
+        self.assertTrue(isinstance(results[num], memc.basic.Error))
+        self.assertEqual(results[num + 1], keys)
+        self.assertEqual(results[num + 2:], keys)
+
+    def test_stats_version(self):
+        self.assertTrue(len(self.wait(self.mc.stats())) > 0)
+        self.assertTrue(self.wait(self.mc.version()).startswith('VERSION '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,10 +6,16 @@ Created on 2010/03/12
 
 import unittest
 import socket
+import io
+import mmap
 import memc.basic
+import memc.codec
 
+BUF_LEN_DEFAULT = memc.basic.BUF_LEN
 
 class TestBasic(unittest.TestCase):
+    protocol = memc.basic.PROTOCOL_TEXT
+    
     def setUp(self):
         self.server = ('127.0.0.1', 11211)
         self.dummy_server = ('_no_existent_host_', 11211)
@@ -17,13 +23,14 @@ class TestBasic(unittest.TestCase):
         self.key = '_hoge'
         self.data = self.key * 2000
         
-        self.mc = memc.basic.Client(self.server)
+        self.mc = memc.basic.Client(self.server, protocol=self.protocol)
         self.mc.connect()
 
         #self.mc._set_buf_len(20)
         #memc.basic.BUF_LEN = 30
 
     def tearDown(self):
+        memc.basic.BUF_LEN = BUF_LEN_DEFAULT
         self.mc.close()
     
     
@@ -125,6 +132,16 @@ class TestBasic(unittest.TestCase):
             self.assertEqual(self.data, result[0])
             
             
+    def test_large_value(self):
+        data = 'L' * (1000 * 1000)
+        
+        self.mc.set(self.key, data)
+        
+        for s in (1000, BUF_LEN_DEFAULT):
+            memc.basic.BUF_LEN = s
+            result = self.mc.raw_mget([self.key, self.key])
+            self.assertEqual([data, data], result)
+            
     def test_key_len(self):
         for l in xrange(1, 250):
             k = 'a' * l
@@ -244,6 +261,309 @@ class TestBasic(unittest.TestCase):
             self.mc.cas(str(a), data, result[str(a)][4])
         
     
+    def test_pipeline(self):
+        self.mc.delete(self.key, noreply=True)
+        
+        with self.mc.pipeline() as p:
+            p.set(self.key, '1')
+            p.add(self.key, self.data)
+            p.incr(self.key, 10)
+            p.decr(self.key, 1, noreply=True)
+            p.get(self.key)
+            p.raw_gets(self.key)
+            p.delete(self.key)
+            p.delete(self.key)
+            p.get(self.key)
+            p.mget([self.key, 'a'])
+        
+        r = p.results
+        self.assertEqual(len(r), 10)
+        self.assertEqual(r[0], None)
+        self.assertTrue(isinstance(r[1], memc.basic.StoreError))
+        self.assertEqual(r[2:5], [11, None, '10'])
+        self.assertEqual(r[5][:4], ('10', self.key, 0, 2))
+        self.assertEqual(r[6], None)
+        self.assertTrue(isinstance(r[7], memc.basic.KeyNotFoundError))
+        self.assertTrue(isinstance(r[8], memc.basic.KeyNotFoundError))
+        self.assertEqual(r[9][0], None)
+        
+        self.assertEqual(self.mc.pipeline().execute(), [])
+        self.assertEqual(self.mc.version()[:8], 'VERSION ')
+        
+        # replies left unread by a timeout aren't read by the next command.
+        self.mc.set(self.key, 'a')
+        p = self.mc.pipeline()
+        p.get(self.key)
+        p.get(self.key)
+        def fail():
+            raise socket.timeout('timed out')
+        self.mc._recv = fail
+        self.assertRaises(socket.timeout, p.execute)
+        del self.mc._recv
+        self.assertEqual(self.mc._sock, None)
+        
+        self.mc.set(self.key, 'b')
+        self.assertEqual(self.mc.get(self.key), 'b')
+
+    def test_meta(self):
+        self.mc.delete(self.key, noreply=True)
+        
+        self.assertRaises(memc.basic.KeyNotFoundError,
+                          self.mc.meta_get, self.key)
+        
+        cas = self.mc.meta_set(self.key, self.data, flag=3, expire=100,
+                               return_cas=True)
+        r = self.mc.meta_get(self.key, ('value', 'cas', 'flags', 'ttl', 'hit'))
+        self.assertEqual(r, {'value': self.data, 'cas': cas, 'flags': 3,
+                             'ttl': 100, 'hit': False})
+        self.assertEqual(self.mc.meta_get(self.key, ('size', 'key', 'hit')),
+                         {'size': len(self.data), 'key': self.key, 'hit': True})
+        
+        self.assertRaises(memc.basic.StoreError, self.mc.meta_set,
+                          self.key, '1', mode='add')
+        self.assertRaises(memc.basic.StoreError, self.mc.meta_set,
+                          self.key, '1', cas=cas + 1)
+        self.mc.meta_set(self.key, '1', cas=cas)
+        
+        self.assertEqual(self.mc.meta_arithmetic(self.key, 10), 11)
+        self.assertEqual(self.mc.meta_arithmetic(self.key, 2, mode='decr'), 9)
+        
+        self.mc.meta_delete(self.key)
+        self.assertRaises(memc.basic.KeyNotFoundError,
+                          self.mc.meta_delete, self.key)
+        self.assertRaises(memc.basic.KeyNotFoundError,
+                          self.mc.meta_arithmetic, self.key)
+        self.assertEqual(self.mc.meta_arithmetic(self.key, vivify=0,
+                                                 initial=5), 5)
+        self.assertRaises(memc.basic.Error, self.mc.meta_get, self.key,
+                          ('value', 'unknown'))
+        
+        with self.mc.pipeline() as p:
+            p.meta_set(self.key, 'x')
+            p.meta_get(self.key, ('value', 'size'))
+            p.meta_delete(self.key)
+            p.meta_get(self.key)
+        
+        r = p.results
+        self.assertEqual(r[:3], [None, {'value': 'x', 'size': 1}, None])
+        self.assertTrue(isinstance(r[3], memc.basic.KeyNotFoundError))
+
+    def test_codec(self):
+        mc = memc.basic.Client(self.server, protocol=self.protocol,
+                               codec=memc.codec.Codec(compress_threshold=100))
+        mc.connect()
+        value = {'a': [1, 2], 'b': self.data}
+        
+        mc.set(self.key, value)
+        self.assertEqual(mc.get(self.key), value)
+        self.assertTrue(self.mc.raw_get(self.key)[3] < len(self.data))
+        
+        mc.set(self.key, 10)
+        mc.delete('a', noreply=True)
+        self.assertEqual(mc.incr(self.key, 5), 15)
+        self.assertEqual(mc.raw_gets(self.key)[0], 15)
+        self.assertEqual(mc.mget([self.key, 'a']), [15, None])
+        
+        self.assertEqual(mc.set_multi({self.key: [1], 'a': 'b'}), [])
+        self.assertEqual(mc.mget([self.key, 'a']), [[1], 'b'])
+        mc.delete('a')
+        mc.close()
+
+    def test_buffer_values(self):
+        m = mmap.mmap(-1, 300 * 1024)
+        m[:] = 'm' * len(m)
+        large = 'l' * (200 * 1024)
+        values = [bytearray('abc'), memoryview('0123456789')[2:5], m, large,
+                  memoryview(large)]
+        
+        for value in values:
+            self.mc.set(self.key, value)
+            self.assertEqual(self.mc.get(self.key), str(value[:]) if
+                             type(value) is not memoryview else value.tobytes())
+        
+        self.mc.set(self.key, 'x')
+        self.mc.append(self.key, bytearray('yz'))
+        self.assertEqual(self.mc.get(self.key), 'xyz')
+        self.assertEqual(self.mc.set_multi({self.key: m}), [])
+        self.assertEqual(self.mc.get(self.key), m[:])
+        m.close()
+
+    def test_get_into(self):
+        data = 'abcdefghij' * 50000
+        self.mc.set(self.key, data)
+        
+        buf = bytearray(len(data) + 10)
+        self.assertEqual(self.mc.get_into(self.key, buf), len(data))
+        self.assertEqual(buf[:len(data)], data)
+        
+        m = mmap.mmap(-1, len(data))
+        self.assertEqual(self.mc.get_into(self.key, m), len(data))
+        self.assertEqual(m[:], data)
+        m.close()
+        
+        self.assertRaises(memc.basic.Error, self.mc.get_into, self.key,
+                          bytearray(10))
+        self.assertRaises(memc.basic.KeyNotFoundError, self.mc.get_into,
+                          '_none', buf)
+        self.assertEqual(self.mc.get(self.key), data)
+        
+        self.mc.set(self.key, '')
+        self.assertEqual(self.mc.get_into(self.key, buf), 0)
+
+    def test_get_stream(self):
+        data = 'abcdefghij' * 50000
+        self.mc.set(self.key, data)
+        
+        for chunk_size in (1000, 7, memc.basic.BUF_LEN, len(data) * 2):
+            f = io.BytesIO()
+            self.assertEqual(self.mc.get_stream(self.key, f, chunk_size),
+                             len(data))
+            self.assertEqual(f.getvalue(), data)
+        
+        self.assertRaises(memc.basic.KeyNotFoundError, self.mc.get_stream,
+                          '_none', f)
+        self.assertEqual(self.mc.version()[:8], 'VERSION ')
+
+    def test_iter_mget(self):
+        mapping = dict(('_iter%d' % i, str(i)) for i in xrange(500))
+        self.assertEqual(self.mc.set_multi(mapping), [])
+        keys = sorted(mapping.keys()) + ['_none%d' % i for i in xrange(50)]
+        
+        for batch_size in (1, 7, 100, 1000):
+            items = list(self.mc.iter_mget(iter(keys), batch_size))
+            self.assertEqual(dict(items), mapping)
+            self.assertEqual(len(items), len(mapping))
+        
+        # replies left in flight are read when it's stopped early.
+        it = self.mc.iter_mget(keys, 10)
+        self.assertEqual(it.next()[0], keys[0])
+        it.close()
+        self.assertEqual(self.mc.get(keys[1]), mapping[keys[1]])
+        self.assertEqual(list(self.mc.iter_mget([])), [])
+        
+        self.assertRaises(memc.basic.Error, list,
+                          self.mc.iter_mget(['a', 'b c']))
+        self.assertRaises(memc.basic.Error, list,
+                          self.mc.iter_mget(keys[:30] + ['b c'], 10))
+        self.assertEqual(self.mc.get(keys[1]), mapping[keys[1]])
+
+    def test_iter_mget_decode_error(self):
+        mc = memc.basic.Client(self.server, protocol=self.protocol,
+                               codec=memc.codec.Codec())
+        mc.connect()
+        keys = ['_iter%d' % i for i in xrange(20)]
+        mc.set_multi(dict((key, key) for key in keys))
+        self.mc.set('_iter_bad', 'abc', flag=memc.codec.FLAG_PICKLE)
+        
+        # the error is raised in the middle of a batch, with the next
+        # batch on the wire.
+        it = mc.iter_mget(keys[:12] + ['_iter_bad'] + keys[12:], 5)
+        self.assertRaises(memc.basic.Error, list, it)
+        self.assertEqual(mc.get(keys[3]), keys[3])
+        self.assertEqual(mc.mget(keys[:2]), keys[:2])
+        mc.close()
+
+    def test_chunked(self):
+        mc = memc.basic.Client(self.server, protocol=self.protocol,
+                               chunk_size=1000)
+        mc.connect()
+        data = ''.join(chr(i % 256) for i in xrange(10500))
+        
+        mc.set(self.key, data, expire=100)
+        self.assertEqual(mc.get(self.key), data)
+        self.assertEqual(mc.raw_get(self.key)[2:4], (0, len(data)))
+        self.assertEqual(mc.mget([self.key, '_none']), [data, None])
+        self.assertEqual(dict(mc.iter_mget([self.key])), {self.key: data})
+        
+        if self.protocol == memc.basic.PROTOCOL_TEXT:
+            buf = bytearray(len(data))
+            self.assertEqual(mc.get_into(self.key, buf), len(data))
+            self.assertEqual(buf, data)
+            m = mmap.mmap(-1, len(data))
+            self.assertEqual(mc.get_into(self.key, m), len(data))
+            self.assertEqual(m[:], data)
+            m.close()
+            self.assertRaises(memc.basic.Error, mc.get_into, self.key,
+                              bytearray(5000))
+            for chunk_size in (7, 1000, 4096):
+                f = io.BytesIO()
+                self.assertEqual(mc.get_stream(self.key, f, chunk_size),
+                                 len(data))
+                self.assertEqual(f.getvalue(), data)
+        
+        # a plain client sees the manifest.
+        (manifest, key, flags, size, cas) = self.mc.raw_get(self.key)
+        self.assertEqual(flags, memc.codec.FLAG_CHUNKED)
+        (version, num, size) = manifest.split()
+        self.assertEqual((int(num), int(size)), (11, len(data)))
+        
+        # a value of a missing chunk is a miss.
+        self.mc.delete(memc.basic.chunk_key(self.key, version, 5))
+        self.assertRaises(memc.basic.KeyNotFoundError, mc.get, self.key)
+        if self.protocol == memc.basic.PROTOCOL_TEXT:
+            self.assertRaises(memc.basic.KeyNotFoundError, mc.get_stream,
+                              self.key, io.BytesIO())
+            self.assertEqual(mc.version()[:8], 'VERSION ')
+        
+        mc.set(self.key, 'small')
+        self.assertEqual(self.mc.raw_get(self.key)[:3], ('small', self.key, 0))
+        
+        mc.set(self.key, memoryview(data))
+        if self.protocol == memc.basic.PROTOCOL_TEXT:
+            with mc.pipeline() as p:
+                p.get(self.key)
+                p.set(self.key + '2', data)
+                p.set(self.key + '3', data, noreply=True)
+                p.set(self.key + '4', 'small')
+            self.assertTrue(isinstance(p.results[0],
+                                       memc.basic.KeyNotFoundError))
+            self.assertEqual(p.results[1:], [None, None, None])
+            self.assertEqual(mc.mget([self.key + '2', self.key + '3',
+                                      self.key + '4']),
+                             [data, data, 'small'])
+            self.assertEqual(self.mc.raw_get(self.key + '2')[2],
+                             memc.codec.FLAG_CHUNKED)
+        
+        mc = memc.basic.Client(self.server, protocol=self.protocol,
+                               codec=memc.codec.Codec(), chunk_size=1000)
+        mc.connect()
+        value = {'a': data, 'b': [1, 2]}
+        mc.set(self.key, value)
+        self.assertEqual(mc.get(self.key), value)
+        self.assertEqual(mc.raw_get(self.key)[2], memc.codec.FLAG_PICKLE)
+        mc.close()
+
+    def test_set_multi(self):
+        num = 3000
+        mapping = {}
+        for a in xrange(num):
+            mapping['multi_%d' % a] = str(a) * (a % 100)
+        mapping['a b'] = 'bad key'
+        mapping['multi_large'] = 'L' * (2 * 1024 * 1024)
+        
+        failed = self.mc.set_multi(mapping, flag=3)
+        self.assertEqual(sorted(failed), ['a b', 'multi_large'])
+        
+        keys = ['multi_%d' % a for a in xrange(num)]
+        self.assertEqual(self.mc.mget(keys), [mapping[k] for k in keys])
+        self.assertEqual(self.mc.raw_get(keys[1])[2], 3)
+        
+        self.assertEqual(self.mc.set_multi({}), [])
+        
+        if self.protocol == memc.basic.PROTOCOL_TEXT:
+            # sent by batches, each read back up to its fence.
+            fences = []
+            send_cmds = self.mc._send_cmds
+            def send(cmds):
+                fences.append(cmds[-2])
+                send_cmds(cmds)
+            self.mc._send_cmds = send
+            mapping = dict(zip(keys, keys))
+            mapping['multi_large'] = 'L' * (2 * 1024 * 1024)
+            self.assertEqual(self.mc.set_multi(mapping), ['multi_large'])
+            self.assertEqual(fences.count('version'), 4)
+            self.assertEqual(self.mc.get(keys[-1]), keys[-1])
+
     def test_connect(self):
         def func():
             mc = memc.basic.Client(self.dummy_server)
@@ -260,6 +580,75 @@ class TestBasic(unittest.TestCase):
             
         self.assertRaises(socket.error, func)
     
+
+
+class PartialSocket(object):
+    """ Socket which writes at most size bytes at a time. """
+    
+    def __init__(self, size):
+        self._size = size
+        self.data = []
+        self.calls = 0
+    
+    def sendmsg(self, views):
+        self.calls += 1
+        n = self._size
+        for view in views:
+            chunk = view[:n].tobytes()
+            self.data.append(chunk)
+            n -= len(chunk)
+            if not n:
+                break
+        return self._size - n
+    
+    def sendall(self, data):
+        self.data.append(data)
+
+
+class TestSendParts(unittest.TestCase):
+    def test_sendmsg(self):
+        value = bytearray('v' * (100 * 1024))
+        parts = ['set a 0 0 %d' % len(value), '\r\n', value, '\r\n']
+        
+        for size in (1, 7, 1000, 50000, 1000000):
+            mc = memc.basic.Client(('127.0.0.1', 11211))
+            mc._sock = PartialSocket(size)
+            mc._send_parts(parts)
+            self.assertEqual("".join(mc._sock.data),
+                             "".join(str(part) for part in parts))
+        
+        # small parts are joined into one write.
+        mc._sock = PartialSocket(size)
+        mc._send_parts(['get', ' a', '\r\n'])
+        self.assertEqual(mc._sock.data, ['get a\r\n'])
+
+
+class TestBinary(TestBasic):
+    protocol = memc.basic.PROTOCOL_BINARY
+    
+    def test_pipeline(self):
+        self.assertRaises(memc.basic.Error, self.mc.pipeline)
+        
+    def test_meta(self):
+        self.assertRaises(memc.basic.Error, self.mc.meta_get, self.key)
+        
+    def test_get_into(self):
+        self.assertRaises(memc.basic.Error, self.mc.get_into, self.key,
+                          bytearray(10))
+        
+    def test_get_stream(self):
+        self.assertRaises(memc.basic.Error, self.mc.get_stream, self.key,
+                          io.BytesIO())
+        
+    def test_quiet_error(self):
+        self.mc.delete(self.key, noreply=True)
+        self.mc.incr(self.key, 1, noreply=True)
+        self.mc.replace(self.key, self.data, noreply=True)
+        
+        self.mc.set(self.key, '1')
+        self.assertEqual(self.mc.incr(self.key, 1), 2)
+        self.assertEqual(self.mc.get(self.key), '2')
+    
     
 if __name__ == '__main__':
     #unittest.main()
@@ -0,0 +1,70 @@
+'''
+Created on 2026/10/18
+'''
+
+import os
+import unittest
+import memc.codec
+
+from memc.codec import Codec
+from memc.codec import FLAG_PICKLE, FLAG_INTEGER, FLAG_LONG, FLAG_JSON
+from memc.codec import FLAG_COMPRESSED
+
+
+class TestCodec(unittest.TestCase):
+    values = ['', 'abc', 0, -12, 2 ** 70, 1.5, True, None, u'\u3042',
+              [1, 'a'], {'a': [1, 2]}, 'x' * 10000]
+
+    def round_trip(self, codec, value):
+        (data, flags) = codec.encode(value)
+        self.assertEqual(type(data), str)
+        return (codec.decode(data, flags), flags)
+
+    def test_pickle(self):
+        codec = Codec()
+        for value in self.values:
+            (result, flags) = self.round_trip(codec, value)
+            self.assertEqual(result, value)
+            self.assertEqual(type(result), type(value))
+
+    def test_flags(self):
+        codec = Codec()
+        self.assertEqual(codec.encode('abc'), ('abc', 0))
+        self.assertEqual(codec.encode(12), ('12', FLAG_INTEGER))
+        self.assertEqual(codec.encode(2 ** 70), (str(2 ** 70), FLAG_LONG))
+        self.assertEqual(codec.encode([1])[1], FLAG_PICKLE)
+        self.assertEqual(Codec('json').encode([1]), ('[1]', FLAG_JSON))
+
+    def test_json(self):
+        codec = Codec(memc.codec.SERIALIZER_JSON)
+        for value in ([1, u'a'], {u'a': None}, 1.5, True):
+            self.assertEqual(self.round_trip(codec, value)[0], value)
+
+    def test_compress(self):
+        codec = Codec(compress_threshold=100)
+
+        (data, flags) = codec.encode('x' * 99)
+        self.assertEqual(flags, 0)
+
+        (data, flags) = codec.encode('x' * 1000)
+        self.assertEqual(flags, FLAG_COMPRESSED)
+        self.assertTrue(len(data) < 100)
+        self.assertEqual(codec.decode(data, flags), 'x' * 1000)
+
+        (data, flags) = codec.encode(['x'] * 1000)
+        self.assertEqual(flags, FLAG_PICKLE | FLAG_COMPRESSED)
+        self.assertEqual(codec.decode(data, flags), ['x'] * 1000)
+
+        # incompressible data is kept as it is.
+        data = os.urandom(1000)
+        self.assertEqual(codec.encode(data), (data, 0))
+
+    def test_decode_error(self):
+        codec = Codec()
+        self.assertRaises(memc.Error, codec.decode, 'abc', FLAG_INTEGER)
+        self.assertRaises(memc.Error, codec.decode, 'abc', FLAG_COMPRESSED)
+        self.assertRaises(memc.Error, Codec, 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
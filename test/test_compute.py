@@ -0,0 +1,139 @@
+'''
+Created on 2026/10/18
+'''
+
+import time
+import unittest
+import memc.basic
+import memc.codec
+import memc.compute
+import memc.flare
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Rand(object):
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+
+class TestGetOrCompute(unittest.TestCase):
+    def setUp(self):
+        self.key = '_compute'
+        self.mc = memc.basic.Client(('127.0.0.1', 11211))
+        self.mc.connect()
+        for key in (self.key, memc.compute.lock_key(self.key)):
+            try:
+                self.mc.delete(key)
+            except memc.basic.KeyNotFoundError:
+                pass
+
+        self.calls = 0
+        self.clock = Clock()
+        memc.compute.time = self.clock
+
+    def tearDown(self):
+        memc.compute.time = time
+        self.mc.close()
+
+    def compute(self):
+        self.calls += 1
+        self.clock.now += 2
+        return 'v%d' % self.calls
+
+    def test_cached(self):
+        # u = 0 never recomputes early.
+        rand = Rand(0.0)
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand), 'v1')
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand), 'v1')
+        self.assertEqual(self.calls, 1)
+
+        (value, expiry, delta) = memc.compute.unpack(None,
+                                                     self.mc.get(self.key))
+        self.assertEqual((value, expiry, delta), ('v1', 1012.0, 2.0))
+        self.assertRaises(memc.basic.KeyNotFoundError, self.mc.get,
+                          memc.compute.lock_key(self.key))
+
+        self.clock.now += 10
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand), 'v2')
+
+    def test_early(self):
+        self.mc.get_or_compute(self.key, self.compute, 10)
+
+        # -log(1 - u) * delta * beta = 9.2 brings the expiry forward.
+        rand = Rand(0.99)
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand), 'v1')
+        self.clock.now += 1
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand), 'v2')
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                rand=rand, beta=0), 'v2')
+
+    def test_locked(self):
+        lock = memc.compute.lock_key(self.key)
+        self.mc.get_or_compute(self.key, self.compute, 10)
+
+        # the stale value is served while another caller holds the lock.
+        self.mc.add(lock, '1')
+        self.clock.now += 20
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10),
+                         'v1')
+        self.assertEqual(self.calls, 1)
+
+        # without a value, it's computed after waiting for it.
+        self.mc.delete(self.key)
+        self.assertEqual(self.mc.get_or_compute(self.key, self.compute, 10,
+                                                wait=0.05), 'v2')
+        self.assertEqual(self.mc.get(lock), '1')
+        self.mc.delete(lock)
+
+    def test_error(self):
+        def fail():
+            raise ValueError('fail')
+        self.assertRaises(ValueError, self.mc.get_or_compute, self.key,
+                          fail, 10)
+        self.assertRaises(memc.basic.KeyNotFoundError, self.mc.get,
+                          memc.compute.lock_key(self.key))
+
+        self.mc.set(self.key, 'plain')
+        self.assertRaises(memc.basic.Error, self.mc.get_or_compute, self.key,
+                          self.compute, 10)
+
+    def test_codec(self):
+        mc = memc.basic.Client(('127.0.0.1', 11211),
+                               codec=memc.codec.Codec())
+        mc.connect()
+        value = {'a': [1, 2]}
+        self.assertEqual(mc.get_or_compute(self.key, lambda: value, 10),
+                         value)
+        self.assertEqual(mc.get_or_compute(self.key, self.compute, 10),
+                         value)
+        self.assertEqual(self.calls, 0)
+        mc.close()
+
+    def test_pool(self):
+        pool = memc.flare.Pool(['127.0.0.1:11211'], max_pool=1)
+        self.assertEqual(pool.get_or_compute(self.key, self.compute, 10), 'v1')
+        self.assertEqual(pool.get_or_compute(self.key, self.compute, 10), 'v1')
+        self.assertEqual(self.calls, 1)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,417 @@
+'''
+Created on 2026/10/18
+'''
+
+import io
+import time
+import socket
+import random
+import threading
+import unittest
+import memc.basic
+import memc.flare
+
+# a master on 11211 and its slave on 11212, which are plain memcacheds.
+NODES = {
+    '127.0.0.1:11211:role': 'master', '127.0.0.1:11211:state': 'active',
+    '127.0.0.1:11211:partition': '0', '127.0.0.1:11211:balance': '1',
+    '127.0.0.1:11212:role': 'slave', '127.0.0.1:11212:state': 'active',
+    '127.0.0.1:11212:partition': '0', '127.0.0.1:11212:balance': '1',
+}
+
+
+class IndexServer(object):
+    """ Flare index server which only answers version and stats nodes. """
+
+    def __init__(self, nodes=NODES):
+        self.nodes = nodes
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(5)
+        self._listener.settimeout(0.05)
+        self.server = '%s:%d' % self._listener.getsockname()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                (conn, address) = self._listener.accept()
+            except socket.timeout:
+                continue
+
+            conn.settimeout(5)
+            f = conn.makefile('rb')
+            try:
+                for line in iter(f.readline, ''):
+                    if line.startswith('version'):
+                        conn.sendall("VERSION 1.0.14\r\n")
+                    elif line.startswith('stats nodes'):
+                        conn.sendall("".join("STAT %s %s\r\n" % item for item
+                                             in sorted(self.nodes.items())) +
+                                     "END\r\n")
+                    elif line.startswith('quit'):
+                        break
+            except socket.error:
+                pass
+            f.close()
+            conn.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._listener.close()
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.servers = ['127.0.0.1:11211']
+        self.key = '_pool'
+
+    def test_lazy(self):
+        pool = memc.flare.Pool(self.servers, max_pool=3)
+        self.assertEqual(len(pool), 0)
+
+        pool.set(self.key, 'a')
+        self.assertEqual(pool.get(self.key), 'a')
+        self.assertEqual(len(pool), 1)
+        pool.close()
+        self.assertEqual(len(pool), 0)
+
+        pool = memc.flare.Pool(self.servers, max_pool=3, min_idle=2)
+        self.assertEqual(len(pool), 2)
+        pool.close()
+
+    def test_chunked(self):
+        pool = memc.flare.Pool(self.servers, max_pool=1, chunk_size=100)
+        pool.set(self.key, 'x' * 1000)
+        self.assertEqual(pool.get(self.key), 'x' * 1000)
+        pool.close()
+
+    def test_timeout(self):
+        pool = memc.flare.Pool(self.servers, max_pool=1, timeout=0.05)
+        conn = pool._checkout()
+        self.assertRaises(memc.flare.PoolTimeoutError, pool.get, self.key)
+
+        pool._checkin(conn)
+        pool.set(self.key, 'a')
+        self.assertEqual(pool.get(self.key), 'a')
+        pool.close()
+
+    def test_discard(self):
+        health = memc.flare.Health(threshold=10)
+        pool = memc.flare.Pool(self.servers, max_pool=2, health=health)
+        pool.set(self.key, 'a')
+        (fl, created, last_used) = pool._idle[0]
+
+        # a half read reply is left on the connection.
+        fl._send_cmd('get %s' % self.key)
+        fl._buf.feed('VALUE %s 0 1\r\n' % self.key)
+        def fail():
+            raise socket.error('reset')
+        fl._recv = fail
+
+        self.assertRaises(socket.error, pool.get, self.key)
+        self.assertEqual(len(pool), 0)
+
+        self.assertEqual(pool.get(self.key), 'a')
+        self.assertRaises(memc.flare.KeyNotFoundError, pool.get, '_pool_none')
+        self.assertEqual(len(pool), 1)
+        pool.close()
+
+    def test_recycle(self):
+        pool = memc.flare.Pool(self.servers, max_pool=2, min_idle=1,
+                               max_idle_time=0, max_lifetime=60)
+        conns = [pool._checkout(), pool._checkout()]
+        for conn in conns:
+            pool._checkin(conn)
+        self.assertEqual(len(pool), 2)
+
+        # idle connections are closed down to min_idle.
+        pool.set(self.key, 'a')
+        self.assertEqual(len(pool), 1)
+
+        # an old connection is replaced to keep min_idle.
+        (fl, created, last_used) = pool._idle[0]
+        pool._idle[0] = (fl, created - 60, last_used)
+        pool.set(self.key, 'a')
+        self.assertEqual(len(pool), 1)
+        self.assertTrue(pool._idle[0][0] is not fl)
+        pool.close()
+
+    def test_min_idle(self):
+        pool = memc.flare.Pool(self.servers, max_pool=3, min_idle=2,
+                               max_lifetime=0.01)
+        for i in xrange(3):
+            time.sleep(0.02)
+            pool.set(self.key, 'a')
+            self.assertEqual(len(pool), 2)
+            self.assertEqual(len(pool._idle), 2)
+
+        # and so is a broken one.
+        conn = pool._checkout()
+        pool._checkin(conn, True)
+        self.assertEqual(len(pool), 2)
+        pool.close()
+
+    def test_check_idle(self):
+        pool = memc.flare.Pool(self.servers, max_pool=1, min_idle=1,
+                               check_idle=0)
+        (fl, created, last_used) = pool._idle[0]
+        fl._sock.close()
+
+        # the closed connection fails the check and is replaced.
+        pool.set(self.key, 'a')
+        self.assertEqual(pool.get(self.key), 'a')
+        self.assertEqual(len(pool), 1)
+        self.assertTrue(pool._idle[0][0] is not fl)
+        pool.close()
+
+    def test_connect_error(self):
+        pool = memc.flare.Pool(['127.0.0.1:1'], max_pool=1, timeout=0.05)
+        self.assertRaises(socket.error, pool.get, self.key)
+        self.assertEqual(len(pool), 0)
+
+
+class TestBreaker(unittest.TestCase):
+    def test_states(self):
+        breaker = memc.flare.Breaker(threshold=2, backoff_min=1, backoff_max=3)
+        self.assertTrue(breaker.allow(0))
+
+        breaker.failure(0)
+        self.assertEqual(breaker.state, memc.flare.STATE_CLOSED)
+        breaker.failure(0)
+        self.assertEqual(breaker.state, memc.flare.STATE_OPEN)
+        self.assertFalse(breaker.allow(0.5))
+
+        # one probe after the backoff, which fails.
+        self.assertTrue(breaker.allow(1))
+        self.assertEqual(breaker.state, memc.flare.STATE_HALF_OPEN)
+        self.assertFalse(breaker.allow(1))
+        breaker.failure(1)
+        self.assertEqual(breaker.state, memc.flare.STATE_OPEN)
+        self.assertFalse(breaker.allow(2.5))
+
+        self.assertTrue(breaker.allow(3))
+        breaker.success()
+        self.assertEqual(breaker.state, memc.flare.STATE_CLOSED)
+        self.assertTrue(breaker.allow(3))
+
+    def test_failover(self):
+        dead = ('127.0.0.1', 1)
+        health = memc.flare.Health(threshold=1, backoff_min=60)
+        mc = memc.flare.Client(['127.0.0.1:1', '127.0.0.1:11211'],
+                               health=health)
+        self.assertEqual(health.state(dead), memc.flare.STATE_OPEN)
+
+        mc.set('_flare', 'a')
+        self.assertEqual(mc.get('_flare'), 'a')
+
+        # the dead server is not tried again while its circuit is open.
+        mc2 = memc.flare.Client(['127.0.0.1:1', '127.0.0.1:11211'],
+                                health=health)
+        self.assertEqual(mc2._server, ('127.0.0.1', 11211))
+        self.assertEqual(health._breakers[dead].failures, 1)
+
+        mc3 = memc.flare.Client(['127.0.0.1:1'], health=health)
+        self.assertRaises(socket.error, mc3.get, '_flare')
+        self.assertEqual(health._breakers[dead].failures, 1)
+
+    def test_operations(self):
+        server = ('127.0.0.1', 11211)
+        health = memc.flare.Health(threshold=2, backoff_min=0.01)
+        health.failure(server)
+        health.failure(server)
+        time.sleep(0.02)
+
+        # connecting is only the probe; a command closes the breaker.
+        mc = memc.flare.Client(['127.0.0.1:11211'], health=health)
+        self.assertEqual(health.state(server), memc.flare.STATE_HALF_OPEN)
+        self.assertRaises(memc.flare.KeyNotFoundError, mc.get, '_flare_none')
+        self.assertEqual(health.state(server), memc.flare.STATE_CLOSED)
+
+        # and a failure is balanced out by the commands after it.
+        health.failure(server)
+        self.assertEqual(health._breakers[server].failures, 1)
+        mc.set('_flare', 'a')
+        self.assertEqual(health._breakers[server].failures, 0)
+        mc.close()
+
+    def test_idle_close(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(2)
+        listener.settimeout(5)
+        server = listener.getsockname()
+
+        # a server which closes the first connection after its first get,
+        # like one which drops idle connections.
+        def serve():
+            for i in xrange(2):
+                try:
+                    (conn, address) = listener.accept()
+                except socket.error:
+                    return
+                f = conn.makefile('rb')
+                for line in iter(f.readline, ''):
+                    if line.startswith('version'):
+                        conn.sendall("VERSION 1.6.0\r\n")
+                    elif line.startswith('get'):
+                        conn.sendall("END\r\n")
+                        if i == 0:
+                            break
+                    elif line.startswith('quit'):
+                        break
+                f.close()
+                conn.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            health = memc.flare.Health()
+            mc = memc.flare.Client(['%s:%d' % server], health=health)
+            self.assertRaises(memc.flare.KeyNotFoundError, mc.get, '_flare')
+            time.sleep(0.05)
+
+            # the connection is opened again at once, and the server stays
+            # healthy.
+            self.assertRaises(memc.flare.KeyNotFoundError, mc.get, '_flare')
+            self.assertRaises(memc.flare.KeyNotFoundError, mc.get, '_flare')
+            self.assertEqual(health.state(server), memc.flare.STATE_CLOSED)
+            self.assertEqual(health._breakers[server].failures, 0)
+            mc.close()
+        finally:
+            listener.close()
+            thread.join()
+
+
+class TestCluster(unittest.TestCase):
+    stats = {
+        '10.0.0.1:12121:role': 'master', '10.0.0.1:12121:state': 'active',
+        '10.0.0.1:12121:partition': '0', '10.0.0.1:12121:balance': '1',
+        '10.0.0.2:12121:role': 'slave', '10.0.0.2:12121:state': 'active',
+        '10.0.0.2:12121:partition': '0', '10.0.0.2:12121:balance': '1',
+        '10.0.0.3:12121:role': 'slave', '10.0.0.3:12121:state': 'active',
+        '10.0.0.3:12121:partition': '0', '10.0.0.3:12121:balance': '3',
+        '10.0.0.4:12121:role': 'slave', '10.0.0.4:12121:state': 'prepare',
+        '10.0.0.4:12121:partition': '0', '10.0.0.4:12121:balance': '1',
+        '10.0.0.5:12121:role': 'master', '10.0.0.5:12121:state': 'active',
+        '10.0.0.5:12121:partition': '1', '10.0.0.5:12121:balance': '1',
+        '10.0.0.6:12121:role': 'proxy', '10.0.0.6:12121:state': 'active',
+        '10.0.0.6:12121:partition': '-1', '10.0.0.6:12121:balance': '0',
+        'pid': '42',
+    }
+
+    def test_topology(self):
+        nodes = memc.flare.parse_nodes(self.stats)
+        self.assertEqual(len(nodes), 6)
+        self.assertEqual(nodes[('10.0.0.1', 12121)]['role'], 'master')
+
+        topology = memc.flare.Topology(nodes, rand=random.Random(0))
+        self.assertEqual(len(topology), 2)
+        self.assertEqual(topology.master(0), ('10.0.0.1', 12121))
+        self.assertEqual(topology.reader(1), ('10.0.0.5', 12121))
+        self.assertRaises(socket.error, topology.master, 2)
+
+        counts = {}
+        for i in xrange(4000):
+            node = topology.reader(0)
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(sorted(counts.keys()),
+                         [('10.0.0.2', 12121), ('10.0.0.3', 12121)])
+        self.assertTrue(2.5 < float(counts[('10.0.0.3', 12121)]) /
+                        counts[('10.0.0.2', 12121)] < 3.5)
+
+        for key in ('a', 'b', 'hoge'):
+            self.assertTrue(topology.partition(key) in (0, 1))
+
+    def test_inactive_master(self):
+        stats = dict(self.stats)
+        stats.update({
+            '10.0.0.5:12121:state': 'down',
+            '10.0.0.7:12121:role': 'slave', '10.0.0.7:12121:state': 'active',
+            '10.0.0.7:12121:partition': '1', '10.0.0.7:12121:balance': '1',
+            '10.0.0.8:12121:role': 'master', '10.0.0.8:12121:state': 'prepare',
+            '10.0.0.8:12121:partition': '2', '10.0.0.8:12121:balance': '1',
+        })
+        topology = memc.flare.Topology(memc.flare.parse_nodes(stats))
+
+        # keys still hash over both partitions, not over the live masters.
+        self.assertEqual(len(topology), 2)
+        keys = ['key%d' % i for i in xrange(100)]
+        self.assertEqual([topology.partition(key) for key in keys],
+                         [memc.flare.partition_crc32(key, 2) for key in keys])
+
+        self.assertRaises(socket.error, topology.master, 1)
+        self.assertEqual(topology.reader(1), ('10.0.0.7', 12121))
+        self.assertRaises(socket.error, topology.master, 2)
+
+    def test_client(self):
+        index = IndexServer()
+        slave = memc.basic.Client(('127.0.0.1', 11212))
+        slave.connect()
+        mc = memc.flare.ClusterClient(index.server)
+        try:
+            mc.connect()
+            self.assertEqual(mc.topology().master(0), ('127.0.0.1', 11211))
+
+            # the slave is given its own copy, to tell the reads from the
+            # writes.
+            mc.set('_cluster', 'a')
+            slave.set('_cluster', 'b')
+            self.assertEqual(mc.get('_cluster'), 'b')
+            # gets goes to the master.
+            self.assertEqual(mc.raw_gets('_cluster')[0], 'a')
+
+            mapping = {'_cluster': 'c', '_cluster2': 'd'}
+            self.assertEqual(mc.set_multi(mapping), [])
+            self.assertEqual(mc.raw_gets('_cluster2')[0], 'd')
+            slave.set_multi(mapping)
+            self.assertEqual(mc.mget(['_cluster', '_cluster2']), ['c', 'd'])
+
+            self.assertEqual(sorted(mc._clients.keys()),
+                             [('127.0.0.1', 11211), ('127.0.0.1', 11212)])
+            mc.delete('_cluster')
+            mc.delete('_cluster2')
+            self.assertRaises(memc.flare.KeyNotFoundError, mc.raw_gets,
+                              '_cluster')
+            slave.delete('_cluster')
+            slave.delete('_cluster2')
+        finally:
+            mc.close()
+            slave.close()
+            index.close()
+
+    def test_nodes(self):
+        index = IndexServer()
+        slave = memc.basic.Client(('127.0.0.1', 11212))
+        slave.connect()
+        mc = memc.flare.ClusterClient(index.server)
+        try:
+            # streaming gets are reads, which go to the slave.
+            slave.set('_cluster', 'abc')
+            buf = bytearray(10)
+            self.assertEqual(mc.get_into('_cluster', buf), 3)
+            self.assertEqual(buf[:3], 'abc')
+            f = io.BytesIO()
+            self.assertEqual(mc.get_stream('_cluster', f), 3)
+            self.assertEqual(f.getvalue(), 'abc')
+            slave.delete('_cluster')
+
+            # and meta commands go to the master.
+            mc.meta_set('_cluster', 'a')
+            self.assertEqual(mc.meta_get('_cluster')['value'], 'a')
+            self.assertEqual(mc.raw_gets('_cluster')[0], 'a')
+            mc.meta_delete('_cluster')
+            self.assertRaises(memc.flare.KeyNotFoundError, mc.raw_gets,
+                              '_cluster')
+        finally:
+            mc.close()
+            slave.close()
+            index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+'''
+Created on 2026/10/18
+'''
+
+import os
+import unittest
+import memc.basic
+import memc.flare
+
+
+def in_child(func):
+    """ Runs func in a forked child and returns whether it succeeded. """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            if func():
+                code = 0
+        finally:
+            os._exit(code)
+
+    (pid, status) = os.waitpid(pid, 0)
+    return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+class TestFork(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.key = '_fork'
+
+    def test_client(self):
+        mc = memc.basic.Client(self.server)
+        mc.connect()
+        mc.set(self.key, 'a')
+        sock = mc._sock
+
+        def child():
+            value = mc.get(self.key)
+            return value == 'a' and mc._sock is not sock
+        self.assertTrue(in_child(child))
+
+        # the connection of the parent is still open.
+        self.assertTrue(mc._sock is sock)
+        self.assertEqual(mc.get(self.key), 'a')
+
+        # close in the child doesn't send quit on the shared connection.
+        def close():
+            mc.close()
+            return mc._sock is None
+        self.assertTrue(in_child(close))
+        self.assertEqual(mc.get(self.key), 'a')
+        mc.close()
+
+    def test_flare_client(self):
+        mc = memc.flare.Client(['127.0.0.1:11211'])
+        mc.set(self.key, 'a')
+        sock = mc._sock
+
+        def child():
+            mc.set(self.key, 'b')
+            return mc._sock is not sock
+        self.assertTrue(in_child(child))
+        self.assertEqual(mc.get(self.key), 'b')
+
+    def test_pool(self):
+        pool = memc.flare.Pool(['127.0.0.1:11211'], min_idle=2, lazy=True)
+        self.assertEqual(len(pool), 0)
+
+        pool.set(self.key, 'a')
+        self.assertEqual(len(pool), 2)
+        socks = [conn[0]._sock for conn in pool._idle]
+
+        def child():
+            if pool.get(self.key) != 'a' or len(pool) != 2:
+                return False
+            return not [conn for conn in pool._idle if conn[0]._sock in socks]
+        self.assertTrue(in_child(child))
+
+        self.assertEqual([conn[0]._sock for conn in pool._idle], socks)
+        self.assertEqual(pool.get(self.key), 'a')
+        pool.close()
+
+    def test_pool_checkin(self):
+        pool = memc.flare.Pool(['127.0.0.1:11211'], max_pool=2)
+        pool.set(self.key, 'a')
+        conn = pool._checkout()
+        sock = conn[0]._sock
+
+        # a connection checked out in the parent and returned in the child
+        # is closed there, and the child counts only its own.
+        def child():
+            if pool.get(self.key) != 'a' or len(pool) != 1:
+                return False
+            pool._checkin(conn)
+            if len(pool) != 1 or len(pool._idle) != 1:
+                return False
+            pool._checkin(pool._checkout(), True)
+            return len(pool) == 0 and pool.get(self.key) == 'a'
+        self.assertTrue(in_child(child))
+
+        self.assertTrue(conn[0]._sock is sock)
+        pool._checkin(conn)
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(pool.get(self.key), 'a')
+        pool.close()
+
+    def test_health(self):
+        health = memc.flare.Health(threshold=1)
+        server = ('127.0.0.1', 11211)
+        health.failure(server)
+
+        # a lock held by another thread of the parent.
+        health._lock.acquire()
+        def child():
+            health.after_fork()
+            health.success(server)
+            return health.state(server) == memc.flare.STATE_CLOSED
+        self.assertTrue(in_child(child))
+        health._lock.release()
+        self.assertEqual(health.state(server), memc.flare.STATE_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+'''
+Created on 2026/10/18
+'''
+
+import io
+import random
+import unittest
+import memc.basic
+import memc.flare
+import memc.hotkeys
+
+from test_nearcache import Clock
+
+
+class TestSketch(unittest.TestCase):
+    def test_estimate(self):
+        sketch = memc.hotkeys.Sketch(width=64, depth=4)
+        counts = {}
+        rand = random.Random(1)
+        for i in xrange(5000):
+            key = 'key%d' % min(int(rand.paretovariate(1.0)), 300)
+            counts[key] = counts.get(key, 0) + 1
+            sketch.add(key)
+
+        self.assertEqual(sketch.total, 5000)
+        for (key, count) in counts.items():
+            estimate = sketch.estimate(key)
+            self.assertTrue(count <= estimate <= count + 5000 / 64 * 2,
+                            (key, count, estimate))
+        self.assertEqual(sketch.estimate('key1'), counts['key1'])
+
+        sketch.clear()
+        self.assertEqual((sketch.total, sketch.estimate('key1')), (0, 0))
+
+    def test_top(self):
+        top = memc.hotkeys.TopK(3)
+        for (key, count) in [('a', 1), ('b', 2), ('c', 3), ('a', 5),
+                             ('d', 4), ('e', 1)]:
+            top.update(key, count)
+        self.assertEqual(top.items(), [('a', 5), ('d', 4), ('c', 3)])
+        self.assertEqual(len(top), 3)
+
+        # b comes back over the lowest one.
+        top.update('b', 6)
+        self.assertEqual(top.items(), [('b', 6), ('a', 5), ('d', 4)])
+
+
+class TestHotKeys(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.clock = Clock()
+        self.reported = []
+        self.hotkeys = self.make()
+
+    def make(self, **kwargs):
+        hotkeys = memc.hotkeys.HotKeys(top=2, interval=10,
+                                       callback=self.reported.append, **kwargs)
+        hotkeys.clock = self.clock.time
+        return hotkeys
+
+    def test_window(self):
+        hotkeys = self.hotkeys
+        self.assertEqual(hotkeys.heavy_hitters(), [])
+
+        for i in xrange(80):
+            hotkeys.record(['hot', 'warm%d' % (i % 2), 'cold%d' % i])
+            self.clock.now += 0.125
+        self.assertEqual(hotkeys.heavy_hitters()[0], ('hot', 8.0))
+        self.assertEqual(len(hotkeys.heavy_hitters()), 2)
+        self.assertEqual(hotkeys.rate('warm0'), 4.0)
+        self.assertEqual(self.reported, [])
+
+        # the next access closes the window.
+        hotkeys.record(['other'])
+        self.assertEqual(len(self.reported), 1)
+        self.assertEqual(self.reported[0][0], ('hot', 8.0))
+        self.assertEqual(hotkeys.last, self.reported[0])
+        self.assertEqual(hotkeys.rate('hot'), 0)
+
+    def test_sample(self):
+        hotkeys = self.make(sample_rate=0.5, min_rate=20)
+        hotkeys.random = random.Random(1).random
+        for i in xrange(1000):
+            hotkeys.record(['hot', 'cold%d' % (i % 100)])
+            self.clock.now += 0.01
+
+        hot = hotkeys.heavy_hitters()
+        self.assertEqual([key for (key, rate) in hot], ['hot'])
+        self.assertTrue(80 < hot[0][1] < 120, hot)
+
+    def test_client(self):
+        mc = memc.basic.Client(self.server, hotkeys=self.hotkeys)
+        mc.connect()
+        self.assertEqual(memc.basic.Client(self.server).hot_keys(), [])
+
+        mc.set('_hot', 'a')
+        mc.get('_hot')
+        mc.mget(['_hot', '_warm'])
+        mc.delete('_hot')
+        self.clock.now += 1
+        self.assertEqual(mc.hot_keys(), [('_hot', 4.0), ('_warm', 1.0)])
+        mc.close()
+
+    def test_reads(self):
+        mc = memc.basic.Client(self.server)
+        mc.connect()
+        mc.set_multi({'_hot': 'a', '_warm': 'b'})
+        mc._hotkeys = self.hotkeys
+
+        mc.get_into('_hot', bytearray(10))
+        mc.get_stream('_hot', io.BytesIO())
+        self.assertEqual(len(list(mc.iter_mget(['_hot', '_warm', '_cold'],
+                                               batch_size=2))), 2)
+        self.clock.now += 1
+        self.assertEqual(mc.hot_keys(), [('_hot', 3.0), ('_warm', 1.0)])
+        self.assertEqual(self.hotkeys.rate('_cold'), 1.0)
+        mc.close()
+
+    def test_pool(self):
+        pool = memc.flare.Pool(['127.0.0.1:11211'], hotkeys=self.hotkeys)
+        pool.set('_hot', 'a')
+        pool.get('_hot')
+        self.clock.now += 1
+        self.assertEqual(pool.hot_keys(), [('_hot', 2.0)])
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+'''
+Created on 2026/10/18
+'''
+
+import io
+import time
+import socket
+import threading
+import unittest
+import memc.ketama
+
+
+class TestRing(unittest.TestCase):
+    def setUp(self):
+        self.servers = ['10.0.0.%d:11211' % i for i in xrange(1, 5)]
+        self.keys = ['key%d' % i for i in xrange(10000)]
+
+    def test_distribution(self):
+        ring = memc.ketama.Ring(self.servers)
+        self.assertEqual(len(ring), 160 * len(self.servers))
+
+        groups = ring.group(self.keys)
+        self.assertEqual(len(groups), len(self.servers))
+        for keys in groups.values():
+            self.assertTrue(len(keys) > len(self.keys) / len(self.servers) / 2)
+
+    def test_weight(self):
+        ring = memc.ketama.Ring(self.servers[:2], [3, 1])
+        groups = ring.group(self.keys)
+        self.assertTrue(len(groups[('10.0.0.1', 11211)]) > len(self.keys) / 2)
+
+    def test_add_remove(self):
+        ring = memc.ketama.Ring(self.servers)
+        before = [ring.get_server(key) for key in self.keys]
+
+        ring.add_server('10.0.0.5:11211')
+        after = [ring.get_server(key) for key in self.keys]
+
+        moved = [a for (b, a) in zip(before, after) if a != b]
+        self.assertTrue(0 < len(moved) < len(self.keys) / 3)
+        self.assertEqual(set(moved), set([('10.0.0.5', 11211)]))
+
+        ring.remove_server('10.0.0.5:11211')
+        self.assertEqual([ring.get_server(key) for key in self.keys], before)
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        self.server = '127.0.0.1:11211'
+        self.mc = memc.ketama.Client([self.server])
+        self.mc.connect()
+
+    def tearDown(self):
+        self.mc.close()
+
+    def test_set_get(self):
+        keys = ['ketama%d' % i for i in xrange(100)]
+        for key in keys:
+            self.mc.set(key, key)
+
+        self.assertEqual(self.mc.get(keys[0]), keys[0])
+        self.assertEqual(self.mc.mget(keys + ['_none_']), keys + [None])
+        self.assertEqual(self.mc.set_multi(dict(zip(keys, keys))), [])
+        self.assertEqual(self.mc.version().keys(), [('127.0.0.1', 11211)])
+        self.assertEqual(dict(self.mc.iter_mget(keys + ['_none_'], 7)),
+                         dict(zip(keys, keys)))
+
+    def test_chunked(self):
+        mc = memc.ketama.Client([self.server, '127.0.0.1:11212'],
+                                chunk_size=100)
+        data = 'abcdefg' * 1000
+        mc.set('ketama_large', data)
+        mc.set('ketama0', 'ketama0')
+        self.assertEqual(mc.get('ketama_large'), data)
+        self.assertEqual(mc.mget(['ketama_large', 'ketama0']),
+                         [data, 'ketama0'])
+        mc.close()
+
+    def test_nodes(self):
+        mc = memc.ketama.Client([self.server, '127.0.0.1:11212'])
+        keys = ['ketama%d' % i for i in xrange(20)]
+        for key in keys:
+            mc.set(key, key * 10)
+            buf = bytearray(100)
+            self.assertEqual(mc.get_into(key, buf), len(key) * 10)
+            self.assertEqual(buf[:len(key) * 10], key * 10)
+            f = io.BytesIO()
+            self.assertEqual(mc.get_stream(key, f), len(key) * 10)
+            self.assertEqual(f.getvalue(), key * 10)
+
+            mc.meta_set(key, key)
+            self.assertEqual(mc.meta_get(key)['value'], key)
+            self.assertEqual(mc.get(key), key)
+            mc.meta_delete(key)
+            self.assertEqual(mc.mget([key]), [None])
+
+        mc.close()
+
+        # the chunks of a value would be on other nodes.
+        mc = memc.ketama.Client([self.server], chunk_size=100)
+        self.assertRaises(memc.basic.Error, mc.get_into, keys[0], buf)
+        mc.close()
+
+    def test_partial(self):
+        dead = ('127.0.0.1', 1)
+        keys = ['ketama%d' % i for i in xrange(100)]
+        for key in keys:
+            self.mc.set(key, key)
+
+        mc = memc.ketama.Client([self.server, dead], timeout=1.0)
+        self.assertRaises(memc.basic.SocketError, mc.mget, keys)
+
+        mc.partial = True
+        result = mc.mget(keys)
+        self.assertEqual(mc.failed_servers, [dead])
+
+        for (key, value) in zip(keys, result):
+            if mc._ring.get_server(key) == dead:
+                self.assertEqual(value, None)
+            else:
+                self.assertEqual(value, key)
+        mc.close()
+
+    def test_deadline(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        slow = listener.getsockname()
+        stop = threading.Event()
+
+        # a node which keeps sending its reply a byte at a time.
+        def serve():
+            (conn, address) = listener.accept()
+            f = conn.makefile('rb')
+            try:
+                for line in iter(f.readline, ''):
+                    if line.startswith('version'):
+                        conn.sendall("VERSION 1.6.0\r\n")
+                    elif line.startswith('get'):
+                        conn.sendall("VALUE ketama 0 1000\r\n")
+                        while not stop.wait(0.02):
+                            conn.sendall("x")
+            except socket.error:
+                pass
+            conn.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            mc = memc.ketama.Client(['%s:%d' % slow], timeout=0.3,
+                                    partial=True)
+            start = time.time()
+            self.assertEqual(mc.mget(['ketama']), [None])
+            self.assertTrue(time.time() - start < 1.0)
+            self.assertEqual(mc.failed_servers, [slow])
+            mc.close()
+        finally:
+            stop.set()
+            listener.close()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
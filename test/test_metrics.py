@@ -0,0 +1,160 @@
+'''
+Created on 2026/10/18
+'''
+
+import io
+import unittest
+import memc.basic
+import memc.flare
+import memc.ketama
+import memc.metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        histogram = memc.metrics.Histogram
+        for value in xrange(100000):
+            index = histogram._index(value)
+            self.assertTrue(histogram._highest(index - 1) < value <=
+                            histogram._highest(index))
+            self.assertTrue(histogram._highest(index) - value <= value / 16)
+
+    def test_percentile(self):
+        histogram = memc.metrics.Histogram()
+        self.assertEqual(histogram.percentile(50), None)
+
+        for value in xrange(1, 1001):
+            histogram.record(value)
+        self.assertEqual((histogram.count, histogram.min, histogram.max),
+                         (1000, 1, 1000))
+        self.assertEqual(histogram.mean(), 500.5)
+        for p in (50, 90, 99):
+            value = histogram.percentile(p)
+            self.assertTrue(p * 10 <= value <= p * 10 * 1.0625, (p, value))
+        self.assertEqual(histogram.percentile(100), 1000)
+        self.assertEqual(histogram.summary()['count'], 1000)
+
+
+class TestInstruments(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.metrics = memc.metrics.Metrics()
+        self.events = []
+        self.instruments = memc.metrics.Instruments(self.metrics,
+                                                    self.record)
+
+    def record(self, event, name, server, value):
+        self.events.append((event, name, server))
+
+    def test_client(self):
+        mc = memc.basic.Client(self.server, instruments=self.instruments)
+        mc.connect()
+        mc.set('_metrics', 'a')
+        mc.get('_metrics')
+        mc.mget(['_metrics', '_metrics_none'])
+        self.assertRaises(memc.basic.KeyNotFoundError, mc.delete,
+                          '_metrics_none')
+        mc.close()
+
+        metrics = self.metrics
+        self.assertEqual(metrics.histogram('set', self.server).count, 1)
+        self.assertEqual(metrics.histogram('get').count, 2)
+        self.assertEqual(metrics.histogram('delete').count, 1)
+        self.assertEqual((metrics.counter('hits'), metrics.counter('misses')),
+                         (2, 1))
+        self.assertAlmostEqual(metrics.hit_ratio(self.server), 2 / 3.0)
+        self.assertTrue(metrics.counter('bytes_sent') > 0)
+        self.assertTrue(metrics.counter('bytes_received') > 0)
+        self.assertEqual(metrics.counter('errors'), 0)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['timings']['get']['count'], 2)
+        self.assertEqual(snapshot['counters'][('hits', self.server)], 2)
+
+    def test_reads(self):
+        mc = memc.basic.Client(self.server, instruments=self.instruments)
+        mc.connect()
+        mc.set_multi({'_metrics0': 'a', '_metrics1': 'bc'})
+        metrics = self.metrics
+        metrics.reset()
+
+        buf = bytearray(10)
+        self.assertEqual(mc.get_into('_metrics1', buf), 2)
+        self.assertRaises(memc.basic.KeyNotFoundError, mc.get_into,
+                          '_metrics_none', buf)
+        fileobj = io.BytesIO()
+        self.assertEqual(mc.get_stream('_metrics0', fileobj), 1)
+
+        keys = ['_metrics0', '_metrics_none', '_metrics1']
+        self.assertEqual(len(list(mc.iter_mget(keys, batch_size=2))), 2)
+        mc.close()
+
+        self.assertEqual(metrics.histogram('get').count, 5)
+        self.assertEqual((metrics.counter('hits'), metrics.counter('misses')),
+                         (4, 2))
+        self.assertEqual(metrics.counter('errors'), 0)
+
+    def test_pipeline(self):
+        mc = memc.basic.Client(self.server, instruments=self.instruments)
+        mc.connect()
+        mc.set('_metrics', 'a')
+        metrics = self.metrics
+        metrics.reset()
+
+        with mc.pipeline() as p:
+            p.get('_metrics')
+            p.mget(['_metrics', '_metrics_none'])
+            p.set('_metrics', 'b')
+        mc.close()
+
+        self.assertEqual(metrics.histogram('pipeline', self.server).count, 1)
+        self.assertEqual((metrics.counter('hits'), metrics.counter('misses')),
+                         (2, 1))
+        self.assertTrue(metrics.counter('bytes_sent') > 0)
+
+    def test_disabled(self):
+        mc = memc.basic.Client(self.server)
+        self.assertEqual(mc._instruments, None)
+        mc.connect()
+        mc.set('_metrics', 'a')
+        mc.close()
+        self.assertEqual(self.events, [])
+
+    def test_failover(self):
+        dead = ('127.0.0.1', 1)
+        health = memc.flare.Health(backoff_min=60)
+        mc = memc.flare.Client(['127.0.0.1:1', '127.0.0.1:11211'],
+                               health=health, instruments=self.instruments)
+        mc.set('_metrics', 'a')
+
+        self.assertEqual(self.metrics.counter('failovers', dead), 1)
+        self.assertTrue(('log', None, dead) in self.events)
+        self.assertEqual(self.metrics.histogram('set', self.server).count, 1)
+
+    def test_pool(self):
+        pool = memc.flare.Pool(['127.0.0.1:11211'], max_pool=1, timeout=0.01,
+                               instruments=self.instruments)
+        pool.set('_metrics', 'a')
+        self.assertEqual(pool.get('_metrics'), 'a')
+        self.assertEqual(self.metrics.histogram('pool_wait').count, 2)
+        self.assertEqual(self.metrics.histogram('get', self.server).count, 1)
+
+        conn = pool._checkout()
+        self.assertRaises(memc.flare.PoolTimeoutError, pool.get, '_metrics')
+        self.assertEqual(self.metrics.counter('pool_timeouts'), 1)
+        pool._checkin(conn)
+        pool.close()
+
+    def test_ketama(self):
+        mc = memc.ketama.Client(['127.0.0.1:11211'],
+                                instruments=self.instruments)
+        mc.set('_metrics', 'a')
+        self.assertEqual(mc.mget(['_metrics', '_metrics_none']), ['a', None])
+        self.assertEqual(self.metrics.histogram('set', self.server).count, 1)
+        self.assertEqual(self.metrics.histogram('get', None).count, 1)
+        self.assertEqual(self.metrics.counter('misses', None), 1)
+        mc.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+'''
+Created on 2026/10/18
+'''
+
+import time
+import unittest
+import memc.basic
+import memc.nearcache
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class TestNearCache(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.key = '_near'
+
+        self.mc = memc.basic.Client(self.server)
+        self.mc.connect()
+        self.gets = []
+        get = self.mc._get
+
+        def counted_get(cmd, keys, use_cas=False):
+            self.gets.append(list(keys))
+            return get(cmd, keys, use_cas)
+        self.mc._get = counted_get
+
+        self.clock = Clock()
+        memc.nearcache.time = self.clock
+
+    def tearDown(self):
+        memc.nearcache.time = time
+        self.mc.close()
+
+    def test_ttl(self):
+        near = memc.nearcache.NearCache(self.mc, ttl=10)
+        near.set(self.key, 'a')
+
+        self.assertEqual(near.get(self.key), 'a')
+        self.assertEqual(near.get(self.key), 'a')
+        self.assertEqual(len(self.gets), 1)
+        self.assertEqual((near.hits, near.misses), (1, 1))
+
+        # written by another client, seen after ttl.
+        self.mc.set(self.key, 'b')
+        self.assertEqual(near.get(self.key), 'a')
+        self.clock.now += 10
+        self.assertEqual(near.get(self.key), 'b')
+        self.assertEqual(len(self.gets), 2)
+
+    def test_invalidate(self):
+        near = memc.nearcache.NearCache(self.mc, ttl=10)
+        near.set(self.key, '1')
+        self.assertEqual(near.get(self.key), '1')
+
+        self.assertEqual(near.incr(self.key, 1), 2)
+        self.assertEqual(near.get(self.key), '2')
+
+        near.append(self.key, '0')
+        self.assertEqual(near.get(self.key), '20')
+
+        self.assertEqual(near.set_multi({self.key: 'x'}), [])
+        self.assertEqual(near.mget([self.key, '_near_none']), ['x', None])
+
+        near.delete(self.key)
+        self.assertRaises(memc.basic.KeyNotFoundError, near.get, self.key)
+        self.assertEqual(len(near), 0)
+
+    def test_mget(self):
+        near = memc.nearcache.NearCache(self.mc, ttl=10)
+        near.set_multi({'_near1': '1', '_near2': '2'})
+
+        self.assertEqual(near.get('_near1'), '1')
+        self.assertEqual(near.mget(['_near1', '_near2']), ['1', '2'])
+        self.assertEqual(self.gets, [['_near1'], ['_near2']])
+        self.assertEqual(near.raw_get('_near2')[:4], ('2', '_near2', 0, 1))
+
+    def test_limits(self):
+        near = memc.nearcache.NearCache(self.mc, ttl=10, max_items=2)
+        near.set_multi({'_near1': '1', '_near2': '2', '_near3': '3'})
+        for key in ('_near1', '_near2', '_near1', '_near3'):
+            near.get(key)
+        self.assertEqual(near.evictions, 1)
+        self.assertEqual(sorted(near._entries.keys()), ['_near1', '_near3'])
+
+        near = memc.nearcache.NearCache(self.mc, ttl=10, max_bytes=20)
+        near.set(self.key, 'x' * 100)
+        near.get(self.key)
+        self.assertEqual(len(near), 0)
+
+    def test_stale(self):
+        near = memc.nearcache.NearCache(self.mc, ttl=10, stale=5)
+        near.set(self.key, 'a')
+        near.get(self.key)
+        self.mc.set(self.key, 'b')
+
+        # while one reader fetches the expired entry, the others are served
+        # the stale one.
+        self.clock.now += 12
+        token = object()
+        with near._lock:
+            self.assertEqual(near._lookup(self.key, self.clock.now, token), None)
+        self.assertEqual(near.get(self.key), 'a')
+        self.assertEqual(near.stale_hits, 1)
+
+        near._fetching.clear()
+        self.assertEqual(near.get(self.key), 'b')
+
+        self.clock.now += 20
+        self.mc.set(self.key, 'c')
+        self.assertEqual(near.get(self.key), 'c')
+
+
+if __name__ == '__main__':
+    unittest.main()
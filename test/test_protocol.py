@@ -0,0 +1,155 @@
+'''
+Created on 2026/10/18
+'''
+
+import random
+import unittest
+import memc.protocol
+
+from memc.protocol import Value, Number, Stat, Version, ServerError, Unknown
+from memc.protocol import MetaValue, MetaStatus
+from memc.protocol import END, STORED, NOT_STORED, EXISTS, DELETED, NOT_FOUND
+
+
+class DummySocket(object):
+    def __init__(self, data, chunk):
+        self._data = data
+        self._chunk = chunk
+
+    def recv_into(self, buf, size):
+        n = min(size, self._chunk, len(self._data))
+        buf[:n] = self._data[:n]
+        self._data = self._data[n:]
+        return n
+
+
+class TestReader(unittest.TestCase):
+    def test_readline_read(self):
+        lines = ['VALUE a 0 3', 'END', 'x' * 100]
+        data = 'VALUE a 0 3\r\nabc\r\nEND\r\n' + 'x' * 100 + '\r\n'
+
+        for chunk in xrange(1, len(data) + 1):
+            sock = DummySocket(data, chunk)
+            reader = memc.protocol.Reader(8)
+            result = []
+
+            for want in (None, 3, None, None):
+                while True:
+                    if want is None:
+                        r = reader.readline()
+                    else:
+                        r = reader.read(want)
+                    if r is not None:
+                        break
+                    reader.recv_into(sock)
+                result.append(r)
+
+            self.assertEqual(result, [lines[0], 'abc', lines[1], lines[2]])
+            self.assertEqual(len(reader), 0)
+
+
+class TestParser(unittest.TestCase):
+    data = "".join([
+        "VALUE a 1 3\r\nabc\r\n",
+        "VALUE b 2 0 99\r\n\r\n",
+        "VALUE c 0 12\r\nline\r\nline\r\n\r\n",
+        "END\r\n",
+        "STORED\r\nNOT_STORED\r\nEXISTS\r\nDELETED\r\nNOT_FOUND\r\n",
+        "12345\r\n",
+        "STAT pid 42\r\nSTAT version 1.6.0 extra\r\nEND\r\n",
+        "VERSION 1.6.0\r\n",
+        "ERROR\r\nCLIENT_ERROR bad data chunk\r\nSERVER_ERROR out of memory\r\n",
+        "WHAT\r\n",
+        "VA 3 c5 f1\r\nabc\r\nVA 0\r\n\r\n",
+        "HD\r\nHD c7 W\r\nEN\r\nNS\r\nMN\r\n",
+    ])
+
+    events = [
+        Value('a', 1, None, 'abc'),
+        Value('b', 2, 99, ''),
+        Value('c', 0, None, 'line\r\nline\r\n'),
+        END,
+        STORED, NOT_STORED, EXISTS, DELETED, NOT_FOUND,
+        Number(12345),
+        Stat('pid', '42'), Stat('version', '1.6.0 extra'), END,
+        Version('1.6.0'),
+        ServerError('ERROR', ''),
+        ServerError('CLIENT_ERROR', 'bad data chunk'),
+        ServerError('SERVER_ERROR', 'out of memory'),
+        Unknown('WHAT'),
+        MetaValue(['c5', 'f1'], 'abc'), MetaValue([], ''),
+        MetaStatus('HD', []), MetaStatus('HD', ['c7', 'W']),
+        MetaStatus('EN', []), MetaStatus('NS', []), MetaStatus('MN', []),
+    ]
+
+    def parse(self, chunks):
+        parser = memc.protocol.Parser(16)
+        result = []
+        for chunk in chunks:
+            for event in parser.feed(chunk):
+                if type(event) in (Value, MetaValue):
+                    event = event._replace(data=event.data.tobytes())
+                result.append(event)
+        self.assertEqual(len(parser), 0)
+        return result
+
+    def test_chunks(self):
+        for size in xrange(1, len(self.data) + 1):
+            chunks = [self.data[i:i + size]
+                      for i in xrange(0, len(self.data), size)]
+            self.assertEqual(self.parse(chunks), self.events)
+
+    def test_random_chunks(self):
+        rand = random.Random(0)
+        for i in xrange(200):
+            chunks = []
+            pos = 0
+            while pos < len(self.data):
+                size = rand.randint(1, 40)
+                chunks.append(self.data[pos:pos + size])
+                pos += size
+            self.assertEqual(self.parse(chunks), self.events)
+
+    def test_get_reply(self):
+        data = self.data[:self.data.index('END\r\n') + 5]
+        expected = {
+            'a': ('abc', 'a', 1, 3, None),
+            'b': ('', 'b', 2, 0, 99),
+            'c': ('line\r\nline\r\n', 'c', 0, 12, None),
+        }
+        for size in xrange(1, len(data) + 1):
+            parser = memc.protocol.Parser(16)
+            reply = memc.protocol.GetReply('get a b c')
+            done = False
+            for i in xrange(0, len(data), size):
+                self.assertFalse(done)
+                parser.feed(data[i:i + size])
+                done = reply.parse(parser)
+            self.assertTrue(done)
+            self.assertEqual(reply.result(), expected)
+            self.assertEqual(len(parser), 0)
+
+        parser = memc.protocol.Parser()
+        parser.feed("VALUE a 0 1\r\na\r\nSTORED\r\n")
+        self.assertRaises(memc.protocol.Error,
+                          memc.protocol.GetReply('get a').parse, parser)
+
+    def test_zero_copy(self):
+        parser = memc.protocol.Parser()
+        parser.feed("VALUE a 0 5\r\nhello\r\nEND\r\n")
+        event = parser.next_event()
+        self.assertTrue(isinstance(event.data, memoryview))
+        self.assertEqual(event.data.tobytes(), 'hello')
+        self.assertEqual(parser.next_event(), END)
+        self.assertEqual(parser.next_event(), None)
+
+    def test_meta_fields(self):
+        fields = memc.protocol.meta_fields(['v', 'c12', 't-1', 'kabc', 'h1',
+                                            'W', 'X', 'Z'])
+        self.assertEqual(fields, {'cas': 12, 'ttl': -1, 'key': 'abc',
+                                  'hit': True, 'win': True, 'stale': True,
+                                  'win_sent': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+'''
+Created on 2026/10/18
+'''
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import memc.basic
+import memc.codec
+import memc.nearcache
+import memc.sharedcache
+
+from test_nearcache import Clock
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+        self.key = '_shared'
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'memc.shm')
+
+        self.mc = memc.basic.Client(self.server)
+        self.mc.connect()
+        self.gets = []
+        get = self.mc._get
+
+        def counted_get(cmd, keys, use_cas=False):
+            self.gets.append(list(keys))
+            return get(cmd, keys, use_cas)
+        self.mc._get = counted_get
+
+        self.clock = Clock()
+        memc.nearcache.time = self.clock
+        memc.sharedcache.time = self.clock
+
+    def tearDown(self):
+        memc.nearcache.time = time
+        memc.sharedcache.time = time
+        self.mc.close()
+        shutil.rmtree(self.tmp)
+
+    def cache(self, client=None, **kwargs):
+        kwargs.setdefault('slots', 64)
+        kwargs.setdefault('slot_size', 256)
+        return memc.sharedcache.SharedCache(client or self.mc, self.path,
+                                            ttl=10, **kwargs)
+
+    def test_shared(self):
+        a = self.cache()
+        b = self.cache()
+        a.set(self.key, 'a')
+
+        self.assertEqual(a.get(self.key), 'a')
+        self.assertEqual(b.get(self.key), 'a')
+        self.assertEqual(len(self.gets), 1)
+        self.assertEqual((b.hits, b.misses), (1, 0))
+        self.assertEqual(len(b), 1)
+
+        # a write through either drops the shared copy.
+        b.set(self.key, 'b')
+        self.assertEqual(a.get(self.key), 'b')
+        self.assertEqual(len(self.gets), 2)
+
+        self.clock.now += 10
+        self.assertEqual(len(a), 0)
+        self.assertEqual(b.mget([self.key, '_shared_none']), ['b', None])
+        self.assertEqual(b.raw_get(self.key)[1:4], (self.key, 0, 1))
+
+        a.clear()
+        self.assertEqual(len(b), 0)
+        a.close()
+        b.close()
+
+    def test_stamp(self):
+        a = self.cache()
+        b = self.cache()
+        a.set(self.key, 'a')
+
+        # a value read before another process invalidated it isn't cached.
+        token = object()
+        with a._lock:
+            self.assertEqual(a._lookup(self.key, self.clock.now, token), None)
+        b.invalidate([self.key])
+        with a._lock:
+            a._store(self.key, ('a', self.key, 0, 1, None), self.clock.now,
+                     token)
+        self.assertEqual(len(a), 0)
+        self.assertEqual(a._stamps, {})
+
+        self.assertEqual(a.get(self.key), 'a')
+        self.assertEqual(len(a), 1)
+
+    def test_limits(self):
+        cache = self.cache(slots=8)
+        cache.set(self.key, 'x' * 1000)
+        cache.get(self.key)
+        self.assertEqual(len(cache), 0)
+
+        values = dict(('_shared%d' % i, str(i)) for i in xrange(20))
+        cache.set_multi(values)
+        for key in sorted(values):
+            self.assertEqual(cache.get(key), values[key])
+            self.clock.now += 0.1
+        self.assertEqual(len(cache), 8)
+        self.assertEqual(cache.evictions, 12)
+
+    def test_codec(self):
+        mc = memc.basic.Client(self.server, codec=memc.codec.Codec())
+        mc.connect()
+        cache = self.cache(mc)
+        cache.set(self.key, {'a': 1})
+        self.assertEqual(cache.get(self.key), {'a': 1})
+        self.assertEqual(self.cache(mc).get(self.key), {'a': 1})
+        self.assertEqual(cache.hits, 0)
+        mc.close()
+
+    def test_layout(self):
+        self.cache(slots=64)
+        self.assertRaises(memc.basic.Error, self.cache, slots=32)
+        self.assertRaises(memc.basic.Error, self.cache, slot_size=8)
+
+    def test_fork(self):
+        cache = self.cache()
+        cache.set(self.key, 'a')
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                cache.get(self.key)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get(self.key), 'a')
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(self.gets, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
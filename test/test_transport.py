@@ -0,0 +1,142 @@
+'''
+Created on 2026/10/18
+'''
+
+import os
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+import memc
+import memc.basic
+import memc.flare
+import memc.transport
+
+from test_flare import IndexServer
+
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = ('127.0.0.1', 11211)
+
+    def test_conn2tuple(self):
+        self.assertEqual(memc.conn2tuple('localhost:11211'),
+                         ('localhost', 11211))
+        self.assertEqual(memc.conn2tuple('unix:/tmp/memc.sock'),
+                         '/tmp/memc.sock')
+        self.assertEqual(memc.conn2tuple('/tmp/memc.sock'), '/tmp/memc.sock')
+        self.assertRaises(memc.Error, memc.conn2tuple, 'unix:')
+
+        self.assertEqual(memc.server2str(('localhost', 11211)),
+                         'localhost:11211')
+        self.assertEqual(memc.server2str('/tmp/memc.sock'),
+                         'unix:/tmp/memc.sock')
+
+    def test_options(self):
+        mc = memc.basic.Client(self.server)
+        mc.connect()
+        sock = mc._sock
+        self.assertEqual(sock.getsockopt(socket.SOL_TCP, socket.TCP_NODELAY), 1)
+        self.assertEqual(sock.getsockopt(socket.SOL_SOCKET,
+                                         socket.SO_KEEPALIVE), 0)
+        self.assertEqual(sock.gettimeout(), memc.transport.TIME_OUT)
+        mc.close()
+
+        transport = memc.transport.Transport(nodelay=False,
+                                             keepalive=(30, 5, 3),
+                                             rcvbuf=256 * 1024,
+                                             read_timeout=3)
+        mc = memc.basic.Client(self.server, transport=transport)
+        mc.connect()
+        sock = mc._sock
+        self.assertEqual(sock.getsockopt(socket.SOL_TCP, socket.TCP_NODELAY), 0)
+        self.assertEqual(sock.getsockopt(socket.SOL_SOCKET,
+                                         socket.SO_KEEPALIVE), 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            self.assertEqual(sock.getsockopt(socket.SOL_TCP,
+                                             socket.TCP_KEEPIDLE), 30)
+        # Linux doubles the size for its bookkeeping.
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,
+                                        socket.SO_RCVBUF) >= 256 * 1024)
+        self.assertEqual(sock.gettimeout(), 3)
+
+        mc.set('_transport', 'a')
+        self.assertEqual(mc.get('_transport'), 'a')
+        mc.close()
+
+    def test_flare_timeouts(self):
+        # flare keeps its short connect timeout without a transport.
+        mc = memc.flare.Client(['127.0.0.1:11211'])
+        self.assertEqual(mc.connect_timeout, memc.flare.CONNECT_TIME_OUT)
+        mc.close()
+
+        transport = memc.transport.Transport(connect_timeout=5)
+        pool = memc.flare.Pool(['127.0.0.1:11211'], min_idle=1,
+                               transport=transport)
+        self.assertEqual(pool._idle[0][0].connect_timeout, 5)
+        pool.close()
+
+        pool = memc.flare.Pool(['127.0.0.1:11211'], min_idle=1,
+                               transport=transport, connect_timeout=2)
+        self.assertEqual(pool._idle[0][0].connect_timeout, 2)
+        pool.close()
+
+        index = IndexServer()
+        try:
+            mc = memc.flare.ClusterClient(index.server, transport=transport)
+            mc.set('_transport', 'a')
+            # the read goes to the slave, which has no copy of it.
+            self.assertRaises(memc.basic.KeyNotFoundError, mc.get,
+                              '_transport')
+            self.assertEqual([node.connect_timeout for node in
+                              mc._clients.values()], [5, 5])
+            mc.delete('_transport')
+            mc.close()
+        finally:
+            index.close()
+
+    def test_connect_error(self):
+        mc = memc.basic.Client('127.0.0.1:1')
+        self.assertRaises(socket.error, mc.connect)
+        self.assertEqual(mc._sock, None)
+
+    def test_unix(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'memc.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+
+        received = []
+        def serve():
+            (conn, address) = listener.accept()
+            f = conn.makefile('rb')
+            for line in iter(f.readline, ''):
+                received.append(line)
+                if line.startswith('version'):
+                    conn.sendall("VERSION 1.6.0\r\n")
+                elif line.startswith('set'):
+                    f.read(int(line.split()[4]) + 2)
+                    conn.sendall("STORED\r\n")
+            conn.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            mc = memc.basic.Client('unix:' + path)
+            mc.connect()
+            self.assertEqual(mc.version(), 'VERSION 1.6.0')
+            # a large value is sent in parts, without TCP_CORK.
+            mc.set('_transport', 'x' * (memc.basic.SENDMSG_THRESHOLD + 1))
+            mc._sock.close()
+            thread.join()
+            self.assertEqual(received[0], 'version\r\n')
+            self.assertTrue(received[-1].startswith('set _transport '))
+        finally:
+            listener.close()
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()